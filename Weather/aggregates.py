@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from archive import DailyArchive
+from calendar_index import (DEFAULT_STATION, SEASONS, date_month, day_offset, from_month_code, month_code, month_end,
+                            month_start, season_codes)
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS, MonthData
+
+
+# Trailing window lengths, in days, of the rolling aggregates.
+WINDOWS = (7, 30, 90)
+
+# Partial statistics of a month, the layout of the second axis of monthly.bin.
+PARTIALS = ('sum', 'count', 'max', 'min')
+
+# Columns holding totals rather than means in the rolling windows.
+TOTALS = np.array([key == 'precipitation' for key, _ in FIELDS])
+
+
+class Summary:
+    """
+    Mean, extremes and totals of every FIELDS column over a list of periods.
+
+    Every array is periods x FIELDS, keys holds the period of every row: (year, month),
+    (year, season) or year. The mean and extremes of a period without data are NaN.
+    """
+
+    def __init__(self, keys, total, count, high, low):
+        self.keys = keys
+        self.total = total
+        self.count = count
+        self.max = high
+        self.min = low
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean = total / count
+
+    def column(self, key: str, stat: str = 'Avg', measure: str = 'mean') -> np.ndarray:
+        """Returns one measure ('mean', 'max', 'min', 'total' or 'count') of a variable statistic per period."""
+        return getattr(self, measure)[:, FIELDS.index((key, stat))]
+
+
+class Aggregates:
+    """
+    Monthly, seasonal and annual statistics and 7/30/90-day rolling windows of the daily archive,
+    kept up to date one month at a time.
+
+    monthly.bin holds the sum, count, max and min of every FIELDS column for every month since
+    the archive start; seasons and years are combined from those partials when asked for, so a
+    new month only touches its own row. rolling_{window}.bin holds the trailing window of every
+    archived day, the mean of each column and the total of precipitation, and a new month only
+    recomputes the days whose window overlaps it. The tables of a station live in a subdirectory
+    named after the station of its archive.
+    """
+
+    def __init__(self, archive: DailyArchive = None, directory: str = 'Aggregates'):
+        self.archive = archive or DailyArchive()
+        self.directory = os.path.join(directory, self.archive.station)
+        self._meta_path = os.path.join(self.directory, 'aggregates.json')
+        self.months = 0
+        self.rows = 0
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['start'] == str(self.archive.start) and meta['windows'] == list(WINDOWS):
+                self.months = meta['months']
+                self.rows = meta['rows']
+
+    def update(self, data: MonthData):
+        """
+        Brings the aggregates up to date after a month was written to the archive.
+
+        Only the row of that month and the rolling windows overlapping its days are computed, plus
+        any rows the archive grew by in between.
+
+        :arg data: The month that was just appended.
+        """
+
+        if self.archive.start is None:
+            return
+        row = day_offset(month_start(data.year, data.month), self.archive.start)
+        index = self._month_index(data.year, data.month)
+        self._update_months(min(index, self.months), index + 1)
+        self._update_rolling(min(row, self.rows), row + len(data.days))
+        self._save_meta()
+
+    def rebuild(self):
+        """Computes every aggregate of the archive again."""
+        self.months, self.rows = 0, 0
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            os.remove(os.path.join(self.directory, name))
+        if self.archive.rows:
+            self._update_months(0, self._month_index(*date_month(self.archive.dates[-1])) + 1)
+            self._update_rolling(0, self.archive.rows)
+        self._save_meta()
+
+    def monthly(self) -> Summary:
+        """Returns the statistics of every archived month."""
+        partials = self._partials()
+        year, month = self._month_keys(np.arange(len(partials)))
+        return Summary(list(zip(year.tolist(), month.tolist())), *partials.transpose(1, 0, 2))
+
+    def seasonal(self) -> Summary:
+        """Returns the statistics of every (year, season), December counting towards the next winter."""
+        partials = self._partials()
+        year, month = self._month_keys(np.arange(len(partials)))
+        codes = season_codes(year, month)
+        keys = [(int(code) // 4, SEASONS[code % 4]) for code in np.unique(codes)]
+        return Summary(keys, *self._combine(partials, codes))
+
+    def annual(self) -> Summary:
+        """Returns the statistics of every calendar year."""
+        partials = self._partials()
+        year, _ = self._month_keys(np.arange(len(partials)))
+        return Summary(np.unique(year).tolist(), *self._combine(partials, year))
+
+    def rolling(self, window: int, start=None, end=None) -> tuple:
+        """
+        Returns the trailing window of every day of an inclusive date range, the whole archive by default.
+
+        :arg window: One of WINDOWS.
+
+        :returns tuple: (datetime64 dates, rows x FIELDS values), the mean of each column over the
+                        window, the total for precipitation.
+        """
+
+        if window not in WINDOWS:
+            raise ValueError(f"No {window} day window, choose one of {WINDOWS}.")
+        values = self._rolling_map(window)
+        dates = self.archive.dates[:self.rows]
+        if start is None:
+            return dates, values
+        first = max(day_offset(start, self.archive.start), 0)
+        last = max(first, min(day_offset(end, self.archive.start) + 1, self.rows))
+        return dates[first:last], values[first:last]
+
+    def _month_index(self, year: int, month: int) -> int:
+        return month_code(year, month) - month_code(*date_month(self.archive.start))
+
+    def _month_keys(self, index: np.ndarray) -> tuple:
+        return from_month_code(month_code(*date_month(self.archive.start)) + index)
+
+    def _partials(self) -> np.ndarray:
+        path = os.path.join(self.directory, 'monthly.bin')
+        if not self.months:
+            return np.empty((0, len(PARTIALS), len(FIELDS)))
+        return np.memmap(path, dtype=np.float64, mode='r', shape=(self.months, len(PARTIALS), len(FIELDS)))
+
+    @staticmethod
+    def _combine(partials: np.ndarray, codes: np.ndarray) -> tuple:
+        """Merges the partials of consecutive months sharing a code."""
+        if not len(codes):
+            return tuple(np.empty((0, len(FIELDS))) for _ in PARTIALS)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        total = np.add.reduceat(partials[:, 0], starts)
+        count = np.add.reduceat(partials[:, 1], starts)
+        high = np.fmax.reduceat(partials[:, 2], starts)
+        low = np.fmin.reduceat(partials[:, 3], starts)
+        return total, count, high, low
+
+    def _update_months(self, first: int, last: int):
+        """Computes the partials of months [first, last)."""
+        path = os.path.join(self.directory, 'monthly.bin')
+        partials = self._grow(path, last, (len(PARTIALS), len(FIELDS)), self.months)
+        for index in range(first, last):
+            year, month = (int(v) for v in self._month_keys(np.array(index)))
+            _, values = self.archive.range(month_start(year, month), month_end(year, month))
+            valid = ~np.isnan(values)
+            count = valid.sum(axis=0)
+            partials[index, 0] = np.where(valid, values, 0.0).sum(axis=0)
+            partials[index, 1] = count
+            partials[index, 2] = np.where(count > 0, np.fmax.reduce(values, axis=0, initial=-np.inf), np.nan)
+            partials[index, 3] = np.where(count > 0, np.fmin.reduce(values, axis=0, initial=np.inf), np.nan)
+        partials.flush()
+        self.months = max(self.months, last)
+
+    def _update_rolling(self, first: int, last: int):
+        """Computes the rolling windows of the days [first, last + window - 1), as far as the archive goes."""
+        for window in WINDOWS:
+            path = os.path.join(self.directory, f'rolling_{window}.bin')
+            values = self._grow(path, self.archive.rows, (len(FIELDS),), self.rows)
+            end = min(last + window - 1, self.archive.rows)
+            low = max(first - window + 1, 0)
+            source = self.archive.values[low:end]
+            valid = ~np.isnan(source)
+            sums = np.concatenate([np.zeros((1, len(FIELDS))), np.cumsum(np.where(valid, source, 0.0), axis=0)])
+            counts = np.concatenate([np.zeros((1, len(FIELDS))), np.cumsum(valid, axis=0)])
+
+            rows = np.arange(first, end)
+            lead = np.maximum(rows - window + 1, 0) - low
+            total = sums[rows + 1 - low] - sums[lead]
+            count = counts[rows + 1 - low] - counts[lead]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values[first:end] = np.where(count > 0, np.where(TOTALS, total, total / count), np.nan)
+            values.flush()
+        self.rows = self.archive.rows
+
+    def _rolling_map(self, window: int) -> np.ndarray:
+        if not self.rows:
+            return np.empty((0, len(FIELDS)))
+        return np.memmap(os.path.join(self.directory, f'rolling_{window}.bin'), dtype=np.float64, mode='r',
+                         shape=(self.rows, len(FIELDS)))
+
+    def _grow(self, path: str, length: int, shape: tuple, current: int) -> np.memmap:
+        """Opens a memory mapped table for writing, appending NaN rows up to length."""
+        os.makedirs(self.directory, exist_ok=True)
+        length = max(length, current)
+        if length > current or not os.path.exists(path):
+            with open(path, 'ab' if current else 'wb') as f:
+                np.full((length - current,) + shape, np.nan).tofile(f)
+        return np.memmap(path, dtype=np.float64, mode='r+', shape=(length,) + shape)
+
+    def _save_meta(self):
+        meta = {'start': str(self.archive.start), 'months': self.months, 'rows': self.rows,
+                'windows': list(WINDOWS)}
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._meta_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and print the aggregates of the daily archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Compute every aggregate of the archive again")
+    show = subparsers.add_parser("show", help="Print the monthly, seasonal or annual aggregates")
+    show.add_argument("level", choices=["monthly", "seasonal", "annual"], help="The periods to print")
+    parser.add_argument("-s", "--station", default=DEFAULT_STATION, help="The station of the archive")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('aggregates', args.profile, args.metrics):
+        aggregates = Aggregates(DailyArchive(station=args.station))
+        if args.command == "rebuild":
+            aggregates.rebuild()
+            print(f"Aggregated {aggregates.months} months and {aggregates.rows} days.")
+            return
+
+        summary = getattr(aggregates, args.level)()
+        print(f"{'period':16} {'temp mean':>9} {'temp max':>9} {'temp min':>9} {'humidity':>9} {'wind':>9} "
+              f"{'pressure':>9} {'rain':>9} {'days':>5}")
+        with np.errstate(invalid='ignore'):
+            for i, key in enumerate(summary.keys):
+                period = '-'.join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+                print(f"{period:16} {summary.column('temperature')[i]:9.2f} "
+                      f"{summary.column('temperature', 'Max', 'max')[i]:9.2f} "
+                      f"{summary.column('temperature', 'Min', 'min')[i]:9.2f} {summary.column('humidity')[i]:9.2f} "
+                      f"{summary.column('wind_speed')[i]:9.2f} {summary.column('pressure')[i]:9.2f} "
+                      f"{summary.column('precipitation', 'Total', 'total')[i]:9.2f} "
+                      f"{int(summary.column('temperature', 'Avg', 'count')[i]):5d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from conversion import CONVERTER_VERSION, load_si
+from calendar_index import DEFAULT_STATION, day_offset, day_range, month_start, parse_key
+from date import parse_year_month
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS, MonthData, find_sources, variable_slice
+
+
+class DailyArchive:
+    """
+    An append-only, memory-mapped archive of every day in SI units.
+
+    daily.bin holds one fixed-width float64 row per day with every (variable, stat) of FIELDS,
+    starting at the first archived day, and daily.json holds that start date and the row count.
+    The row of a date is its distance in days from the start, so a day is found in O(1) and a
+    date range is a slice of the memory map. Days without data are NaN rows. Every station has
+    its own archive in a subdirectory named after it.
+    """
+
+    def __init__(self, directory: str = 'Archive', station: str = DEFAULT_STATION):
+        self.station = station
+        self.directory = os.path.join(directory, station)
+        self._data_path = os.path.join(self.directory, 'daily.bin')
+        self._meta_path = os.path.join(self.directory, 'daily.json')
+        self._values = None
+        self.start = None
+        self.rows = 0
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['fields'] != [list(field) for field in FIELDS] or meta['version'] != CONVERTER_VERSION:
+                raise ValueError(f"'{directory}' was built with another layout or converter, rebuild it.")
+            self.start = np.datetime64(meta['start'], 'D')
+            self.rows = meta['rows']
+
+    @property
+    def values(self) -> np.ndarray:
+        """The rows x FIELDS memory map of the whole archive."""
+        if self._values is None or len(self._values) != self.rows:
+            if self.rows:
+                self._values = np.memmap(self._data_path, dtype=np.float64, mode='r',
+                                         shape=(self.rows, len(FIELDS)))
+            else:
+                self._values = np.empty((0, len(FIELDS)))
+        return self._values
+
+    @property
+    def dates(self) -> np.ndarray:
+        """The datetime64 date of every row."""
+        return day_range(self.start, self.start + self.rows - 1) if self.rows else np.array([], 'datetime64[D]')
+
+    def append_month(self, data: MonthData):
+        """
+        Writes a month into the archive without rewriting existing rows.
+
+        Months after the last archived day are appended, with NaN rows for any gap, and an
+        already archived month is overwritten in place.
+
+        :arg data: The month in SI units.
+
+        :raises ValueError: If the month lies before the start of the archive.
+        """
+
+        first = month_start(data.year, data.month)
+        if self.start is None:
+            self.start = first
+        offset = day_offset(first, self.start)
+        if offset < 0:
+            raise ValueError(f"{data.year}-{data.month} is before the archive start {self.start}.")
+
+        rows = offset + data.days.astype(np.int64) - 1
+        end = max(self.rows, int(rows.max()) + 1)
+        os.makedirs(self.directory, exist_ok=True)
+        if end > self.rows:
+            with open(self._data_path, 'ab') as f:
+                np.full((end - self.rows, len(FIELDS)), np.nan).tofile(f)
+
+        values = np.memmap(self._data_path, dtype=np.float64, mode='r+', shape=(end, len(FIELDS)))
+        values[rows] = data.block
+        values.flush()
+        del values
+
+        self.rows = end
+        self._values = None
+        self._save_meta()
+
+    def row(self, date) -> int:
+        """Returns the row index of a date, or raises KeyError if it is not archived."""
+        index = day_offset(date, self.start) if self.rows else -1
+        if not 0 <= index < self.rows:
+            raise KeyError(f"{date} is not in the archive.")
+        return index
+
+    def day(self, date) -> np.ndarray:
+        """Returns the FIELDS values of one day."""
+        return self.values[self.row(date)]
+
+    def range(self, start, end) -> tuple:
+        """
+        Returns the dates and values of an inclusive date range, clipped to the archive.
+
+        :arg start: The first date, as a date, datetime64 or 'YYYY-MM-DD'.
+        :arg end: The last date.
+
+        :returns tuple: (datetime64 dates, rows x FIELDS values), the values are a view of the archive.
+        """
+
+        first = max(day_offset(start, self.start), 0) if self.rows else 0
+        last = min(day_offset(end, self.start) + 1, self.rows) if self.rows else 0
+        last = max(first, last)
+        return self.dates[first:last], self.values[first:last]
+
+    def column(self, key: str, start=None, end=None) -> np.ndarray:
+        """Returns the days x stats view of one variable, optionally for a date range."""
+        values = self.values if start is None else self.range(start, end)[1]
+        return values[:, variable_slice(key)]
+
+    def _save_meta(self):
+        meta = {'start': str(self.start), 'rows': self.rows, 'version': CONVERTER_VERSION,
+                'fields': [list(field) for field in FIELDS]}
+        tmp = f"{self._meta_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path)
+
+
+def month_order(path: str) -> tuple:
+    """Sort key placing Month_Data paths in (year, month) order."""
+    key = parse_key(path)
+    return key.year, key.month
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and read the daily weather archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    append = subparsers.add_parser("append", help="Append Month_Data files to the archive")
+    append.add_argument("sources", nargs="*", default=['Month_Data'],
+                        help="Csv files, directories or glob patterns (default: Month_Data)")
+    append.add_argument("-r", "--range", nargs=2, type=parse_year_month, metavar=("START", "END"),
+                        help="Append the Month_Data files of a YYYY-MM to YYYY-MM range")
+    append.add_argument("-s", "--station", nargs="+", help="Only these stations, with --range the default station")
+
+    show = subparsers.add_parser("show", help="Print the archived days of a date range")
+    show.add_argument("start", help="First day, YYYY-MM-DD")
+    show.add_argument("end", help="Last day, YYYY-MM-DD")
+    show.add_argument("-s", "--station", default=DEFAULT_STATION, help="The station of the archive")
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('archive', args.profile, args.metrics):
+        if args.command == "append":
+            from aggregates import Aggregates
+            from correlation import CorrelationIndex
+
+            by_station = {}
+            for source in find_sources(args.sources if not args.range else [], args.range, args.station):
+                by_station.setdefault(parse_key(source).station, []).append(source)
+            for station, sources in sorted(by_station.items()):
+                archive = DailyArchive(station=station)
+                aggregates = Aggregates(archive)
+                correlations = CorrelationIndex(archive)
+                for source in sorted(sources, key=month_order):
+                    data = load_si(source)
+                    archive.append_month(data)
+                    aggregates.update(data)
+                    correlations.update(data)
+                print(f"Archive of {station} holds {archive.rows} days from {archive.start}.")
+        else:
+            dates, values = DailyArchive(station=args.station).range(args.start, args.end)
+            print('date,' + ','.join(f'{key}_{stat.lower()}' for key, stat in FIELDS))
+            for date, row in zip(dates, values):
+                print(f'{date},' + ','.join(f'{value:g}' for value in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import WebDriverException
+
+from spata_venizelos_weather_data import ChromeFetcher, create_dataframe, extract_table, get_path, save_to_csv
+from calendar_index import DEFAULT_STATION, month_days, months
+from date import parse_year_month
+from instrument import add_profile_arguments, session
+from snapshots import SnapshotStore
+from stations import get_station
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class HttpFetcher:
+    """
+    A fetcher that reads pages with plain HTTP, for static snapshots of the history pages
+    served locally instead of a browser session.
+    """
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = timeout
+
+    def fetch(self, url: str) -> str:
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return response.read().decode('utf-8')
+
+    def close(self):
+        pass
+
+
+def chrome_factory():
+    """Creates a ChromeFetcher with the ChromeDriver path of config.ini."""
+    executable_path = get_path()
+    if not executable_path:
+        raise ValueError('Error: Executable path is missing.')
+    return ChromeFetcher(executable_path)
+
+
+class FetcherPool:
+    """
+    A bounded pool of long-lived fetchers, created on demand by a pluggable factory.
+
+    A fetcher that raised while in use is closed and replaced by a new one.
+    """
+
+    def __init__(self, factory, size: int):
+        """
+        :arg factory: A callable returning an object with fetch(url) and close().
+        :arg size: The maximum number of live fetchers.
+        """
+        self.factory = factory
+        self._idle = queue.Queue()
+        self._slots = threading.Semaphore(size)
+        self._all = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def fetcher(self):
+        self._slots.acquire()
+        try:
+            try:
+                fetcher = self._idle.get_nowait()
+            except queue.Empty:
+                fetcher = self.factory()
+                with self._lock:
+                    self._all.append(fetcher)
+            try:
+                yield fetcher
+            except Exception:
+                self._discard(fetcher)
+                raise
+            self._idle.put(fetcher)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            for fetcher in self._all:
+                fetcher.close()
+            self._all.clear()
+
+    def _discard(self, fetcher):
+        with self._lock:
+            self._all.remove(fetcher)
+        try:
+            fetcher.close()
+        except Exception as e:
+            logger.warning(f"Error closing a broken fetcher: {e}")
+
+
+class RateLimiter:
+    """Spaces out requests to the same host by at least interval seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BackfillState:
+    """
+    The (station, year, month) already saved by a backfill, kept in a json file so that an
+    interrupted run resumes where it stopped. Entries of earlier versions without a station
+    belong to the default station.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.done = {tuple(entry) if len(entry) == 3 else (DEFAULT_STATION, *entry)
+                             for entry in json.load(f)}
+        except FileNotFoundError:
+            self.done = set()
+
+    def mark_done(self, station: str, year: int, month: int):
+        with self._lock:
+            self.done.add((station, year, month))
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(sorted(self.done), f)
+            os.replace(tmp, self.path)
+
+
+def fetch_month(pool: FetcherPool, limiter: RateLimiter, store: SnapshotStore, year: int, month: int,
+                url: str, retries: int = 3, backoff: float = 2.0) -> tuple[int, list]:
+    """
+    Extracts one month from its complete snapshot, or fetches it with retries and exponential
+    backoff and stores the page as a new snapshot.
+
+    :arg pool: The pool to borrow a fetcher from.
+    :arg limiter: The per-host rate limiter.
+    :arg store: The snapshot store of the station.
+    :arg year: The year to fetch.
+    :arg month: The month to fetch.
+    :arg url: The url template, formatted with year and month.
+    :arg retries: Attempts after the first one.
+    :arg backoff: The delay before the first retry, doubled for every next one.
+
+    :returns tuple: The days in the month and the extracted table rows, as get_weather_data.
+    """
+
+    days = month_days(year, month)
+
+    def checked(data):
+        if len(data) < 7 * (days + 1):
+            raise ValueError(f"Incomplete table for {year}-{month}: {len(data)} rows.")
+        return days, data
+
+    if store.is_complete(year, month):
+        return checked(extract_table(store.load(year, month)))
+
+    url = url.format(year=year, month=month)
+    for attempt in range(retries + 1):
+        try:
+            limiter.wait(url)
+            with pool.fetcher() as fetcher:
+                page_source = fetcher.fetch(url)
+            result = checked(extract_table(page_source))
+            store.save(year, month, page_source)
+            return result
+        except (WebDriverException, OSError, ValueError) as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"Retrying {year}-{month} in {delay:.1f} s after: {e}")
+            time.sleep(delay)
+
+
+def backfill(start: tuple, end: tuple, factory=chrome_factory, workers: int = 4, interval: float = 2.0,
+             url: str = None, retries: int = 3, state_path: str = 'backfill_state.json',
+             store: SnapshotStore = None, stations: list = None) -> dict:
+    """
+    Fetches every month of a range of one or more stations concurrently and saves each one to Month_Data.
+
+    Months with a complete snapshot are extracted from it without a browser, and months saved
+    by an earlier run are skipped unless their snapshot is incomplete, like the current month.
+    The months of every station share one pool of fetchers and one rate limiter.
+
+    :arg start: The first (year, month).
+    :arg end: The last (year, month), inclusive.
+    :arg factory: A callable creating the fetchers of the pool.
+    :arg workers: Concurrent fetches, which is also the number of live fetchers.
+    :arg interval: Minimum seconds between two requests to the same host.
+    :arg url: A url template with {year} and {month}, and optionally {station}, {country}, {city}
+              and {icao}, the history page of every station by default.
+    :arg retries: Retries per month before it is reported as failed.
+    :arg state_path: The resume file, months listed there are not fetched again.
+    :arg store: The snapshot store whose directory holds every station, SnapshotStore() by default.
+    :arg stations: The registered station ids, the default station by default.
+
+    :returns dict: The saved, skipped and failed (station, year, month).
+
+    :raises ValueError: If a station is not registered.
+    """
+
+    state = BackfillState(state_path)
+    root = store.root if store else 'Snapshots'
+    summary = {'saved': [], 'skipped': [], 'failed': []}
+    jobs = []
+    for station in [get_station(station_id) for station_id in stations or [DEFAULT_STATION]]:
+        station_store = SnapshotStore(root, station.id)
+        station_url = station.url(url)
+        for year, month in months(start, end):
+            stale = station_store.info(year, month) is not None and not station_store.is_complete(year, month)
+            if (station.id, year, month) in state.done and not stale:
+                summary['skipped'].append((station.id, year, month))
+            else:
+                jobs.append((station_store, station_url, year, month))
+    pool = FetcherPool(factory, workers)
+    limiter = RateLimiter(interval)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch_month, pool, limiter, station_store, year, month, station_url, retries):
+                       (station_store.station, year, month)
+                       for station_store, station_url, year, month in jobs}
+            for future in as_completed(futures):
+                station, year, month = futures[future]
+                try:
+                    days, data = future.result()
+                except (WebDriverException, OSError, ValueError) as e:
+                    logger.error(f"Failed to fetch {station} {year}-{month}: {e}")
+                    summary['failed'].append((station, year, month))
+                    continue
+                save_to_csv(create_dataframe(days_in_month=days, data=data), f'{station}_{year}_{month}')
+                state.mark_done(station, year, month)
+                summary['saved'].append((station, year, month))
+    finally:
+        pool.close()
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch a range of months into Month_Data.")
+    parser.add_argument("start", type=parse_year_month, help="First month, YYYY-MM")
+    parser.add_argument("end", type=parse_year_month, help="Last month, YYYY-MM")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent browser sessions")
+    parser.add_argument("-i", "--interval", type=float, default=2.0,
+                        help="Minimum seconds between requests to the same host")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per month")
+    parser.add_argument("-s", "--station", nargs="+", default=[DEFAULT_STATION],
+                        help="The registered stations to fetch, see stations.py list")
+    parser.add_argument("--url", help="Url template with {year} and {month}, and optionally {station}, "
+                                      "{country}, {city} and {icao}")
+    parser.add_argument("--http", action="store_true",
+                        help="Fetch with plain HTTP instead of Chrome, e.g. from a local snapshot server")
+    parser.add_argument("--state", default='backfill_state.json', help="The resume file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('backfill', args.profile, args.metrics):
+        summary = backfill(args.start, args.end, HttpFetcher if args.http else chrome_factory, args.workers,
+                           args.interval, args.url, args.retries, args.state, stations=args.station)
+        print(f"Saved: {len(summary['saved'])}, skipped: {len(summary['skipped'])}, failed: {len(summary['failed'])}")
+        for station, year, month in sorted(summary['failed']):
+            print(f"  failed: {station} {year}-{month}")
+
+
+if __name__ == "__main__":
+    main()
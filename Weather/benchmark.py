@@ -0,0 +1,398 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from conversion import SI_COLUMNS, convert_month, si_month
+from html_extract import extract_month, extract_rows
+from month_parser import parse_month
+from stations import month_files
+from synthetic import station_ids, write_dataset, write_pages
+from to_SI import convert_unit, create_output_dataframe, read_weather_data
+
+
+def best_of(func, repeat: int) -> float:
+    """
+    Runs func repeat times and returns the fastest wall time in seconds.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def legacy_si(file: str):
+    """
+    The per-cell si_dataframe conversion path, without writing the output file.
+    """
+
+    df = read_weather_data(file)
+    for col_name, new_unit in [('Temperature (°F)', '°C'), ('Dew Point (°F)', '°C'), ('Humidity (%)', '%'),
+                               ('Wind Speed (mph)', 'mps'), ('Pressure (in)', 'hPa'),
+                               ('Precipitation (in)', 'mm')]:
+        convert_unit(df, col_name, new_unit)
+    return create_output_dataframe(df)
+
+
+def check_si(file: str):
+    """
+    Asserts that the bulk parser gives the same values as the legacy path.
+    """
+
+    legacy = legacy_si(file)
+    data = si_month(file)
+    for key, column in SI_COLUMNS.items():
+        if key == 'humidity':
+            continue  # The legacy path keeps humidity as the raw cell strings.
+        expected = np.stack(legacy[column][1:].to_numpy())
+        if not np.allclose(expected, data.column(key)):
+            raise AssertionError(f"Bulk parser disagrees with si_dataframe on '{column}' for '{file}'.")
+
+
+def bench_si(files: list, repeat: int):
+    """
+    Compares the legacy si_dataframe path with the bulk parser over the given files.
+    """
+
+    for file in files:
+        check_si(file)
+
+    legacy = best_of(lambda: [legacy_si(file) for file in files], repeat)
+    bulk = best_of(lambda: [si_month(file) for file in files], repeat)
+
+    print(f"{len(files)} months, best of {repeat}")
+    print(f"  si_dataframe path: {legacy * 1000:9.2f} ms")
+    print(f"  bulk parser:       {bulk * 1000:9.2f} ms  ({legacy / bulk:.1f}x)")
+
+
+def legacy_extract_table(page_source: str) -> list:
+    """
+    The nested BeautifulSoup extraction get_weather_data used before html_extract.
+    """
+
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_source, 'html.parser')
+
+    outer_table = soup.find('div', class_='observation-table ng-star-inserted').find('table')
+    if not outer_table:
+        outer_table = soup.find('table', class_='days ng-star-inserted')
+        if not outer_table:
+            outer_table = soup.find('table', class_='ng-star-inserted')
+
+    data = []
+    for row in outer_table.find_all('tr'):
+        cells = row.find_all('td')
+        if cells:
+            row_data = []
+            for cell in cells:
+                inner_table = cell.find('table')
+                if inner_table:
+                    inner_data = []
+                    for inner_row in inner_table.find_all('tr'):
+                        inner_cells = inner_row.find_all('td')
+                        if inner_cells:
+                            inner_data.append([cell.text.strip() for cell in inner_cells])
+                    row_data.append(inner_data)
+                else:
+                    row_data.append(cell.text.strip())
+            data.append(row_data)
+    return data[2:]
+
+
+def bench_extract(corpus: str, repeat: int, padding: int):
+    """
+    Compares the BeautifulSoup extraction with the streaming extractor over a corpus of saved pages.
+
+    Without a corpus, pages are rendered from Month_Data into a temporary directory.
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if corpus:
+            paths = sorted(glob.glob(os.path.join(corpus, '*.htm*')))
+        else:
+            months = [parse_month(path) for paths in month_files().values() for path in paths]
+            paths = write_pages(months, tmp, padding)
+
+        pages = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                pages.append(f.read())
+
+        for path, page in zip(paths, pages):
+            if extract_rows(page) != legacy_extract_table(page):
+                raise AssertionError(f"Streaming extractor disagrees with BeautifulSoup for '{path}'.")
+
+        legacy = best_of(lambda: [legacy_extract_table(page) for page in pages], repeat)
+        rows = best_of(lambda: [extract_rows(page) for page in pages], repeat)
+        arrays = best_of(lambda: [extract_month(page, 2000, 1) for page in pages], repeat)
+
+    size = sum(len(page) for page in pages) / 1024
+    print(f"{len(pages)} pages, {size:.0f} KiB, best of {repeat}")
+    print(f"  BeautifulSoup:       {legacy * 1000:9.2f} ms")
+    print(f"  streaming, rows:     {rows * 1000:9.2f} ms  ({legacy / rows:.1f}x)")
+    print(f"  streaming, arrays:   {arrays * 1000:9.2f} ms  ({legacy / arrays:.1f}x)")
+
+
+def import_time(code: str) -> tuple[float, float, list]:
+    """
+    Runs code in a fresh interpreter with -X importtime.
+
+    :returns tuple: The wall time in ms, the total import time in ms and the five slowest
+                    top-level imports as (module, ms).
+    """
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - start) * 1000
+
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):  # Nested imports are indented below their parent.
+            top_level.append((name.strip(), int(cumulative) / 1000))
+    total = sum(ms for _, ms in top_level)
+    return wall, total, sorted(top_level, key=lambda item: -item[1])[:5]
+
+
+def bench_startup(repeat: int, output: str = None):
+    """
+    Measures the cold start of the weather CLI and the imports of every subcommand.
+    """
+
+    from weather import SUBCOMMAND_MODULES
+
+    cases = {'cli': 'import weather'}
+    cases.update({command: f"import weather; weather.load('{command}')" for command in SUBCOMMAND_MODULES})
+
+    results = {}
+    print(f"{'case':10} {'wall ms':>9} {'import ms':>10}  slowest imports")
+    for case, code in cases.items():
+        runs = [import_time(code) for _ in range(repeat)]
+        wall, total, slowest = min(runs, key=lambda run: run[1])
+        results[case] = {'wall_ms': round(wall, 2), 'import_ms': round(total, 2),
+                         'slowest': [[name, round(ms, 2)] for name, ms in slowest]}
+        print(f"{case:10} {wall:9.1f} {total:10.1f}  " + ', '.join(f'{name} {ms:.0f}' for name, ms in slowest[:3]))
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+@contextmanager
+def working_directory(path: str):
+    """Runs the block inside path, where 'Month_Data' and every cache directory resolve."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def sample_paths(root: str, sample: int) -> list:
+    """Returns up to sample Month_Data paths spread evenly over every station and year."""
+    paths = [path for _, paths in sorted(month_files(root).items()) for path in paths]
+    if len(paths) <= sample:
+        return paths
+    return [paths[i] for i in np.linspace(0, len(paths) - 1, sample).round().astype(int)]
+
+
+def suite_cases(root: str, sample: int, tmp: str) -> dict:
+    """
+    Prepares every case of the suite over a Month_Data tree.
+
+    :returns dict: (function, items) of every case, the function runs the case once.
+    """
+
+    from aggregates import Aggregates
+    from archive import DailyArchive
+    from correlation import CorrelationIndex
+    from query import query
+
+    paths = sample_paths(root, sample)
+    files = [os.path.basename(path) for path in paths]
+    months = [parse_month(path) for path in paths]
+    pages = []
+    for path in write_pages(months, os.path.join(tmp, 'pages'), 200_000):
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+
+    # Aggregation runs over every month of the first station, in order.
+    partitions = sorted(month_files(root).items())
+    station = partitions[0][0][0]
+    series = [convert_month(parse_month(path)) for (key, _), paths in partitions if key == station for path in paths]
+
+    def aggregate():
+        directory = tempfile.mkdtemp(dir=tmp)
+        archive = DailyArchive(os.path.join(directory, 'Archive'), series[0].station)
+        aggregates = Aggregates(archive, os.path.join(directory, 'Aggregates'))
+        correlations = CorrelationIndex(archive, os.path.join(directory, 'Correlations'))
+        for data in series:
+            archive.append_month(data)
+            aggregates.update(data)
+            correlations.update(data)
+        query(None, None, ['temperature_max>30'], ['summer'], aggregates)
+
+    def render():
+        from render import render_month
+
+        for path in paths[:4]:
+            render_month(path, output_dir=os.path.join(tmp, 'Charts'), force=True)
+
+    return {
+        'csv_read': (lambda: [read_weather_data(file) for file in files], len(files)),
+        'csv_parse': (lambda: [parse_month(path) for path in paths], len(paths)),
+        'si_dataframe': (lambda: [legacy_si(file) for file in files], len(files)),
+        'si_bulk': (lambda: [convert_month(parse_month(path)) for path in paths], len(paths)),
+        'extract_soup': (lambda: [legacy_extract_table(page) for page in pages[:12]], len(pages[:12])),
+        'extract': (lambda: [extract_month(page, 2000, 1) for page in pages], len(pages)),
+        'aggregate': (aggregate, len(series)),
+        'render': (render, 2 * len(paths[:4])),
+    }
+
+
+def run_suite(root: str = None, stations: int = 2, years: int = 5, sample: int = 48, repeat: int = 3,
+              cases: list = None) -> dict:
+    """
+    Times every case of the suite, on an existing Month_Data tree or a synthetic one of the given scale.
+
+    :arg root: A Month_Data directory, a synthetic tree of stations x years is generated if None.
+    :arg sample: Months of the tree used by the per-month cases.
+    :arg repeat: Runs per case, the fastest is kept.
+    :arg cases: The cases to run, every one by default.
+
+    :returns dict: The run metadata and the seconds, items and ms per item of every case.
+    """
+
+    results = {'meta': {'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                        'python': platform.python_version(), 'numpy': np.__version__,
+                        'machine': platform.machine(), 'sample': sample, 'repeat': repeat},
+               'cases': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        if root is None:
+            root = os.path.join(tmp, 'Month_Data')
+            start = time.perf_counter()
+            written = write_dataset(root, station_ids(stations), (2000, 1), (1999 + years, 12))
+            results['meta'].update(stations=stations, years=years, months=written,
+                                   generate_s=round(time.perf_counter() - start, 3))
+        root = os.path.abspath(root)
+        with working_directory(tmp):
+            if not os.path.exists('Month_Data'):
+                os.symlink(root, 'Month_Data')
+            prepared = suite_cases(root, sample, tmp)
+            for name, (func, items) in prepared.items():
+                if cases and name not in cases:
+                    continue
+                seconds = best_of(func, repeat)
+                results['cases'][name] = {'seconds': round(seconds, 6), 'items': items,
+                                          'ms_per_item': round(seconds * 1000 / max(items, 1), 4)}
+                print(f"  {name:14} {seconds * 1000:10.2f} ms  {items:6d} items  "
+                      f"{seconds * 1000 / max(items, 1):9.3f} ms/item")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    Compares the ms per item of every case present in both runs and prints the change.
+
+    :arg threshold: The allowed slowdown, 0.2 for 20 %.
+
+    :returns list: The names of the cases slower than the baseline by more than threshold.
+    """
+
+    regressions = []
+    print(f"{'case':14} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, case in results['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        before, after = baseline['cases'][name]['ms_per_item'], case['ms_per_item']
+        change = after / before - 1 if before else 0.0
+        slower = change > threshold
+        if slower:
+            regressions.append(name)
+        print(f"{name:14} {before:10.3f} {after:10.3f} {change:+8.1%}{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the weather data hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    si = subparsers.add_parser("si", help="CSV parsing and SI conversion")
+    si.add_argument("files", nargs="*", help="Month_Data csv files (default: all of them)")
+    si.add_argument("-r", "--repeat", type=int, default=5, help="Repetitions per timing")
+
+    extract = subparsers.add_parser("extract", help="HTML extraction of saved pages")
+    extract.add_argument("corpus", nargs="?", help="A directory of saved pages (default: rendered from Month_Data)")
+    extract.add_argument("-r", "--repeat", type=int, default=5, help="Repetitions per timing")
+    extract.add_argument("-p", "--padding", type=int, default=200_000,
+                         help="Bytes of unrelated markup around the table of rendered pages")
+
+    startup = subparsers.add_parser("startup", help="Import time of the weather CLI subcommands")
+    startup.add_argument("-r", "--repeat", type=int, default=3, help="Runs per case, the fastest is kept")
+    startup.add_argument("-o", "--output", help="Write the results to this json file")
+
+    suite = subparsers.add_parser("suite", help="Time every stage on real or synthetic data and gate on a baseline")
+    suite.add_argument("root", nargs="?", help="A Month_Data directory (default: a synthetic tree)")
+    suite.add_argument("-s", "--stations", type=int, default=2, help="Synthetic stations")
+    suite.add_argument("-y", "--years", type=int, default=5, help="Synthetic years per station")
+    suite.add_argument("-n", "--sample", type=int, default=48, help="Months used by the per-month cases")
+    suite.add_argument("-r", "--repeat", type=int, default=3, help="Runs per case, the fastest is kept")
+    suite.add_argument("-c", "--cases", nargs="+", help="Only these cases")
+    suite.add_argument("-o", "--output", help="Write the results to this json file")
+    suite.add_argument("-b", "--baseline", help="A results json file to compare with")
+    suite.add_argument("-t", "--threshold", type=float, default=0.2,
+                       help="Allowed slowdown per case before the run fails, 0.2 for 20%%")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two suite results and fail on regressions")
+    compare_parser.add_argument("results", help="The results json file")
+    compare_parser.add_argument("baseline", help="The baseline json file")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                                help="Allowed slowdown per case, 0.2 for 20%%")
+
+    args = parser.parse_args()
+
+    if args.command in ("suite", "compare"):
+        if args.command == "suite":
+            results = run_suite(args.root, args.stations, args.years, args.sample, args.repeat, args.cases)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, indent=2)
+        else:
+            with open(args.results, encoding='utf-8') as f:
+                results = json.load(f)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, args.threshold)
+            if regressions:
+                sys.exit(f"{len(regressions)} cases regressed by more than {args.threshold:.0%}: "
+                         f"{', '.join(regressions)}")
+    elif args.command == "si":
+        files = args.files or [os.path.basename(path) for paths in month_files().values() for path in paths]
+        bench_si(files, args.repeat)
+    elif args.command == "extract":
+        bench_extract(args.corpus, args.repeat, args.padding)
+    elif args.command == "startup":
+        bench_startup(args.repeat, args.output)
+
+
+if __name__ == "__main__":
+    main()
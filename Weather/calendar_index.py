@@ -0,0 +1,125 @@
+import calendar
+import re
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+
+# '{station}_{year}_{month}.{ext}', optionally prefixed with 'SI_' for converted files.
+FILE_NAME = re.compile(r'^(?:SI_)?(?P<station>[A-Za-z][A-Za-z0-9]*(?:_[A-Za-z][A-Za-z0-9]*)*)'
+                       r'_(?P<year>\d{4})_(?P<month>\d{1,2})\.[A-Za-z0-9.]+$')
+
+DEFAULT_STATION = 'spata_venizelos'
+
+SEASONS = ('winter', 'spring', 'summer', 'autumn')
+
+
+class MonthKey(NamedTuple):
+    """One month of one station, the key of every per-month file."""
+    station: str
+    year: int
+    month: int
+
+    def file_name(self, extension: str = 'csv', prefix: str = '') -> str:
+        """Returns the '{prefix}{station}_{year}_{month}.{extension}' file name of the month."""
+        return f'{prefix}{self.station}_{self.year}_{self.month}.{extension}'
+
+
+def parse_key(path: str) -> MonthKey:
+    """
+    Parses the station, year and month out of a per-month file name or path.
+
+    :arg path: A path like 'Month_Data/spata_venizelos_2024_1.csv' or 'SI_spata_venizelos_2024_1.csv'.
+
+    :raises ValueError: If the name does not follow '{station}_{year}_{month}.{ext}'.
+    """
+
+    name = path.replace('\\', '/').rsplit('/', 1)[-1]
+    match = FILE_NAME.match(name)
+    if not match or not 1 <= int(match.group('month')) <= 12:
+        raise ValueError(f"'{name}' is not a '{{station}}_{{year}}_{{month}}' file name.")
+    return MonthKey(match.group('station'), int(match.group('year')), int(match.group('month')))
+
+
+@lru_cache(maxsize=None)
+def month_days(year: int, month: int) -> int:
+    """Returns the number of days of a month."""
+    return calendar.monthrange(year, month)[1]
+
+
+def month_start(year: int, month: int) -> np.datetime64:
+    """Returns the first day of a month."""
+    return np.datetime64(f'{year:04d}-{month:02d}-01', 'D')
+
+
+def month_end(year: int, month: int) -> np.datetime64:
+    """Returns the last day of a month."""
+    return month_start(year, month) + month_days(year, month) - 1
+
+
+@lru_cache(maxsize=1024)
+def month_dates(year: int, month: int) -> np.ndarray:
+    """Returns the datetime64 days of a month, a cached read-only array."""
+    dates = np.arange(month_start(year, month), month_end(year, month) + 1)
+    dates.setflags(write=False)
+    return dates
+
+
+def day_range(start, end) -> np.ndarray:
+    """Returns every datetime64 day of an inclusive range, as one arange."""
+    return np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+
+
+def date_labels(dates: np.ndarray) -> list:
+    """Returns the 'YYYY-MM-DD' text of datetime64 days."""
+    return np.datetime_as_string(dates, unit='D').tolist()
+
+
+def months(start: tuple, end: tuple) -> list:
+    """Returns every (year, month) from start to end, inclusive."""
+    codes = np.arange(start[0] * 12 + start[1] - 1, end[0] * 12 + end[1])
+    return list(zip((codes // 12).tolist(), (codes % 12 + 1).tolist()))
+
+
+def month_code(year, month):
+    """Returns the running month number year * 12 + month - 1, of scalars or arrays."""
+    return year * 12 + month - 1
+
+
+def from_month_code(code) -> tuple:
+    """Returns the (year, month) of a month_code, of scalars or arrays."""
+    return code // 12, code % 12 + 1
+
+
+def date_month(date) -> tuple:
+    """Returns the (year, month) of a datetime64 day."""
+    return from_month_code(int(np.datetime64(date, 'M').astype(np.int64)) + 1970 * 12)
+
+
+def day_offset(date, origin: np.datetime64) -> int:
+    """Returns the number of days from origin to date."""
+    return int((np.datetime64(date, 'D') - origin).astype(np.int64))
+
+
+def season_of(year: int, month: int) -> tuple:
+    """Returns the (year, season) of a month, December counting towards the winter of the next year."""
+    return (year + 1 if month == 12 else year), SEASONS[month % 12 // 3]
+
+
+def season_codes(year, month):
+    """Returns year * 4 + season index of the season of every month, of scalars or arrays."""
+    return (year + (month == 12)) * 4 + month % 12 // 3
+
+
+def season_months(year: int, season: str) -> list:
+    """Returns the (year, month) of the three months of a season, December of the previous year for winter."""
+    first = SEASONS.index(season) * 3
+    return [(year - 1, 12), (year, 1), (year, 2)] if first == 0 else [(year, m) for m in range(first, first + 3)]
+
+
+def season_order(key: tuple) -> tuple:
+    """Sort key placing (year, season) pairs in calendar order."""
+    year, season = key
+    return year, SEASONS.index(season)
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+
+from typing import NamedTuple
+
+import numpy as np
+
+from calendar_index import DEFAULT_STATION, day_range
+from converter import DECIMALS
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS, variable_slice
+
+
+# How every variable is stored: scaled integers, scaled integers as day to day deltas for the
+# slowly moving pressure, or runs of equal scaled integers for the mostly dry precipitation.
+ENCODINGS = {
+    'temperature': 'scaled',
+    'dew_point': 'scaled',
+    'humidity': 'scaled',
+    'wind_speed': 'scaled',
+    'pressure': 'delta',
+    'precipitation': 'rle',
+}
+
+# The smallest integer type of a column is the first of these that holds its range, with the
+# minimum of the type reserved for missing values.
+INTEGER_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+COMPACT_FILE = 'daily.npz'
+
+
+def integer_type(low: int, high: int):
+    """Returns the smallest INTEGER_TYPES type holding low to high above its missing value."""
+    for integer in INTEGER_TYPES:
+        info = np.iinfo(integer)
+        if info.min < low and high <= info.max:
+            return integer
+    raise ValueError(f"{low} to {high} does not fit in an integer column.")
+
+
+def column_scale(values: np.ndarray) -> int:
+    """
+    Returns the smallest power of ten that turns every value into an integer that decodes back exactly.
+
+    :raises ValueError: If the values have more than converter.DECIMALS decimals.
+    """
+
+    valid = values[~np.isnan(values)]
+    for decimals in range(DECIMALS + 1):
+        scale = 10 ** decimals
+        if np.array_equal(np.rint(valid * scale) / scale, valid):
+            return scale
+    raise ValueError(f"Values with more than {DECIMALS} decimals cannot be encoded.")
+
+
+class EncodedColumn(NamedTuple):
+    """One column of a history as integers, decoded as values / scale."""
+    encoding: str
+    scale: int
+    # The first scaled value of a delta column.
+    base: int
+    # Scaled values, deltas from the previous day, or the value of every run.
+    data: np.ndarray
+    # The run lengths of an rle column, the packed missing days of a delta column.
+    aux: np.ndarray
+    rows: int
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.aux.nbytes
+
+    def decode(self) -> np.ndarray:
+        """Returns the float64 values of the column, NaN for missing days."""
+        if self.encoding == 'delta':
+            scaled = np.empty(self.rows, dtype=np.int64)
+            if self.rows:
+                scaled[0] = self.base
+                np.cumsum(self.data, dtype=np.int64, out=scaled[1:])
+                scaled[1:] += self.base
+            values = scaled / self.scale
+            if len(self.aux):
+                values[np.unpackbits(self.aux, count=self.rows).astype(bool)] = np.nan
+            return values
+        data = self.data if self.encoding == 'scaled' else np.repeat(self.data, self.aux)
+        values = data / self.scale
+        values[data == np.iinfo(data.dtype).min] = np.nan
+        return values
+
+
+def encode_column(values: np.ndarray, encoding: str) -> EncodedColumn:
+    """
+    Encodes a float column losslessly.
+
+    :arg values: The column, NaN for missing days.
+    :arg encoding: 'scaled', 'delta' or 'rle'.
+
+    :raises ValueError: If the encoding is unknown or the values have too many decimals.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    scale = column_scale(values)
+    missing = np.isnan(values)
+    scaled = np.rint(np.where(missing, 0, values) * scale).astype(np.int64)
+    empty = np.empty(0, dtype=np.uint8)
+
+    if encoding == 'delta':
+        if missing.any():
+            # Missing days repeat the previous value, a delta of zero, and are masked on decode.
+            last = np.maximum.accumulate(np.where(missing, -1, np.arange(len(values))))
+            scaled = scaled[np.maximum(last, 0)]
+        deltas = np.diff(scaled)
+        low, high = (int(deltas.min()), int(deltas.max())) if len(deltas) else (0, 0)
+        return EncodedColumn(encoding, scale, int(scaled[0]) if len(scaled) else 0,
+                             deltas.astype(integer_type(low, high)),
+                             np.packbits(missing) if missing.any() else empty, len(values))
+
+    if encoding not in ('scaled', 'rle'):
+        raise ValueError(f"Unknown encoding '{encoding}'.")
+    low, high = (int(scaled.min()), int(scaled.max())) if len(scaled) else (0, 0)
+    integer = integer_type(low, high)
+    scaled = scaled.astype(integer)
+    scaled[missing] = np.iinfo(integer).min
+    if encoding == 'scaled':
+        return EncodedColumn(encoding, scale, 0, scaled, empty, len(values))
+    starts = np.flatnonzero(np.concatenate([[len(scaled) > 0], scaled[1:] != scaled[:-1]]))
+    lengths = np.diff(np.append(starts, len(scaled)))
+    return EncodedColumn(encoding, scale, 0, scaled[starts],
+                         lengths.astype(integer_type(0, int(lengths.max()) if len(lengths) else 0)), len(values))
+
+
+class CompactHistory:
+    """
+    The rows x FIELDS days of a DailyArchive kept as small integer columns, for holding the histories
+    of many stations in memory. Most columns fit int16, so a history takes about a quarter of its
+    float64 size (4.4x smaller on the Spata history).
+
+    Columns are decoded into float64 arrays only when they are read, and read again from
+    their integers every time, so the history itself never grows.
+    """
+
+    def __init__(self, start, columns: list):
+        """
+        :arg start: The datetime64 date of the first row.
+        :arg columns: The EncodedColumn of every FIELDS entry.
+        """
+        self.start = start
+        self.columns = columns
+        self.rows = columns[0].rows if columns else 0
+
+    @classmethod
+    def encode(cls, values: np.ndarray, start) -> 'CompactHistory':
+        """Encodes a rows x FIELDS block, like DailyArchive.values, starting at a date."""
+        return cls(np.datetime64(start, 'D'),
+                   [encode_column(values[:, i], ENCODINGS[key]) for i, (key, _) in enumerate(FIELDS)])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns)
+
+    @property
+    def dates(self) -> np.ndarray:
+        """The datetime64 date of every row."""
+        return day_range(self.start, self.start + self.rows - 1) if self.rows else np.array([], 'datetime64[D]')
+
+    def field(self, key: str, stat: str = 'Avg') -> np.ndarray:
+        """Decodes one (variable, stat) of every day."""
+        return self.columns[FIELDS.index((key, stat))].decode()
+
+    def column(self, key: str) -> np.ndarray:
+        """Decodes the days x stats of one variable."""
+        return np.column_stack([column.decode() for column in self.columns[variable_slice(key)]])
+
+    def values(self) -> np.ndarray:
+        """Decodes the whole rows x FIELDS block."""
+        return np.column_stack([column.decode() for column in self.columns]) if self.columns else np.empty((0, 0))
+
+    def save(self, path: str):
+        """Writes the history to an .npz file, through a temporary file."""
+        meta = {'start': str(self.start), 'fields': [list(field) for field in FIELDS],
+                'columns': [[c.encoding, c.scale, c.base, c.rows] for c in self.columns]}
+        arrays = {'meta': np.array(json.dumps(meta))}
+        for i, column in enumerate(self.columns):
+            arrays[f'data_{i}'], arrays[f'aux_{i}'] = column.data, column.aux
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CompactHistory':
+        """
+        Reads a history written by save.
+
+        :raises ValueError: If it was written with another FIELDS layout.
+        """
+        with np.load(path) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if meta['fields'] != [list(field) for field in FIELDS]:
+                raise ValueError(f"'{path}' was written with another layout, compact the archive again.")
+            columns = [EncodedColumn(encoding, scale, base, arrays[f'data_{i}'], arrays[f'aux_{i}'], rows)
+                       for i, (encoding, scale, base, rows) in enumerate(meta['columns'])]
+        return cls(np.datetime64(meta['start'], 'D'), columns)
+
+
+def compact_archive(archive) -> CompactHistory:
+    """Encodes a DailyArchive and saves it next to its memory map."""
+    history = CompactHistory.encode(archive.values, archive.start)
+    history.save(os.path.join(archive.directory, COMPACT_FILE))
+    return history
+
+
+def load_histories(directory: str = 'Archive', stations: list = None) -> dict:
+    """
+    Loads the compacted history of every station, every one compacted under directory by default.
+
+    :returns dict: The CompactHistory of every station id.
+    """
+
+    if stations is None:
+        stations = sorted(name for name in os.listdir(directory)
+                          if os.path.exists(os.path.join(directory, name, COMPACT_FILE)))
+    return {station: CompactHistory.load(os.path.join(directory, station, COMPACT_FILE)) for station in stations}
+
+
+def main():
+    from archive import DailyArchive
+
+    parser = argparse.ArgumentParser(description="Compact daily archives into small integer columns.")
+    parser.add_argument("-s", "--station", nargs="+", default=[DEFAULT_STATION], help="The stations to compact")
+    parser.add_argument("-d", "--directory", default='Archive', help="The archive directory")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('codec', args.profile, args.metrics):
+        for station in args.station:
+            archive = DailyArchive(args.directory, station)
+            if not archive.rows:
+                print(f"The archive of {station} is empty.")
+                continue
+            history = compact_archive(archive)
+            if not np.array_equal(history.values(), archive.values, equal_nan=True):
+                raise AssertionError(f"The compacted history of {station} does not decode to the archive.")
+            print(f"{station}: {archive.rows} days, {archive.values.nbytes / 1024:.1f} KiB as float64, "
+                  f"{history.nbytes / 1024:.1f} KiB compacted ({archive.values.nbytes / history.nbytes:.1f}x).")
+            for (key, stat), column in zip(FIELDS, history.columns):
+                print(f"  {key + ' ' + stat:28} {column.encoding:6} x{column.scale:<4} {column.data.dtype.name:6} "
+                      f"{column.nbytes:9d} bytes")
+
+
+if __name__ == "__main__":
+    main()
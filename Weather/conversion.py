@@ -0,0 +1,99 @@
+from converter import convert_block
+from instrument import span
+from month_parser import FIELDS, MonthData, parse_month
+from si_cache import SICache
+from stations import resolve
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+# Bump whenever convert_month changes, so cached months of older conversions are not reused.
+CONVERTER_VERSION = 2
+
+month_cache = SICache('SI_Cache', CONVERTER_VERSION)
+
+# SI column name of every MonthData variable, in the order of create_output_dataframe.
+SI_COLUMNS = {
+    'temperature': 'Temperature (°C)',
+    'dew_point': 'Dew Point (°C)',
+    'humidity': 'Humidity (%)',
+    'wind_speed': 'Wind Speed (mps)',
+    'pressure': 'Pressure (hPa)',
+    'precipitation': 'Precipitation (mm)',
+}
+
+# The (source unit, SI unit) of every MonthData variable, converted through converter.CONVERSIONS.
+UNITS = {
+    'temperature': ('degF', 'degC'),
+    'dew_point': ('degF', 'degC'),
+    'humidity': ('%', '%'),
+    'wind_speed': ('mph', 'm/s'),
+    'pressure': ('inHg', 'hPa'),
+    'precipitation': ('in', 'mm'),
+}
+
+# The units of every block column, in FIELDS order.
+COLUMN_UNITS = [UNITS[key] for key, _ in FIELDS]
+
+
+def convert_month(data: MonthData, dtype=None) -> MonthData:
+    """
+    Converts a parsed month to SI units in one pass over its whole block.
+
+    :arg data: The month as returned by parse_month.
+    :arg dtype: The type of the SI block, like np.float32. None converts the block in place.
+
+    :returns MonthData: The same month, with its block in SI units.
+    """
+
+    with span('convert_unit', rows=len(data.days), columns=len(COLUMN_UNITS)):
+        data.block = convert_block(data.block, COLUMN_UNITS, dtype)
+    return data
+
+
+def si_month(file: str) -> MonthData or None:
+    """
+        Reads a Month_Data csv with the bulk parser and converts it to SI units.
+
+        :arg file: The csv file name inside Month_Data, in either layout.
+
+        :returns MonthData: The month in SI units, or None if an error occurs.
+        """
+
+    try:
+        data = parse_month(resolve(file))
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(f"Error reading file '{file}': {e}")
+        return None
+    return convert_month(data)
+
+
+def load_si(path: str) -> MonthData:
+    """
+    Returns the month of a Month_Data csv path in SI units through month_cache.
+
+    :arg path: The path to the Month_Data csv file.
+
+    :raises FileNotFoundError, ValueError: If the file is missing or cannot be parsed.
+    """
+    return month_cache.load(path, lambda: convert_month(parse_month(path)))
+
+
+def cached_si_month(file: str) -> MonthData or None:
+    """
+        Returns a month in SI units from month_cache, parsing the csv only on a cache miss.
+
+        :arg file: The csv file name inside Month_Data.
+
+        :returns MonthData: The month in SI units, or None if an error occurs.
+        """
+
+    try:
+        return load_si(resolve(file))
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(f"Error reading file '{file}': {e}")
+        return None
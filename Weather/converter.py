@@ -1,6 +1,59 @@
 import numpy as np
 
 
+# (scale, offset) of every (source unit, target unit) pair, such that target = source * scale + offset.
+CONVERSIONS = {
+    ('degF', 'degC'): (5 / 9, -32 * 5 / 9),
+    ('mph', 'm/s'): (0.44704, 0.0),
+    ('inHg', 'hPa'): (33.8639, 0.0),
+    ('in', 'mm'): (25.4, 0.0),
+    ('%', '%'): (1.0, 0.0),
+}
+
+# Decimals kept in every converted value.
+DECIMALS = 2
+
+
+def conversion_vectors(units: list) -> tuple:
+    """
+    Returns the scale and offset vectors of a list of (source unit, target unit) pairs.
+
+    :raises ValueError: If a pair is not in CONVERSIONS.
+    """
+    try:
+        scale, offset = zip(*(CONVERSIONS[tuple(pair)] for pair in units))
+    except KeyError as e:
+        raise ValueError(f"No conversion from {e.args[0][0]} to {e.args[0][1]}.") from None
+    return np.array(scale), np.array(offset)
+
+
+def convert_block(block: np.ndarray, units: list, dtype=None, decimals: int = DECIMALS) -> np.ndarray:
+    """
+    Converts every column of a block with one multiply, add and round over the whole array.
+
+    :arg block: A rows x columns array, or any array whose last axis holds the columns.
+    :arg units: The (source unit, target unit) of every column.
+    :arg dtype: The output type, like np.float32. None converts the block in place.
+    :arg decimals: The decimals kept, None for no rounding.
+
+    :returns np.ndarray: The converted block, the given one when converted in place.
+    """
+
+    scale, offset = conversion_vectors(units)
+    out = block if dtype is None or np.dtype(dtype) == block.dtype else np.empty(block.shape, dtype)
+    np.multiply(block, scale, out=out, casting='same_kind')
+    np.add(out, offset, out=out, casting='same_kind')
+    if decimals is not None:
+        np.round(out, decimals, out=out)
+    return out
+
+
+def convert(values, source: str, target: str) -> np.ndarray:
+    """Converts a list or array of values from one unit to another, rounded to DECIMALS."""
+    values = np.array(values, dtype=np.float64)
+    return convert_block(values[..., np.newaxis], [(source, target)])[..., 0]
+
+
 class ConverterToSIWeather:
     """
     A class for converting temperatures, wind speed and pressure from Imperial weather units to SI weather units.
@@ -30,9 +83,7 @@ class ConverterToSIWeather:
             A list of Celsius temperatures.
         """
 
-        far = np.array(temp)
-        cel = np.round((far - 32) * 5 / 9, decimals=2)
-        return cel
+        return convert(temp, 'degF', 'degC')
 
     def to_float(self, s):
         """
@@ -56,9 +107,7 @@ class ConverterToSIWeather:
         Returns:
             :return mps: A list or array of wind speeds in meters per second.
         """
-        mps = np.array(mph)
-
-        return np.round(mps, 2)
+        return convert(mph, 'mph', 'm/s')
 
     def to_hPc(self, inches):
         """
@@ -70,9 +119,19 @@ class ConverterToSIWeather:
         Returns:
             :returns: A list or array of pressures in hectoPascal.
         """
-        hPc = np.array(inches)
+        return convert(inches, 'inHg', 'hPa')
 
-        return np.round(hPc * 33.8639, 2)
+    def to_mm(self, inches):
+        """
+        Converts precipitation from inches to millimeters.
+
+        Args:
+            :param inches: A list or array of precipitation depths in inches.
+
+        Returns:
+            :returns: A list or array of precipitation depths in millimeters.
+        """
+        return convert(inches, 'in', 'mm')
 
 
 # Example usage
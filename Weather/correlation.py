@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from archive import DailyArchive
+from calendar_index import (DEFAULT_STATION, date_month, from_month_code, month_code, month_end, month_start,
+                            season_months)
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS, MonthData
+
+
+class Moments:
+    """
+    Mergeable co-moments of every pair of FIELDS columns, using the days where both are observed.
+
+    For the pair (i, j), count[i, j] is the number of such days, mean[i, j] and m2[i, j] the mean
+    and the sum of squared deviations of column i over them, and comoment[i, j] the sum of the
+    products of both deviations. A batch of days is summarised in O(days) and two summaries are
+    merged with Chan's pairwise formulas, so months, shards or workers combine to the same
+    result as one pass over all their days.
+    """
+
+    def __init__(self, count=None, mean=None, m2=None, comoment=None):
+        size = len(FIELDS)
+        self.count = np.zeros((size, size)) if count is None else count
+        self.mean = np.zeros((size, size)) if mean is None else mean
+        self.m2 = np.zeros((size, size)) if m2 is None else m2
+        self.comoment = np.zeros((size, size)) if comoment is None else comoment
+
+    @classmethod
+    def from_values(cls, values: np.ndarray):
+        """Summarises a days x FIELDS block, NaN marking missing observations."""
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return cls()
+        # Deviations from the column means keep the sums of squares small and accurate.
+        filled = np.where(valid, values, 0.0)
+        shift = filled.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+        x = np.where(valid, filled - shift, 0.0)
+        v = valid.astype(np.float64)
+
+        count = v.T @ v
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, (x.T @ v) / count, 0.0)
+            m2 = (x ** 2).T @ v - count * mean ** 2
+            comoment = x.T @ x - count * mean * mean.T
+        return cls(count, mean + shift[:, None], np.maximum(m2, 0.0), comoment)
+
+    def merge(self, other):
+        """Returns the moments of the days of both summaries."""
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(count > 0, self.count * other.count / count, 0.0)
+            mean = self.mean + delta * np.where(count > 0, other.count / count, 0.0)
+        m2 = self.m2 + other.m2 + delta ** 2 * weight
+        comoment = self.comoment + other.comoment + delta * delta.T * weight
+        return Moments(count, mean, m2, comoment)
+
+    def covariance(self) -> np.ndarray:
+        """The FIELDS x FIELDS sample covariance, NaN for pairs with fewer than two common days."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self.comoment / (self.count - 1), np.nan)
+
+    def correlation(self) -> np.ndarray:
+        """The FIELDS x FIELDS Pearson correlation, NaN where a column does not vary."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self.comoment / np.sqrt(self.m2 * self.m2.T), np.nan)
+
+    def pair(self, first: tuple, second: tuple) -> float:
+        """Returns the correlation of two (variable, stat) fields."""
+        return float(self.correlation()[FIELDS.index(first), FIELDS.index(second)])
+
+    def to_array(self) -> np.ndarray:
+        return np.stack([self.count, self.mean, self.m2, self.comoment])
+
+    @classmethod
+    def from_array(cls, array: np.ndarray):
+        return cls(*np.array(array))
+
+
+class CorrelationIndex:
+    """
+    The Moments of every archived month, kept in one memory mapped table next to the archive.
+
+    A new month is summarised once from its own days and never rescanned; a month, a season
+    or any date range is answered by merging the stored months it covers, summarising only
+    the days of partially covered months at its ends. Every station has its own table, in a
+    subdirectory named after it.
+    """
+
+    def __init__(self, archive: DailyArchive = None, directory: str = 'Correlations'):
+        self.archive = archive or DailyArchive()
+        self.directory = os.path.join(directory, self.archive.station)
+        self._data_path = os.path.join(self.directory, 'monthly.bin')
+        self._meta_path = os.path.join(self.directory, 'correlations.json')
+        self.months = 0
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['start'] == str(self.archive.start):
+                self.months = meta['months']
+
+    def update(self, data: MonthData):
+        """Stores the moments of a month that was just written to the archive."""
+        if self.archive.start is None:
+            return
+        index = self._month_index(data.year, data.month)
+        table = self._grow(index + 1)
+        table[index] = Moments.from_values(data.block).to_array()
+        table.flush()
+        self.months = max(self.months, index + 1)
+        self._save_meta()
+
+    def rebuild(self):
+        """Summarises every archived month again."""
+        self.months = 0
+        if os.path.exists(self._data_path):
+            os.remove(self._data_path)
+        if self.archive.rows:
+            count = self._month_index(*date_month(self.archive.dates[-1])) + 1
+            table = self._grow(count)
+            for index in range(count):
+                start, end = self._month_bounds(index)
+                table[index] = Moments.from_values(self.archive.range(start, end)[1]).to_array()
+            table.flush()
+            self.months = count
+        self._save_meta()
+
+    def month(self, year: int, month: int) -> Moments:
+        """Returns the moments of one archived month."""
+        index = self._month_index(year, month)
+        if not 0 <= index < self.months:
+            return Moments()
+        return Moments.from_array(self._table()[index])
+
+    def season(self, year: int, season: str) -> Moments:
+        """Returns the moments of a (year, season), December counting towards the next winter."""
+        moments = Moments()
+        for key in season_months(year, season):
+            moments = moments.merge(self.month(*key))
+        return moments
+
+    def period(self, start, end) -> Moments:
+        """
+        Returns the moments of an inclusive date range.
+
+        :arg start: The first date, as a date, datetime64 or 'YYYY-MM-DD'.
+        :arg end: The last date.
+        """
+
+        start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+        moments = Moments()
+        if self.archive.start is None or end < start:
+            return moments
+        table = self._table()
+        for code in range(month_code(*date_month(start)), month_code(*date_month(end)) + 1):
+            year, month = from_month_code(code)
+            first, last = month_start(year, month), month_end(year, month)
+            index = self._month_index(year, month)
+            if start <= first and last <= end and 0 <= index < self.months:
+                moments = moments.merge(Moments.from_array(table[index]))
+            else:
+                values = self.archive.range(max(first, start), min(last, end))[1]
+                moments = moments.merge(Moments.from_values(np.asarray(values)))
+        return moments
+
+    def _month_index(self, year: int, month: int) -> int:
+        return month_code(year, month) - month_code(*date_month(self.archive.start))
+
+    def _month_bounds(self, index: int) -> tuple:
+        year, month = from_month_code(month_code(*date_month(self.archive.start)) + index)
+        return month_start(year, month), month_end(year, month)
+
+    def _table(self) -> np.ndarray:
+        if not self.months:
+            return np.empty((0, 4, len(FIELDS), len(FIELDS)))
+        return np.memmap(self._data_path, dtype=np.float64, mode='r',
+                         shape=(self.months, 4, len(FIELDS), len(FIELDS)))
+
+    def _grow(self, length: int) -> np.memmap:
+        """Opens the table for writing, appending empty months up to length."""
+        os.makedirs(self.directory, exist_ok=True)
+        length = max(length, self.months)
+        shape = (4, len(FIELDS), len(FIELDS))
+        if length > self.months or not os.path.exists(self._data_path):
+            with open(self._data_path, 'ab' if self.months else 'wb') as f:
+                np.zeros((length - self.months,) + shape).tofile(f)
+        return np.memmap(self._data_path, dtype=np.float64, mode='r+', shape=(length,) + shape)
+
+    def _save_meta(self):
+        meta = {'start': str(self.archive.start), 'months': self.months}
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._meta_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the correlations of the daily archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Summarise every archived month again")
+    show = subparsers.add_parser("show", help="Print the correlation matrix of a date range")
+    show.add_argument("start", help="First day, YYYY-MM-DD")
+    show.add_argument("end", help="Last day, YYYY-MM-DD")
+    show.add_argument("-s", "--stat", choices=["Max", "Avg", "Min", "all"], default="Avg",
+                      help="The statistic of every variable to correlate")
+    parser.add_argument("-t", "--station", default=DEFAULT_STATION, help="The station of the archive")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('correlation', args.profile, args.metrics):
+        index = CorrelationIndex(DailyArchive(station=args.station))
+        if args.command == "rebuild":
+            index.rebuild()
+            print(f"Summarised {index.months} months.")
+            return
+
+        moments = index.period(args.start, args.end)
+        columns = [i for i, (key, stat) in enumerate(FIELDS)
+                   if args.stat == 'all' or stat in (args.stat, 'Total')]
+        names = [f'{FIELDS[i][0]}_{FIELDS[i][1].lower()}' for i in columns]
+        correlation = moments.correlation()
+        print(f"{int(moments.count.max())} days")
+        print(' ' * 22 + ''.join(f'{name[:10]:>11}' for name in names))
+        for i, name in zip(columns, names):
+            print(f'{name:22}' + ''.join(f'{correlation[i, j]:11.3f}' for j in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,28 @@
-from datetime import datetime, timedelta
+import argparse
+
+
+# calendar_index pulls in numpy, so it is imported by the functions that use it, keeping
+# parse_year_month cheap for the weather CLI.
 
 
 def extract_month_and_year(filename):
     """
     Extracts the month and year from the given cvs file.
-    The filename has this format 'spata_venizelos_{int(year)}_{int(month)}.csv'
+    The filename has this format '{station}_{int(year)}_{int(month)}.csv'
+
+    :raises ValueError: If the filename does not have this format.
     """
-    try:
-        month = int(filename[21:-4])
-        year = int(filename[16:20])
-        return month, year
-    except ValueError:
-        print("Wrong File Name Format.")
-    except TypeError:
-        print("Wrong File Name Format.")
+    from calendar_index import parse_key
+
+    key = parse_key(filename)
+    return key.month, key.year
 
 
 def generate_dates(month, year):
-    """Generates a list of dates within the specified month and year."""
-    day = timedelta(days=1)
-    d = datetime(year, month, 1)
-    dates = []
-    while d.month == month:
-        dates.append(d.strftime('%Y-%m-%d'))
-        d += day
-    return dates
+    """Generates a list of 'YYYY-MM-DD' dates within the specified month and year."""
+    from calendar_index import date_labels, month_dates
+
+    return date_labels(month_dates(year, month))
 
 
 class DateGenerator:
@@ -41,3 +39,21 @@ class DateGenerator:
     def get_month_year(self):
         """Returns the month and year extracted from the filename."""
         return extract_month_and_year(self.filename)
+
+
+def parse_year_month(value: str) -> tuple:
+    """Parses a 'YYYY-MM' command line value."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected YYYY-MM, got '{value}'")
+    if not 1 <= month <= 12:
+        raise argparse.ArgumentTypeError(f"Invalid month in '{value}'")
+    return year, month
+
+
+def month_span(start: tuple, end: tuple) -> list:
+    """Returns every (year, month) from start to end, inclusive."""
+    from calendar_index import months
+
+    return months(start, end)
@@ -0,0 +1,268 @@
+import argparse
+import calendar
+import hashlib
+import os
+
+import numpy as np
+
+from conversion import load_si
+from calendar_index import MonthKey, parse_key, season_months, season_of, season_order
+from date import parse_year_month
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS, find_sources
+from stations import month_path, month_root
+
+
+# Bump when the binning or the kde changes, so stored summaries are computed again.
+DISTRIBUTION_VERSION = 2
+
+# (bin width, kde bandwidth factor, kde bandwidth adjustment) of every variable, in SI units.
+# A factor of None uses Scott's rule, like seaborn's kdeplot.
+DISTRIBUTIONS = {
+    'temperature': (0.5, None, 1.0),
+    'dew_point': (1.0, None, 1.0),
+    'humidity': (2.0, None, 1.0),
+    'wind_speed': (1.0, None, 1.0),
+    'pressure': (1.0, 1.0, 0.5),
+    'precipitation': (1.0, None, 1.0),
+}
+
+# Evaluation points of every kde curve, and how far past the data it extends, in bandwidths.
+GRID_SIZE = 200
+CUT = 3
+
+# Bins are widened rather than exceeding this count, e.g. for a broken sensor value.
+MAX_BINS = 512
+
+
+class Distribution:
+    """
+    The histogram and kde of every FIELDS column over a period, a month or a season.
+
+    Histogram i has bins[i] bins of width[i] starting at low[i], holding the probability of
+    each bin in the first bins[i] entries of probabilities[i]. Its kde is density[i] at x[i].
+    """
+
+    def __init__(self, label, digest, low, width, bins, probabilities, x, density):
+        self.label = label
+        self.digest = digest
+        self.low = low
+        self.width = width
+        self.bins = bins
+        self.probabilities = probabilities
+        self.x = x
+        self.density = density
+
+    def histogram(self, key: str, stat: str = 'Avg') -> tuple:
+        """Returns the bin edges and the bin probabilities of a variable statistic."""
+        i = FIELDS.index((key, stat))
+        n = self.bins[i]
+        return self.low[i] + self.width[i] * np.arange(n + 1), self.probabilities[i, :n]
+
+    def kde(self, key: str, stat: str = 'Avg') -> tuple:
+        """Returns the evaluation points and the density of a variable statistic, NaN if it has no spread."""
+        i = FIELDS.index((key, stat))
+        return self.x[i], self.density[i]
+
+    def save(self, path: str):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, label=self.label, digest=self.digest, low=self.low, width=self.width, bins=self.bins,
+                 probabilities=self.probabilities, x=self.x, density=self.density)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            return cls(str(f['label']), str(f['digest']), f['low'], f['width'], f['bins'], f['probabilities'],
+                       f['x'], f['density'])
+
+
+def _parameters(columns: int) -> tuple:
+    """Returns the bin width, bandwidth factor and adjustment of FIELDS repeated over a number of columns."""
+    width, factor, adjust = zip(*(DISTRIBUTIONS[key] for key, _ in FIELDS))
+    factor = [np.nan if f is None else f for f in factor]
+    reps = columns // len(FIELDS)
+    return tuple(np.tile(np.array(p, dtype=np.float64), reps) for p in (width, factor, adjust))
+
+
+def summarize(values: np.ndarray) -> tuple:
+    """
+    Computes the fixed-bin histogram and the binned kde of every column at once.
+
+    The columns repeat the FIELDS layout, so many periods can be summarised in one call by
+    placing their blocks side by side, shorter ones padded with NaN. The kde bins every column
+    on its grid with linear binning and convolves the bins with the Gaussian kernel through
+    one FFT, instead of evaluating the kernel at every point for every observation.
+
+    :arg values: A rows x (periods * FIELDS) array, NaN marking missing observations.
+
+    :returns tuple: low, width, bins, probabilities, x and density, one row per column.
+    """
+
+    rows, columns = values.shape
+    width, factor, adjust = _parameters(columns)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    filled = np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low_value = np.nanmin(np.where(valid, values, np.inf), axis=0)
+        high_value = np.nanmax(np.where(valid, values, -np.inf), axis=0)
+        empty = count == 0
+        low_value[empty], high_value[empty] = 0.0, 0.0
+
+        # Histograms, with edges on multiples of the bin width.
+        width = np.maximum(width, (high_value - low_value) / MAX_BINS)
+        low = np.floor(low_value / width) * width
+        bins = np.floor((high_value - low) / width).astype(np.int64) + 1
+        size = int(bins.max())
+        index = np.minimum(np.floor((filled - low) / width).astype(np.int64), bins - 1)
+        flat = (index + np.arange(columns) * size)[valid]
+        probabilities = np.bincount(flat, minlength=columns * size).reshape(columns, size).astype(np.float64)
+        probabilities /= np.maximum(count, 1)[:, None]
+
+        # Bandwidths, Scott's rule unless the variable sets its own factor.
+        mean = filled.sum(axis=0) / count
+        std = np.sqrt(np.where(valid, (filled - mean) ** 2, 0.0).sum(axis=0) / (count - 1))
+        factor = np.where(np.isnan(factor), count ** -0.2, factor)
+        bandwidth = std * factor * adjust
+        usable = (count > 1) & (bandwidth > 0)
+        bandwidth = np.where(usable, bandwidth, 1.0)
+
+        # Linear binning of every column onto its own grid.
+        start = low_value - CUT * bandwidth
+        step = (high_value - low_value + 2 * CUT * bandwidth) / (GRID_SIZE - 1)
+        x = start[:, None] + step[:, None] * np.arange(GRID_SIZE)
+        position = (filled - start) / step
+        left = np.clip(np.floor(position).astype(np.int64), 0, GRID_SIZE - 2)
+        right_weight = np.where(valid, position - left, 0.0)
+        left_weight = np.where(valid, 1.0 - right_weight, 0.0)
+        offset = np.arange(columns) * GRID_SIZE
+        grid = np.bincount((left + offset).ravel(), left_weight.ravel(), columns * GRID_SIZE)
+        grid += np.bincount((left + 1 + offset).ravel(), right_weight.ravel(), columns * GRID_SIZE)
+        grid = grid.reshape(columns, GRID_SIZE)
+
+        # Circular convolution with the kernel, padded so the ends do not wrap onto each other.
+        length = 2 * GRID_SIZE
+        lags = np.concatenate([np.arange(GRID_SIZE), np.arange(-GRID_SIZE, 0)])
+        distance = lags[None, :] * (step / bandwidth)[:, None]
+        kernel = np.exp(-0.5 * distance ** 2) / (bandwidth[:, None] * np.sqrt(2 * np.pi))
+        density = np.fft.irfft(np.fft.rfft(grid, length) * np.fft.rfft(kernel, length), length)[:, :GRID_SIZE]
+        density = np.maximum(density, 0.0) / np.maximum(count, 1)[:, None]
+        density[~usable] = np.nan
+
+    return low, width, bins, probabilities, x, density
+
+
+def data_digest(months: list) -> str:
+    """Returns the hash of the months a distribution is computed from."""
+    digest = hashlib.sha1(f'{DISTRIBUTION_VERSION}:'.encode())
+    for data in months:
+        digest.update(f'{data.year}-{data.month}:'.encode())
+        digest.update(np.ascontiguousarray(data.days).tobytes())
+        digest.update(np.ascontiguousarray(data.block).tobytes())
+    return digest.hexdigest()
+
+
+class DistributionStore:
+    """
+    Keeps the distributions of months and seasons as .npz files, together with the hash of
+    the data they were computed from. A stored distribution is only computed again when
+    its months changed, and all stale periods of a request are computed in one batch.
+    Months are stored under '{directory}/{station}/{year}/' and seasons under '{directory}/{station}/'.
+    """
+
+    def __init__(self, directory: str = 'Distributions'):
+        self.directory = directory
+
+    def months(self, sources: list) -> list:
+        """
+        Returns the distribution of every Month_Data csv path.
+
+        :raises FileNotFoundError, ValueError: If a source cannot be read.
+        """
+        periods = []
+        for source in sources:
+            data = load_si(source)
+            name = os.path.join(data.station, str(data.year), os.path.splitext(os.path.basename(source))[0])
+            periods.append((name, f'{calendar.month_name[data.month]} {data.year}', [data]))
+        return self._load(periods)
+
+    def month(self, source: str) -> Distribution:
+        """Returns the distribution of one Month_Data csv path."""
+        return self.months([source])[0]
+
+    def seasons(self, sources: list) -> list:
+        """
+        Returns the distribution of every station and season the Month_Data csv paths fall in,
+        in order. Each season is computed from all of its months found next to the given ones,
+        not only the given ones, so a partial list never replaces the distribution of a whole season.
+        """
+        groups = {}
+        for source in sources:
+            key = parse_key(source)
+            group = groups.setdefault((key.station,) + season_of(key.year, key.month), {})
+            group[(key.year, key.month)] = source
+            root = month_root(source)
+            for year, month in season_months(*season_of(key.year, key.month)):
+                path = month_path(MonthKey(key.station, year, month), root)
+                if (year, month) not in group and os.path.exists(path):
+                    group[(year, month)] = path
+        periods = []
+        for (station, year, season), group in sorted(groups.items(),
+                                                     key=lambda item: (item[0][0], season_order(item[0][1:]))):
+            months = [load_si(path) for _, path in sorted(group.items())]
+            periods.append((os.path.join(station, f'{season}_{year}'), f'{season} {year}', months))
+        return self._load(periods)
+
+    def _load(self, periods: list) -> list:
+        results = [None] * len(periods)
+        stale = []
+        for i, (name, label, months) in enumerate(periods):
+            path = os.path.join(self.directory, f'{name}.npz')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            digest = data_digest(months)
+            try:
+                stored = Distribution.load(path)
+                if stored.digest == digest:
+                    results[i] = stored
+                    continue
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+            stale.append((i, path, label, digest, np.concatenate([data.block for data in months])))
+
+        if stale:
+            rows = max(len(block) for *_, block in stale)
+            values = np.full((rows, len(stale) * len(FIELDS)), np.nan)
+            for j, (*_, block) in enumerate(stale):
+                values[:len(block), j * len(FIELDS):(j + 1) * len(FIELDS)] = block
+            low, width, bins, probabilities, x, density = summarize(values)
+            for j, (i, path, label, digest, _) in enumerate(stale):
+                columns = slice(j * len(FIELDS), (j + 1) * len(FIELDS))
+                used = int(bins[columns].max())
+                results[i] = Distribution(label, digest, low[columns], width[columns], bins[columns],
+                                          probabilities[columns, :used], x[columns], density[columns])
+                results[i].save(path)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the histograms and kde of months and seasons.")
+    parser.add_argument("sources", nargs="*", default=[], help="Month_Data csv paths, directories or glob patterns")
+    parser.add_argument("-r", "--range", nargs=2, type=parse_year_month, metavar=("START", "END"),
+                        help="The Month_Data files of a YYYY-MM to YYYY-MM range")
+    parser.add_argument("-o", "--output", default='Distributions', help="The output directory")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if not args.sources and not args.range:
+        parser.error("needs sources or --range")
+
+    with session('distributions', args.profile, args.metrics):
+        sources = find_sources(args.sources, args.range)
+        store = DistributionStore(args.output)
+        months = store.months(sources)
+        seasons = store.seasons(sources)
+        print(f"{len(months)} month and {len(seasons)} season distributions up to date in {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
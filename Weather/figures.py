@@ -0,0 +1,112 @@
+import calendar
+
+import numpy as np
+import seaborn as sns
+import matplotlib.pyplot as plt
+from matplotlib.ticker import PercentFormatter
+
+from calendar_index import date_labels, month_dates
+from distributions import Distribution
+from instrument import span
+from month_parser import MonthData
+
+
+# (variable, axis label) of every histogram panel, the bins are set in distributions.DISTRIBUTIONS.
+HISTOGRAMS = [
+    ('temperature', 'Temperature (°C)'),
+    ('humidity', 'Humidity (%)'),
+    ('pressure', 'Pressure (hPa)'),
+    ('dew_point', 'Dew Point (°C)'),
+]
+
+
+class HistogramFigure:
+    """
+    The 2x2 distribution figure of multi_histogram. The subplots and their twin axes are
+    created once, update() only clears and redraws the stored histograms and kde curves of
+    another period, no statistics are computed while drawing.
+    """
+
+    def __init__(self):
+        self.figure, self.axes = plt.subplots(2, 2, figsize=(12, 8))
+        self.twins = [ax.twinx() for ax in self.axes.flat]
+        self.figure.subplots_adjust(left=0.07, right=0.93, bottom=0.08, top=0.92, wspace=0.4, hspace=0.3)
+        self.colors = sns.color_palette("viridis")
+
+    def update(self, distribution: Distribution, station: str = 'Spata'):
+        """
+        Draws the stored average temperature, humidity, pressure and dew point distributions of a period.
+
+        :param distribution: The precomputed distribution of a month or a season.
+        :param station: The station name used in the title.
+        """
+
+        with span('plot', figure='histogram', period=distribution.label):
+            self.figure.suptitle(f'Distribution of weather parameters for {distribution.label} in {station}')
+
+            for ax, ax2, (key, label) in zip(self.axes.flat, self.twins, HISTOGRAMS):
+                ax.clear()
+                ax2.clear()
+                ax2.yaxis.tick_right()  # clear() puts the twin's ticks and label back on the left
+                ax2.yaxis.set_label_position('right')
+
+                edges, probabilities = distribution.histogram(key)
+                bin_width = edges[1] - edges[0]
+                x, density = distribution.kde(key)
+                ax.bar(edges[:-1], probabilities, width=bin_width, align='edge', color=self.colors[2], alpha=0.5,
+                       edgecolor='k', label="Probabilities")
+                ax.plot(x, density * bin_width, color=self.colors[2])
+                ax2.plot(x, density, color="k", label="kde density", ls=':', lw=2)
+
+                ax.set_xlabel(label)
+                ax.set_ylabel('Probability')
+                ax2.set_ylim(0, ax.get_ylim()[1] / bin_width)  # similar limits on the y-axis to align the plots
+                ax2.yaxis.set_major_formatter(
+                    PercentFormatter(1 / bin_width))  # show an axis such that 1/bin_width corresponds to 100%
+                ax2.set_ylabel(f'Probability for a bin width of {round(bin_width, 2):g}')
+                ax.legend(loc='upper left')
+                ax2.legend(loc='upper right')
+
+
+class TemperatureFigure:
+    """
+    The daily high and low temperature figure of month_temp_l_plot. The lines are created
+    once, update() replaces their data, the fill, the limits and the labels.
+    """
+
+    def __init__(self):
+        with plt.style.context('classic'):
+            self.figure, self.ax = plt.subplots(figsize=(12, 6))
+            self.high, = self.ax.plot([], [], c='r', alpha=0.5, label='High Temp')
+            self.low, = self.ax.plot([], [], c='b', alpha=0.5, label='Low Temp')
+            self.ax.grid(visible=True)
+            self.ax.set_ylabel('Temperature (°C)', fontsize=16)
+            self.ax.tick_params(axis='both', which='minor', labelsize=16, grid_alpha=0.5)
+            self.figure.subplots_adjust(bottom=0.18)
+        self.fill = None
+
+    def update(self, data: MonthData, station: str = 'Spata'):
+        """
+        Draws the daily highs and lows of a month.
+
+        :param data: The month in SI units.
+        :param station: The station name used in the title.
+        """
+
+        with span('plot', figure='temperature', period=f'{data.year}-{data.month}'):
+            days = data.days
+            dates = date_labels(month_dates(data.year, data.month)[days - 1])
+            high, _, low = data.column('temperature').T
+
+            self.high.set_data(days, high)
+            self.low.set_data(days, low)
+            if self.fill is not None:
+                self.fill.remove()
+            self.fill = self.ax.fill_between(days, high, low, facecolor='#21918c', alpha=0.1)
+
+            self.ax.set_xlim(days[0], days[-1])
+            if not (np.isnan(low).all() or np.isnan(high).all()):  # missing days are NaN
+                self.ax.set_ylim(np.nanmin(low) - 1, np.nanmax(high) + 1)
+            self.ax.set_title(f'Daily high and lows temperatures for {calendar.month_name[data.month]} {data.year} '
+                              f'in {station}', fontsize=24)
+            self.ax.set_xticks(days[4::5], labels=dates[4::5], rotation=30, ha='right')
@@ -0,0 +1,224 @@
+import argparse
+import os
+import re
+
+from array import array
+from html.parser import HTMLParser
+
+import numpy as np
+
+from calendar_index import DEFAULT_STATION, MonthKey
+from instrument import add_profile_arguments, session, span
+from month_parser import VARIABLES, MonthData, write_month
+from stations import month_path
+
+
+class _TableEnd(Exception):
+    """Raised to stop feeding the page once the observation table is closed."""
+
+
+class ObservationTableParser(HTMLParser):
+    """
+    Streams once through a monthly history page and collects its observation table.
+
+    The table is the first one inside the 'observation-table' div, or the first 'days' table.
+    It holds one inner table per column (Time and the six variables), each starting with a
+    header row. Day numbers and values are appended to flat numeric arrays as their cells close,
+    and parsing stops at the end of the table, so the rest of the page is never read.
+    """
+
+    def __init__(self, keep_text: bool = False):
+        """
+        :arg keep_text: Also keep every inner row as a list of cell texts in rows.
+        """
+        super().__init__()
+        self.keep_text = keep_text
+        self.month_name = None
+        self.days = array('h')
+        self.values = [array('d') for _ in VARIABLES]
+        self.rows = []
+        self._in_div = False
+        self._depth = 0
+        self._table = -1
+        self._row = -1
+        self._row_text = None
+        self._cell = None
+
+    def feed(self, data: str):
+        try:
+            super().feed(data)
+        except _TableEnd:
+            pass
+
+    def handle_starttag(self, tag, attrs):
+        if self._depth == 0:
+            classes = (dict(attrs).get('class') or '').split()
+            if tag == 'div' and 'observation-table' in classes:
+                self._in_div = True
+            elif tag == 'table' and (self._in_div or 'days' in classes):
+                self._depth = 1
+            return
+
+        if tag == 'table':
+            self._depth += 1
+            if self._depth == 2:
+                self._table += 1
+                self._row = -1
+        elif self._depth == 2:
+            if tag == 'tr':
+                self._row += 1
+                self._row_text = [] if self.keep_text else None
+            elif tag == 'td':
+                self._cell = []
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def handle_endtag(self, tag):
+        if self._depth == 0:
+            return
+
+        if tag == 'table':
+            self._depth -= 1
+            if self._depth == 0:
+                raise _TableEnd()
+        elif self._depth == 2:
+            if tag == 'td' and self._cell is not None:
+                self._end_cell(''.join(self._cell).strip())
+                self._cell = None
+            elif tag == 'tr' and self._row_text:
+                self.rows.append(self._row_text)
+
+    def _end_cell(self, text: str):
+        if self._row_text is not None:
+            self._row_text.append(text)
+        if self._row == 0:
+            if self._table == 0:
+                self.month_name = text
+        elif self._table == 0:
+            self.days.append(int(text))
+        elif self._table <= len(VARIABLES):
+            self.values[self._table - 1].append(float(text) if text else np.nan)
+
+    def to_month(self, year: int, month: int, station: str = DEFAULT_STATION) -> MonthData:
+        """
+        Returns the collected table as a MonthData of a station in the source (imperial) units.
+
+        :raises ValueError: If no table was found or its columns do not line up.
+        """
+
+        days = np.frombuffer(self.days, dtype=np.int16)
+        if not len(days):
+            raise ValueError("No observation table found.")
+
+        columns = []
+        for values, (key, _, stats) in zip(self.values, VARIABLES):
+            if len(values) != len(days) * len(stats):
+                raise ValueError(f"The {key} column has {len(values)} cells for {len(days)} days.")
+            columns.append(np.frombuffer(values, dtype=np.float64).reshape(len(days), len(stats)))
+
+        return MonthData(year, month, days.copy(), np.hstack(columns), station)
+
+
+def from_table(page_source: str) -> str:
+    """
+    Skips the markup before the observation table with a plain substring search, so the
+    parser only sees the table and whatever follows it.
+    """
+
+    for marker in ('observation-table', 'days ng-star-inserted'):
+        found = page_source.find(marker)
+        if found != -1:
+            return page_source[page_source.rfind('<', 0, found):]
+    return page_source
+
+
+def extract_month(page_source: str, year: int, month: int, station: str = DEFAULT_STATION) -> MonthData:
+    """
+    Extracts the observation table of a monthly history page into numeric arrays.
+
+    :arg page_source: The html of the page.
+    :arg year: The year of the page.
+    :arg month: The month of the page.
+    :arg station: The station of the page.
+
+    :returns MonthData: The month in the source (imperial) units.
+
+    :raises ValueError: If the page holds no complete observation table.
+    """
+
+    with span('html_parse', bytes=len(page_source)) as record:
+        parser = ObservationTableParser()
+        parser.feed(from_table(page_source))
+        data = parser.to_month(year, month, station)
+        record['rows'] = len(data.days)
+    return data
+
+
+def extract_rows(page_source: str) -> list:
+    """
+    Extracts the inner table rows of a page as lists of cell texts, the layout create_dataframe expects.
+    """
+
+    with span('html_parse', bytes=len(page_source)) as record:
+        parser = ObservationTableParser(keep_text=True)
+        parser.feed(from_table(page_source))
+        record['rows'] = len(parser.rows)
+    return parser.rows
+
+
+SNAPSHOT_NAME = re.compile(r'(\d{4})[_-](\d{1,2})\.html?$')
+
+
+def extract_directory(directory: str, output_dir: str = 'Month_Data',
+                      station: str = DEFAULT_STATION) -> tuple[int, list]:
+    """
+    Extracts every saved page of a directory to a Month_Data csv, without a browser.
+
+    Page file names must end in '{year}_{month}.html' or '{year}-{month}.html'.
+
+    :arg directory: The directory of saved html pages.
+    :arg output_dir: Where the csv files are written, in station and year partitions.
+    :arg station: The station of the pages.
+
+    :returns tuple: The number of written months and the pages that failed.
+    """
+
+    written, failed = 0, []
+    os.makedirs(output_dir, exist_ok=True)
+    for name in sorted(os.listdir(directory)):
+        match = SNAPSHOT_NAME.search(name)
+        if not match:
+            continue
+        year, month = int(match.group(1)), int(match.group(2))
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            page_source = f.read()
+        try:
+            data = extract_month(page_source, year, month, station)
+        except ValueError as e:
+            failed.append((name, str(e)))
+            continue
+        path = month_path(MonthKey(station, year, month), output_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_month(data, path)
+        written += 1
+    return written, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract saved monthly history pages to Month_Data csv files.")
+    parser.add_argument("directory", help="The directory of saved html pages")
+    parser.add_argument("-o", "--output", default='Month_Data', help="The output directory")
+    parser.add_argument("-s", "--station", default=DEFAULT_STATION, help="The station of the pages")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('html_extract', args.profile, args.metrics):
+        written, failed = extract_directory(args.directory, args.output, args.station)
+        print(f"Extracted {written} months, {len(failed)} failed.")
+        for name, error in failed:
+            print(f"  {name}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+# Set by configure and read on import, so worker processes emit their spans to the same file.
+METRICS_ENV = 'WEATHER_METRICS'
+PROFILE_ENV = 'WEATHER_PROFILE'
+
+_sink = None
+_lock = threading.Lock()
+# The stack of open spans of the current thread or task, as (name, peak holder).
+_open = contextvars.ContextVar('spans', default=())
+
+
+def configure(metrics: str = None, memory: bool = True):
+    """
+    Starts or stops emitting spans.
+
+    :arg metrics: A JSON lines file the spans are appended to, '-' for stderr, None to stop.
+    :arg memory: Trace allocations so every span records its peak memory, which slows Python code down.
+    """
+
+    global _sink
+    close()
+    if not metrics:
+        os.environ.pop(METRICS_ENV, None)
+        return
+    _sink = sys.stderr if metrics == '-' else open(metrics, 'a', encoding='utf-8')
+    os.environ[METRICS_ENV] = metrics
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def close():
+    """Stops emitting spans and closes the metrics file."""
+    global _sink
+    if _sink is not None and _sink is not sys.stderr:
+        _sink.close()
+    _sink = None
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+@contextlib.contextmanager
+def span(name: str, **fields):
+    """
+    Times a block and emits it as one JSON line with its parent span, wall time and peak memory.
+
+    The yielded dict is emitted too, so the block can add what it processed once it knows:
+
+        with span('csv_read', path=path) as record:
+            data = parse_month(path)
+            record['rows'] = len(data.days)
+
+    Does nothing beyond yielding the dict when spans are not configured.
+    """
+
+    if _sink is None:
+        yield fields
+        return
+
+    parents = _open.get()
+    peak = [0]
+    token = _open.set(parents + ((name, peak),))
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    started = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _open.reset(token)
+        record = {'span': name, 'parent': parents[-1][0] if parents else None, 'start': round(started, 6),
+                  'seconds': round(seconds, 6), 'pid': os.getpid()}
+        if tracing:
+            # reset_peak inside child spans hides their peaks from this one, so they report them upwards.
+            peak[0] = max(peak[0], tracemalloc.get_traced_memory()[1])
+            record['peak_bytes'] = max(peak[0] - base, 0)
+            if parents:
+                parents[-1][1][0] = max(parents[-1][1][0], peak[0])
+        record.update(fields)
+        if error:
+            record['error'] = error
+        line = json.dumps(record, default=str) + '\n'
+        with _lock:
+            _sink.write(line)
+            _sink.flush()
+
+
+def add_profile_arguments(parser):
+    """Adds the --profile and --metrics options of every entry point to an argparse parser."""
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Write a cProfile dump of the run, for pstats, snakeviz, flameprof or gprof2dot")
+    parser.add_argument("--metrics", metavar="FILE", help="Append timing spans as JSON lines, '-' for stderr")
+
+
+@contextlib.contextmanager
+def session(name: str, profile: str = None, metrics: str = None):
+    """
+    Runs an entry point inside a root span, with spans and a cProfile dump when asked for.
+
+    :arg name: The name of the root span, the entry point.
+    :arg profile: The cProfile dump to write, the WEATHER_PROFILE variable by default.
+    :arg metrics: The spans file, the WEATHER_METRICS variable by default.
+    """
+
+    profile = profile or os.environ.get(PROFILE_ENV)
+    metrics = metrics or os.environ.get(METRICS_ENV)
+    if metrics:
+        configure(metrics)
+    profiler = None
+    if profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span(name, argv=sys.argv[1:]):
+            yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile)
+            print(f"Wrote the profile to {profile}.", file=sys.stderr)
+        close()
+
+
+if os.environ.get(METRICS_ENV):
+    configure(os.environ[METRICS_ENV])
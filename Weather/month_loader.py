@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+import logging
+import os
+
+from month_parser import MonthData
+from conversion import cached_si_month
+from stations import resolve
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class MonthLoader:
+    """
+    Loads each Month_Data file once through the on-disk month_cache and keeps the SI month in an LRU cache.
+
+    Entries are keyed on the file path, mtime and size, so an edited file is parsed again.
+    The returned MonthData objects are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :arg max_bytes: Memory budget for the cached arrays, the least recently used
+                        months are evicted once it is exceeded.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys = {}
+        self._bytes = 0
+
+    def load(self, file: str) -> MonthData or None:
+        """
+        Returns all variables of a month in SI units, parsing the file only on a cache miss.
+
+        :arg file: The csv file name inside Month_Data.
+
+        :returns MonthData: The month in SI units, or None if the file cannot be read.
+        """
+
+        try:
+            path = os.path.abspath(resolve(file))
+            stat = os.stat(path)
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"Error reading file '{file}': {e}")
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        data = self._entries.get(key)
+        if data is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return data
+
+        self.misses += 1
+        data = cached_si_month(file)
+        if data is None:
+            return None
+
+        stale = self._keys.get(path)
+        if stale is not None:
+            self._remove(stale)
+        self._entries[key] = data
+        self._keys[path] = key
+        self._bytes += data.nbytes
+        self._evict()
+        return data
+
+    def clear(self):
+        """Drops every cached month."""
+        self._entries.clear()
+        self._keys.clear()
+        self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def _remove(self, key):
+        data = self._entries.pop(key)
+        del self._keys[key[0]]
+        self._bytes -= data.nbytes
+
+    def _evict(self):
+        # The newest entry is always kept, even when it alone exceeds the budget.
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+
+
+default_loader = MonthLoader()
+
+
+def load_month(file: str) -> MonthData or None:
+    """Loads a month in SI units through the shared default_loader."""
+    return default_loader.load(file)
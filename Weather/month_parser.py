@@ -0,0 +1,173 @@
+import calendar
+import csv
+import glob
+import os
+
+import numpy as np
+
+from calendar_index import DEFAULT_STATION, MonthKey, months, parse_key
+from instrument import span
+from stations import month_path
+
+
+# (key, source column, stats) for every variable of a Month_Data csv, in file order.
+VARIABLES = (
+    ('temperature', 'Temperature (°F)', ('Max', 'Avg', 'Min')),
+    ('dew_point', 'Dew Point (°F)', ('Max', 'Avg', 'Min')),
+    ('humidity', 'Humidity (%)', ('Max', 'Avg', 'Min')),
+    ('wind_speed', 'Wind Speed (mph)', ('Max', 'Avg', 'Min')),
+    ('pressure', 'Pressure (in)', ('Max', 'Avg', 'Min')),
+    ('precipitation', 'Precipitation (in)', ('Total',)),
+)
+
+# Flat (variable, stat) layout of one day row in a MonthData block.
+FIELDS = [(key, stat) for key, _, stats in VARIABLES for stat in stats]
+
+_SLICES = {}
+_start = 0
+for _key, _, _stats in VARIABLES:
+    _SLICES[_key] = slice(_start, _start + len(_stats))
+    _start += len(_stats)
+
+_STRIP = str.maketrans('', '', "[]'\"")
+
+
+class MonthData:
+    """
+    The numeric content of one month of a station: a dense days x FIELDS float block.
+    """
+
+    def __init__(self, year, month, days, block, station=DEFAULT_STATION):
+        self.year = year
+        self.month = month
+        self.days = days
+        self.block = block
+        self.station = station
+
+    def column(self, key):
+        """
+        Returns the days x stats view of the block for the given variable key.
+
+        :arg key: A variable key from VARIABLES, e.g. 'temperature'.
+
+        :returns np.ndarray: A view into the block, no data is copied.
+        """
+        return self.block[:, _SLICES[key]]
+
+    @property
+    def nbytes(self):
+        return self.block.nbytes + self.days.nbytes
+
+
+def variable_slice(key):
+    """Returns the block columns holding the given variable."""
+    return _SLICES[key]
+
+
+def parse_month(path: str) -> MonthData:
+    """
+    Parses a '{station}_{year}_{month}.csv' file into dense float arrays in one pass.
+
+    The whole body is stripped of its list quoting with a single translate and converted
+    by one NumPy call, instead of cleaning and converting every cell separately.
+
+    :arg path: The path to the Month_Data csv file.
+
+    :returns MonthData: The parsed month in the source (imperial) units.
+
+    :raises ValueError: If the file name or the file layout is not recognised.
+    """
+
+    with span('csv_read', path=path) as record:
+        key = parse_key(path)
+        year, month = key.year, key.month
+
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        record['bytes'] = len(text)
+        lines = text.strip().splitlines()
+
+        header = lines[0].split(',')
+        expected = ['Time'] + [column for _, column, _ in VARIABLES]
+        if header != expected:
+            raise ValueError(f"Unexpected columns in '{path}': {header}")
+
+        # lines[1] is the ['Jan'],['Max', 'Avg', 'Min'],... stat header.
+        body = '\n'.join(lines[2:]).translate(_STRIP).replace('\n', ',')
+        width = len(FIELDS) + 1
+        try:
+            values = np.array(body.split(','), dtype=np.float64)
+        except ValueError as e:
+            raise ValueError(f"Non numeric cell in '{path}': {e}") from e
+        if values.size % width:
+            raise ValueError(f"Ragged rows in '{path}'.")
+
+        values = values.reshape(-1, width)
+        record['rows'] = len(values)
+        return MonthData(year, month, values[:, 0].astype(np.int16), np.ascontiguousarray(values[:, 1:]), key.station)
+
+
+def format_cell(value: float, key: str, stat: str) -> str:
+    """Formats a source value the way the history pages print it."""
+    if key == 'precipitation':
+        return f'{value:.2f}'
+    return f'{value:.1f}' if stat == 'Avg' else f'{value:g}'
+
+
+def write_month(data: MonthData, path: str):
+    """
+    Writes a month in source units back to the Month_Data csv layout parse_month reads.
+
+    :arg data: The month in source (imperial) units.
+    :arg path: The csv file to write.
+    """
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Time'] + [column for _, column, _ in VARIABLES])
+        writer.writerow([str([calendar.month_abbr[data.month]])] + [str(list(stats)) for _, _, stats in VARIABLES])
+        for day, row in zip(data.days, data.block):
+            cells = [str([str(day)])]
+            for key, _, stats in VARIABLES:
+                values = row[_SLICES[key]]
+                cells.append(str([format_cell(value, key, stat) for value, stat in zip(values, stats)]))
+            writer.writerow(cells)
+
+
+def _station_of(path: str) -> str or None:
+    try:
+        return parse_key(path).station
+    except ValueError:
+        return None
+
+
+def find_sources(sources: list, month_range: tuple = None, stations: list = None) -> list:
+    """
+    Expands directories, glob patterns and a year/month range into Month_Data csv paths.
+
+    :arg sources: Csv files, directories (searched with their station and year partitions) or glob patterns.
+    :arg month_range: Optional ((start_year, start_month), (end_year, end_month)), inclusive,
+                      resolved to the Month_Data file of every month in between.
+    :arg stations: Only the sources of these station ids, and the stations of the month range,
+                   which is resolved for the default station if None.
+
+    :returns list: The sorted, de-duplicated source paths.
+    """
+
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            paths.update(glob.glob(os.path.join(source, '**', '*.csv'), recursive=True))
+        elif glob.has_magic(source):
+            paths.update(glob.glob(source))
+        else:
+            paths.add(source)
+    if stations:
+        paths = {path for path in paths if _station_of(path) in stations}
+
+    if month_range:
+        for station in stations or [DEFAULT_STATION]:
+            for year, month in months(*month_range):
+                paths.add(month_path(MonthKey(station, year, month)))
+
+    return sorted(paths)
@@ -0,0 +1,146 @@
+import argparse
+import logging
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from aggregates import PARTIALS, Summary
+from calendar_index import month_dates, month_end, month_start, parse_key
+from conversion import load_si
+from correlation import Moments
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS
+from stations import month_files, station_name
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# The key of the row combining every station.
+NETWORK = 'all'
+
+
+def empty_partials() -> np.ndarray:
+    """The PARTIALS x FIELDS partials of no days."""
+    partials = np.zeros((len(PARTIALS), len(FIELDS)))
+    partials[2:] = np.nan
+    return partials
+
+
+def merge_partials(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Returns the partials of the days of both."""
+    return np.stack([first[0] + second[0], first[1] + second[1],
+                     np.fmax(first[2], second[2]), np.fmin(first[3], second[3])])
+
+
+def scan_partition(paths: list, start, end) -> tuple:
+    """
+    Summarises the days of one (station, year) partition inside an inclusive date range.
+
+    Runs in a worker process, so only the small partials and moments travel back.
+
+    :arg paths: The Month_Data csv paths of the partition.
+    :arg start: The first date, as datetime64 or 'YYYY-MM-DD'.
+    :arg end: The last date.
+
+    :returns tuple: The PARTIALS x FIELDS partials and the Moments of the days.
+    """
+
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    partials, moments = empty_partials(), Moments()
+    for path in paths:
+        key = parse_key(path)
+        if month_end(key.year, key.month) < start or month_start(key.year, key.month) > end:
+            continue
+        data = load_si(path)
+        dates = month_dates(data.year, data.month)[data.days.astype(np.int64) - 1]
+        values = np.asarray(data.block[(dates >= start) & (dates <= end)])
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        month = np.stack([np.where(valid, values, 0.0).sum(axis=0), count,
+                          np.where(count > 0, np.fmax.reduce(values, axis=0, initial=-np.inf), np.nan),
+                          np.where(count > 0, np.fmin.reduce(values, axis=0, initial=np.inf), np.nan)])
+        partials = merge_partials(partials, month)
+        moments = moments.merge(Moments.from_values(values))
+    return partials, moments
+
+
+def scan(stations: list = None, start='1900-01-01', end='2100-12-31', jobs: int = None,
+         root: str = 'Month_Data') -> tuple:
+    """
+    Summarises an inclusive date range for every station and for the whole network.
+
+    Every (station, year) partition overlapping the range is one task of a process pool, and
+    partitions outside it are never read. The partials and moments of the partitions merge
+    into per-station results, which merge again into the network row.
+
+    :arg stations: The station ids, every station found under root by default.
+    :arg start: The first date, as datetime64 or 'YYYY-MM-DD'.
+    :arg end: The last date.
+    :arg jobs: Worker processes.
+    :arg root: The Month_Data directory.
+
+    :returns tuple: A Summary with one row per station and a last NETWORK row, and the Moments of every row.
+    """
+
+    first, last = np.datetime64(start, 'D').astype(object).year, np.datetime64(end, 'D').astype(object).year
+    partitions = {partition: paths for partition, paths in month_files(root, stations).items()
+                  if first <= partition[1] <= last}
+    keys = sorted({station for station, _ in partitions})
+    partials = {station: empty_partials() for station in keys}
+    moments = {station: Moments() for station in keys}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(scan_partition, paths, start, end): partition
+                   for partition, paths in partitions.items()}
+        for future in as_completed(futures):
+            station, year = futures[future]
+            try:
+                result, summary = future.result()
+            except (OSError, ValueError) as e:
+                logger.error(f"Error scanning {station} {year}: {e}")
+                continue
+            partials[station] = merge_partials(partials[station], result)
+            moments[station] = moments[station].merge(summary)
+
+    network, combined = empty_partials(), Moments()
+    for station in keys:
+        network = merge_partials(network, partials[station])
+        combined = combined.merge(moments[station])
+    table = np.stack([partials[station] for station in keys] + [network])
+    return Summary(keys + [NETWORK], *table.transpose(1, 0, 2)), [moments[station] for station in keys] + [combined]
+
+
+def print_scan(result: tuple):
+    """Prints the rows of a scan."""
+    summary, moments = result
+    print(f"{'station':20} {'temp mean':>9} {'temp max':>9} {'temp min':>9} {'humidity':>9} {'wind':>9} "
+          f"{'pressure':>9} {'rain':>9} {'r t/h':>6} {'days':>5}")
+    with np.errstate(invalid='ignore'):
+        for i, key in enumerate(summary.keys):
+            name = 'network' if key == NETWORK else station_name(key)
+            r = moments[i].pair(('temperature', 'Avg'), ('humidity', 'Avg'))
+            print(f"{name:20} {summary.column('temperature')[i]:9.2f} "
+                  f"{summary.column('temperature', 'Max', 'max')[i]:9.2f} "
+                  f"{summary.column('temperature', 'Min', 'min')[i]:9.2f} {summary.column('humidity')[i]:9.2f} "
+                  f"{summary.column('wind_speed')[i]:9.2f} {summary.column('pressure')[i]:9.2f} "
+                  f"{summary.column('precipitation', 'Total', 'total')[i]:9.2f} {r:6.2f} "
+                  f"{int(summary.column('temperature', 'Avg', 'count')[i]):5d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a date range across weather stations.")
+    parser.add_argument("start", help="First day, YYYY-MM-DD")
+    parser.add_argument("end", help="Last day, YYYY-MM-DD")
+    parser.add_argument("-s", "--station", nargs="+", help="Only these stations, every one by default")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    parser.add_argument("--root", default='Month_Data', help="The Month_Data directory")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('network', args.profile, args.metrics):
+        print_scan(scan(args.station, args.start, args.end, args.jobs, args.root))
+
+
+if __name__ == "__main__":
+    main()
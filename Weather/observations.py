@@ -0,0 +1,553 @@
+import argparse
+import csv
+import gzip
+import logging
+import os
+import re
+import time
+
+from array import array
+from datetime import date, timedelta
+from html.parser import HTMLParser
+
+import numpy as np
+
+from calendar_index import DEFAULT_STATION, MonthKey, month_end, month_start, months
+from date import parse_year_month
+from html_extract import from_table
+from instrument import add_profile_arguments, session, span
+from month_parser import FIELDS, MonthData, write_month
+from stations import get_station, month_path
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# (key, column header) of every numeric column of a daily history page, in source (imperial) units.
+OBSERVATIONS = (
+    ('temperature', 'Temperature'),
+    ('dew_point', 'Dew Point'),
+    ('humidity', 'Humidity'),
+    ('wind_speed', 'Wind Speed'),
+    ('wind_gust', 'Wind Gust'),
+    ('pressure', 'Pressure'),
+    ('precipitation', 'Precip.'),
+)
+
+OBSERVATION_KEYS = [key for key, _ in OBSERVATIONS]
+
+# One observation: its local time to the minute and the value of every column, NaN when not reported.
+# float32 holds the printed values (at most two decimals) exactly enough and halves the chunks.
+OBSERVATION_DTYPE = np.dtype([('time', 'datetime64[m]')] + [(key, np.float32) for key in OBSERVATION_KEYS])
+
+# The datetime64 unit of every resampling resolution.
+RESOLUTIONS = {'hour': 'h', 'day': 'D'}
+
+# The stats of every column after resampling: precipitation is reported per observation and summed.
+RESAMPLED_FIELDS = [(key, stat) for key in OBSERVATION_KEYS
+                    for stat in (('Total',) if key == 'precipitation' else ('Max', 'Avg', 'Min'))]
+
+PAGE_NAME = re.compile(r'(\d{4})_(\d{1,2})_(\d{1,2})\.html?(?:\.gz)?$')
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_TIME = re.compile(r'(\d{1,2}):(\d{2})\s*([AaPp][Mm])?')
+
+
+def parse_time(text: str) -> int:
+    """
+    Returns the minutes after midnight of a '12:20 AM' or '00:20' time cell.
+
+    :raises ValueError: If the cell holds no time.
+    """
+    match = _TIME.search(text)
+    if not match:
+        raise ValueError(f"Not a time: '{text}'.")
+    hour, minute, half = int(match.group(1)), int(match.group(2)), match.group(3)
+    if half:
+        hour = hour % 12 + (12 if half.upper() == 'PM' else 0)
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Not a time: '{text}'.")
+    return hour * 60 + minute
+
+
+class _TableEnd(Exception):
+    """Raised to stop feeding the page once the observation table is closed."""
+
+
+class DayTableParser(HTMLParser):
+    """
+    Streams once through a daily history page and collects its observation table.
+
+    The table is the first one inside the 'observation-table' div, with a header row naming
+    its columns and one body row per observation. Columns are found by their header, so their
+    order and any extra columns (wind direction, condition) do not matter. Times and values
+    are appended to flat numeric arrays as their rows close, and parsing stops at the end of
+    the table.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.header = []
+        self.minutes = array('q')
+        self.values = [array('d') for _ in OBSERVATIONS]
+        self._in_div = False
+        self._in_table = False
+        self._in_head = False
+        self._columns = None
+        self._time = None
+        self._row = None
+        self._cell = None
+
+    def feed(self, data: str):
+        try:
+            super().feed(data)
+        except _TableEnd:
+            pass
+
+    def handle_starttag(self, tag, attrs):
+        if not self._in_table:
+            classes = (dict(attrs).get('class') or '').split()
+            if tag == 'div' and 'observation-table' in classes:
+                self._in_div = True
+            elif tag == 'table' and self._in_div:
+                self._in_table = True
+            return
+
+        if tag == 'thead':
+            self._in_head = True
+        elif tag == 'tr':
+            self._row = []
+        elif tag in ('th', 'td') and self._row is not None:
+            self._cell = []
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def handle_endtag(self, tag):
+        if not self._in_table:
+            return
+
+        if tag == 'table':
+            raise _TableEnd()
+        if tag == 'thead':
+            self._in_head = False
+        elif tag in ('th', 'td') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._in_head or not self.header:
+                self.header = self._row
+            elif self._row:
+                self._end_row(self._row)
+            self._row = None
+
+    def _end_row(self, cells: list):
+        if self._columns is None:
+            names = [name.lower() for name in self.header]
+            self._columns = [names.index(column.lower()) if column.lower() in names else None
+                             for _, column in OBSERVATIONS]
+            if 'time' not in names:
+                raise ValueError("The observation table has no Time column.")
+            self._time = names.index('time')
+        if len(cells) != len(self.header):
+            raise ValueError(f"Observation row of {len(cells)} cells under {len(self.header)} headers.")
+        self.minutes.append(parse_time(cells[self._time]))
+        for values, column in zip(self.values, self._columns):
+            number = _NUMBER.search(cells[column]) if column is not None else None
+            values.append(float(number.group()) if number else np.nan)
+
+    def to_records(self, day) -> np.ndarray:
+        """
+        Returns the collected rows as OBSERVATION_DTYPE records of a day, in time order.
+
+        :raises ValueError: If no observation table was found.
+        """
+
+        if not self.header:
+            raise ValueError("No observation table found.")
+        records = np.empty(len(self.minutes), dtype=OBSERVATION_DTYPE)
+        minutes = np.frombuffer(self.minutes, dtype=np.int64).astype('timedelta64[m]')
+        records['time'] = np.datetime64(day, 'D') + minutes
+        for key, values in zip(OBSERVATION_KEYS, self.values):
+            records[key] = np.frombuffer(values, dtype=np.float64)
+        return records[np.argsort(records['time'], kind='stable')]
+
+
+def extract_day(page_source: str, day) -> np.ndarray:
+    """
+    Extracts the observations of a daily history page.
+
+    :arg page_source: The page html, fetched or saved.
+    :arg day: The date of the page, a datetime64, date or 'YYYY-MM-DD'.
+
+    :returns np.ndarray: The OBSERVATION_DTYPE records of the day, in time order.
+
+    :raises ValueError: If the page has no observation table or a row cannot be read.
+    """
+
+    parser = DayTableParser()
+    with span('day_extract', bytes=len(page_source)) as record:
+        parser.feed(from_table(page_source))
+        records = parser.to_records(day)
+        record['rows'] = len(records)
+    return records
+
+
+class ObservationStore:
+    """
+    Keeps the observations of a station in time chunks, one month of records per .npy file, as
+    '{directory}/{station}/{year}/{year}_{month}.npy'.
+
+    A month is a few thousand rows, so ingesting rewrites only the chunks it touches and
+    readers map one chunk at a time, whatever the length of the history or the number of
+    stations next to it.
+    """
+
+    def __init__(self, directory: str = 'Observations', station: str = DEFAULT_STATION):
+        self.root = directory
+        self.directory = os.path.join(directory, station)
+        self.station = station
+
+    def path(self, year: int, month: int) -> str:
+        return os.path.join(self.directory, str(year), f'{year}_{month}.npy')
+
+    def read(self, year: int, month: int) -> np.ndarray:
+        """Returns the records of a month, memory mapped, empty if none were ingested."""
+        try:
+            return np.load(self.path(year, month), mmap_mode='r')
+        except FileNotFoundError:
+            return np.empty(0, dtype=OBSERVATION_DTYPE)
+
+    def write(self, year: int, month: int, records: np.ndarray):
+        """Replaces the records of a month, through a temporary file."""
+        path = self.path(year, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(records, dtype=OBSERVATION_DTYPE))
+        os.replace(tmp, path)
+
+    def merge(self, year: int, month: int, records: np.ndarray) -> int:
+        """
+        Adds the records of some days of a month, replacing what was stored for those days.
+
+        :returns int: The rows of the month.
+        """
+
+        stored = self.read(year, month)
+        days = np.unique(records['time'].astype('datetime64[D]'))
+        kept = stored[~np.isin(stored['time'].astype('datetime64[D]'), days)]
+        merged = np.concatenate([kept, records])
+        self.write(year, month, merged[np.argsort(merged['time'], kind='stable')])
+        return len(merged)
+
+    def months(self) -> list:
+        """Returns every stored (year, month), in order."""
+        keys = []
+        if os.path.isdir(self.directory):
+            for _, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith('.npy'):
+                        year, month = name[:-len('.npy')].split('_')
+                        keys.append((int(year), int(month)))
+        return sorted(keys)
+
+    def chunks(self, start: tuple, end: tuple):
+        """Yields the (year, month, records) of every stored month from start to end, inclusive."""
+        for year, month in months(start, end):
+            records = self.read(year, month)
+            if len(records):
+                yield year, month, records
+
+
+def resample(records: np.ndarray, resolution: str = 'hour') -> tuple:
+    """
+    Resamples observations to hours or days, with the Max, Avg and Min of every column and the
+    Total of precipitation, NaN values ignored.
+
+    Every statistic of every column comes from one ufunc reduceat over the time sorted rows,
+    with no loop over the periods.
+
+    :arg records: OBSERVATION_DTYPE records in time order.
+    :arg resolution: One of RESOLUTIONS.
+
+    :returns tuple: The datetime64 start of every period with observations, and a periods x
+                    RESAMPLED_FIELDS block of float64 values.
+    """
+
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', choose one of {', '.join(RESOLUTIONS)}.")
+    periods = records['time'].astype(f'datetime64[{RESOLUTIONS[resolution]}]')
+    if not len(periods):
+        return periods, np.empty((0, len(RESAMPLED_FIELDS)))
+    starts = np.flatnonzero(np.concatenate([[True], periods[1:] != periods[:-1]]))
+
+    values = np.column_stack([records[key].astype(np.float64) for key in OBSERVATION_KEYS])
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid, starts, axis=0)
+    total = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats = {
+            'Max': np.fmax.reduceat(values, starts, axis=0),
+            'Avg': total / count,
+            'Min': np.fmin.reduceat(values, starts, axis=0),
+            'Total': np.where(count > 0, total, np.nan),
+        }
+    block = np.column_stack([stats[stat][:, OBSERVATION_KEYS.index(key)] for key, stat in RESAMPLED_FIELDS])
+    return periods[starts], block
+
+
+def daily_month(store: ObservationStore, year: int, month: int) -> MonthData:
+    """
+    Derives the daily Max, Avg and Min of a month from its observations, in the FIELDS layout and
+    source units of a fetched month and rounded the way the monthly pages print them.
+
+    :returns MonthData: The days with observations.
+
+    :raises ValueError: If the month has no observations.
+    """
+
+    records = store.read(year, month)
+    if not len(records):
+        raise ValueError(f"No observations of {store.station} in {year}-{month}.")
+    periods, block = resample(records, 'day')
+    block = block[:, [RESAMPLED_FIELDS.index(field) for field in FIELDS]]
+    block = np.round(block, 2)
+    one_decimal = [i for i, (key, stat) in enumerate(FIELDS) if stat == 'Avg' and key != 'pressure']
+    block[:, one_decimal] = np.round(block[:, one_decimal], 1)
+    days = (periods - month_start(year, month)).astype(np.int64) + 1
+    return MonthData(year, month, days.astype(np.int16), block, store.station)
+
+
+def saved_pages(directory: str, start: tuple = None, end: tuple = None):
+    """
+    Yields the (date, page_source) of every saved daily page of a directory in date order,
+    reading one page at a time. Names must end in '{year}_{month}_{day}.html', optionally gzip
+    compressed as '.html.gz', like the pages fetch_pages keeps.
+
+    :arg start: Only pages from this (year, month) on.
+    :arg end: Only pages up to this (year, month), inclusive.
+    """
+
+    pages = []
+    for name in os.listdir(directory):
+        match = PAGE_NAME.search(name)
+        if match:
+            day = date(*(int(group) for group in match.groups()))
+            if (start is None or (day.year, day.month) >= start) and (end is None or (day.year, day.month) <= end):
+                pages.append((day, name))
+    for day, name in sorted(pages):
+        path = os.path.join(directory, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            yield day, f.read()
+
+
+def fetch_pages(url: str, start: tuple, end: tuple, directory: str, factory, interval: float = 2.0,
+                retries: int = 3, backoff: float = 2.0, errors: tuple = (OSError,)):
+    """
+    Yields the (date, page_source) of every day of a month range, fetched one at a time and
+    kept gzip compressed in directory as '{year}_{month}_{day}.html.gz'. Pages of days that
+    were over when they were saved are read from there instead of fetched again.
+
+    :arg url: The url template, formatted with year, month and day, see Station.daily_url.
+    :arg start: The first (year, month).
+    :arg end: The last (year, month), inclusive, stopping at yesterday.
+    :arg directory: Where pages are kept.
+    :arg factory: A callable returning a fetcher, like backfill.HttpFetcher, only called when a
+                  page has to be fetched. The fetcher is closed when the pages are exhausted or closed.
+    :arg interval: Minimum seconds between requests.
+    :arg retries: Attempts after the first one.
+    :arg backoff: The delay before the first retry, doubled for every next one.
+    :arg errors: The exceptions of a failed fetch that are retried.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    last = min(month_end(*end).astype(object), date.today() - timedelta(days=1))
+    day = month_start(*start).astype(object)
+    fetcher, next_request = None, 0.0
+    try:
+        while day <= last:
+            path = os.path.join(directory, f'{day.year}_{day.month}_{day.day}.html.gz')
+            if os.path.exists(path) and date.fromtimestamp(os.path.getmtime(path)) > day + timedelta(days=1):
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    yield day, f.read()
+                day += timedelta(days=1)
+                continue
+
+            fetcher = fetcher or factory()
+            for attempt in range(retries + 1):
+                time.sleep(max(0.0, next_request - time.monotonic()))
+                next_request = time.monotonic() + interval
+                try:
+                    page_source = fetcher.fetch(url.format(year=day.year, month=day.month, day=day.day))
+                    break
+                except errors as e:
+                    if attempt == retries:
+                        raise
+                    delay = backoff * 2 ** attempt
+                    logger.warning(f"Retrying {day} in {delay:.1f} s after: {e}")
+                    time.sleep(delay)
+            with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8') as f:
+                f.write(page_source)
+            os.replace(f"{path}.tmp", path)
+            yield day, page_source
+            day += timedelta(days=1)
+    finally:
+        if fetcher is not None:
+            fetcher.close()
+
+
+def ingest(pages, store: ObservationStore) -> dict:
+    """
+    Extracts daily pages into the time chunks of a store, holding at most one month of
+    observations in memory. Every month is merged into its chunk once its last page is read,
+    so pages are best given in date order.
+
+    :arg pages: An iterable of (date, page_source), see saved_pages and fetch_pages.
+    :arg store: The store of the pages' station.
+
+    :returns dict: The ingested days, the pages that failed with their error, and the months written.
+    """
+
+    summary = {'days': 0, 'failed': [], 'months': []}
+    current, buffer = None, []
+
+    def flush():
+        if buffer:
+            with span('ingest_month', station=store.station, year=current[0], month=current[1]) as record:
+                record['rows'] = store.merge(*current, np.concatenate(buffer))
+            summary['months'].append(current)
+            buffer.clear()
+
+    try:
+        for day, page_source in pages:
+            if (day.year, day.month) != current:
+                flush()
+                current = (day.year, day.month)
+            try:
+                buffer.append(extract_day(page_source, day))
+            except ValueError as e:
+                logger.warning(f"Error extracting {store.station} {day}: {e}")
+                summary['failed'].append((str(day), str(e)))
+                continue
+            summary['days'] += 1
+    finally:
+        # Keep the days read before a fetch gave up, a new run fetches from there.
+        flush()
+    return summary
+
+
+def ingest_station(station_id: str, start: tuple, end: tuple, directory: str = 'Observations', pages: str = None,
+                   url: str = None, http: bool = False, interval: float = 2.0) -> dict:
+    """
+    Ingests the daily pages of a station and month range, saved ones or fetched ones.
+
+    :arg station_id: The registered station.
+    :arg start: The first (year, month).
+    :arg end: The last (year, month), inclusive.
+    :arg directory: The observation store.
+    :arg pages: A directory of saved pages to ingest instead of fetching, see saved_pages.
+    :arg url: A custom url template with {year}, {month} and {day}, see Station.daily_url.
+    :arg http: Fetch with plain HTTP instead of Chrome.
+    :arg interval: Minimum seconds between requests.
+
+    :returns dict: The summary of ingest.
+    """
+
+    if pages:
+        source = saved_pages(pages, start, end)
+    else:
+        from selenium.common.exceptions import WebDriverException
+        from backfill import HttpFetcher, chrome_factory
+
+        source = fetch_pages(get_station(station_id).daily_url(url), start, end,
+                             os.path.join('Snapshots', station_id, 'daily'), HttpFetcher if http else chrome_factory,
+                             interval, errors=(OSError, WebDriverException))
+    try:
+        return ingest(source, ObservationStore(directory, station_id))
+    finally:
+        source.close()
+
+
+def print_ingest(station_id: str, summary: dict):
+    """Prints what an ingest did."""
+    print(f"{station_id}: ingested {summary['days']} days into {len(summary['months'])} months, "
+          f"{len(summary['failed'])} failed.")
+    for day, error in summary['failed']:
+        print(f"  {day}: {error}")
+
+
+def derive_months(store: ObservationStore, start: tuple, end: tuple, output_dir: str = 'Month_Data') -> int:
+    """
+    Writes the daily summary of every month with observations from start to end as a Month_Data csv.
+
+    :returns int: The number of written months.
+    """
+
+    written = 0
+    for year, month, _ in store.chunks(start, end):
+        path = month_path(MonthKey(store.station, year, month), output_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_month(daily_month(store, year, month), path)
+        written += 1
+    return written
+
+
+def write_resampled(store: ObservationStore, start: tuple, end: tuple, resolution: str, path: str) -> int:
+    """
+    Writes the resampled observations of a month range to a csv file, one chunk at a time.
+
+    :returns int: The number of written periods.
+    """
+
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time'] + [f'{key}_{stat.lower()}' for key, stat in RESAMPLED_FIELDS])
+        for _, _, records in store.chunks(start, end):
+            periods, block = resample(records, resolution)
+            for period, row in zip(periods, block):
+                writer.writerow([str(period)] + [f'{value:.2f}' for value in row])
+            written += len(periods)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest daily history pages into time chunked observations "
+                                                 "and derive hourly or daily summaries.")
+    parser.add_argument("start", type=parse_year_month, help="First month, YYYY-MM")
+    parser.add_argument("end", type=parse_year_month, help="Last month, YYYY-MM")
+    parser.add_argument("-s", "--station", nargs="+", default=[DEFAULT_STATION], help="The registered stations")
+    parser.add_argument("-d", "--directory", default='Observations', help="The observation store")
+    parser.add_argument("--pages", help="Ingest the saved pages of this directory instead of fetching "
+                                        "(default: fetch into Snapshots/{station}/daily)")
+    parser.add_argument("--no-ingest", action="store_true", help="Only derive from stored observations")
+    parser.add_argument("--url", help="Url template with {year}, {month} and {day}")
+    parser.add_argument("--http", action="store_true", help="Fetch with plain HTTP instead of Chrome")
+    parser.add_argument("-i", "--interval", type=float, default=2.0, help="Minimum seconds between requests")
+    parser.add_argument("--derive", metavar="OUTPUT", help="Write the daily summaries as Month_Data csv files here")
+    parser.add_argument("-r", "--resample", choices=list(RESOLUTIONS), help="Write the resampled observations")
+    parser.add_argument("-o", "--output", default='observations_{station}_{resolution}.csv',
+                        help="The csv of the resampled observations, may use {station} and {resolution}")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with session('observations', args.profile, args.metrics):
+        for station_id in args.station:
+            store = ObservationStore(args.directory, station_id)
+            if not args.no_ingest:
+                print_ingest(station_id, ingest_station(station_id, args.start, args.end, args.directory, args.pages,
+                                                        args.url, args.http, args.interval))
+            if args.derive:
+                written = derive_months(store, args.start, args.end, args.derive)
+                print(f"{station_id}: wrote {written} daily summaries to {args.derive}.")
+            if args.resample:
+                path = args.output.format(station=station_id, resolution=args.resample)
+                written = write_resampled(store, args.start, args.end, args.resample, path)
+                print(f"{station_id}: wrote {written} {args.resample} periods to {path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import argparse
+import logging
+import os
+
+from datetime import date
+
+import numpy as np
+
+from aggregates import Aggregates
+from archive import DailyArchive
+from conversion import convert_month
+from correlation import CorrelationIndex
+from calendar_index import DEFAULT_STATION, MonthKey, month_days, months
+from date import parse_year_month
+from html_extract import extract_month
+from instrument import add_profile_arguments, session
+from month_parser import MonthData, parse_month, variable_slice
+from si_table import write_month, write_schema
+from snapshots import SnapshotStore
+from stations import get_station, month_path
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+# Every stage takes and yields one month at a time, so memory does not grow with the range.
+
+def fetch(months, store: SnapshotStore, factory=None, url: str = None):
+    """
+    Yields (year, month, page_source) for every month, from complete snapshots when possible.
+    Months that cannot be fetched are logged and skipped.
+
+    A single fetcher is created on the first month that needs one and closed at the end.
+
+    :arg months: The (year, month) pairs to fetch.
+    :arg store: The snapshot store of the station, fetched pages are saved to it.
+    :arg factory: A callable creating the fetcher, chrome_factory by default.
+    :arg url: The url template, the history page of the store's station by default.
+    """
+
+    from selenium.common.exceptions import WebDriverException
+
+    from backfill import chrome_factory
+    from spata_venizelos_weather_data import fetch_page
+
+    factory = factory or chrome_factory
+    url = get_station(store.station).url(url)
+    fetchers = []
+
+    def fetcher():
+        if not fetchers:
+            fetchers.append(factory())
+        return fetchers[0]
+
+    try:
+        for year, month in months:
+            try:
+                page_source = fetch_page(fetcher, year, month, store, url)
+            except (OSError, WebDriverException) as e:
+                logger.warning(f"Failed to fetch {year}-{month}: {e}")
+                continue
+            yield year, month, page_source
+    finally:
+        for f in fetchers:
+            f.close()
+
+
+def read_snapshots(months, store: SnapshotStore):
+    """Yields (year, month, page_source) of every month with a snapshot, never fetching."""
+    for year, month in months:
+        page_source = store.load(year, month)
+        if page_source is None:
+            logger.warning(f"No snapshot of {year}-{month}.")
+            continue
+        yield year, month, page_source
+
+
+def extract(pages, station: str = DEFAULT_STATION):
+    """Yields the MonthData of every (year, month, page_source) of a station, skipping pages without a table."""
+    for year, month, page_source in pages:
+        try:
+            yield extract_month(page_source, year, month, station)
+        except ValueError as e:
+            logger.warning(f"Skipping {year}-{month}: {e}")
+
+
+def read_csv(months, directory: str = 'Month_Data', station: str = DEFAULT_STATION):
+    """Yields the MonthData of the Month_Data csv of every month of a station that has one."""
+    for year, month in months:
+        path = month_path(MonthKey(station, year, month), directory)
+        try:
+            yield parse_month(path)
+        except FileNotFoundError:
+            logger.warning(f"No csv for {year}-{month}.")
+        except ValueError as e:
+            logger.warning(f"Skipping {year}-{month}: {e}")
+
+
+def validate(records, today: date = None):
+    """
+    Yields the months whose days match the calendar and whose Max >= Avg >= Min,
+    logging and dropping the others. A month that has not ended yet, like the current one
+    fetched again every day, may stop at any day up to today.
+
+    :arg today: The current date, the date of the machine by default.
+    """
+
+    today = today or date.today()
+    for data in records:
+        days = month_days(data.year, data.month)
+        if (data.year, data.month) == (today.year, today.month):
+            days = min(len(data.days), today.day)
+        problem = None
+        if (data.year, data.month) > (today.year, today.month):
+            problem = "a month that has not started"
+        elif not len(data.days):
+            problem = "no days"
+        elif not np.array_equal(data.days, np.arange(1, days + 1)):
+            problem = f"{len(data.days)} days instead of {days}"
+        else:
+            for key in ('temperature', 'dew_point', 'humidity', 'wind_speed', 'pressure'):
+                high, avg, low = data.block[:, variable_slice(key)].T
+                with np.errstate(invalid='ignore'):
+                    if np.any(high < avg) or np.any(avg < low):
+                        problem = f"{key} Max/Avg/Min out of order"
+                        break
+        if problem:
+            logger.warning(f"Dropping {data.year}-{data.month}: {problem}.")
+            continue
+        yield data
+
+
+def convert(records, dtype=None):
+    """Yields every month converted to SI units, as float64 blocks or blocks of dtype."""
+    for data in records:
+        yield convert_month(data, dtype)
+
+
+class CsvSink:
+    """Writes SI months as the flat SI_Month_Data csv files to_SI produces, with their schema sidecar."""
+
+    extension = 'csv'
+
+    def __init__(self, directory: str = 'SI_Month_Data'):
+        self.directory = directory
+        self._dtype = None
+
+    def write(self, data: MonthData):
+        path = month_path(MonthKey(data.station, data.year, data.month), self.directory, 'SI_', self.extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_month(data, path)
+        self._dtype = data.block.dtype
+
+    def close(self):
+        if self._dtype is not None:
+            write_schema(self.directory, self._dtype)
+
+
+class NpySink(CsvSink):
+    """Writes SI months as .npy structured arrays of a date and the SI columns, no text involved."""
+
+    extension = 'npy'
+
+    def __init__(self, directory: str = 'SI_Month_Npy'):
+        super().__init__(directory)
+
+
+class ArchiveSink:
+    """Appends SI months to the daily archive of their station and updates its aggregates and correlations."""
+
+    def __init__(self, directory: str = 'Archive'):
+        self.directory = directory
+        self._stations = {}
+
+    def write(self, data: MonthData):
+        if data.station not in self._stations:
+            archive = DailyArchive(self.directory, data.station)
+            self._stations[data.station] = archive, Aggregates(archive), CorrelationIndex(archive)
+        archive, aggregates, correlations = self._stations[data.station]
+        archive.append_month(data)
+        aggregates.update(data)
+        correlations.update(data)
+
+    def close(self):
+        pass
+
+
+def run(records, sinks: list) -> int:
+    """
+    Drains a pipeline into every sink.
+
+    :returns int: The number of months written.
+    """
+
+    count = 0
+    try:
+        for data in records:
+            for sink in sinks:
+                sink.write(data)
+            count += 1
+    finally:
+        for sink in sinks:
+            sink.close()
+    return count
+
+
+SINKS = {'csv': CsvSink, 'npy': NpySink, 'archive': ArchiveSink}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch, extract, validate and convert a range of months.")
+    parser.add_argument("start", type=parse_year_month, help="First month, YYYY-MM")
+    parser.add_argument("end", type=parse_year_month, help="Last month, YYYY-MM")
+    parser.add_argument("-s", "--source", choices=["web", "snapshots", "csv"], default="snapshots",
+                        help="web: snapshots, fetching missing months; snapshots: stored pages only; "
+                             "csv: Month_Data files")
+    parser.add_argument("-k", "--sink", choices=sorted(SINKS), nargs="+", default=["csv"],
+                        help="Where the SI months are written")
+    parser.add_argument("--http", action="store_true", help="Fetch with plain HTTP instead of Chrome")
+    parser.add_argument("--url", help="Url template with {year} and {month}")
+    parser.add_argument("-t", "--station", default=DEFAULT_STATION, help="The station of the months")
+    parser.add_argument("--float32", action="store_true", help="Convert to float32 blocks, halving the npy sink")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('pipeline', args.profile, args.metrics):
+        span = months(args.start, args.end)
+        store = SnapshotStore(station=args.station)
+        if args.source == "csv":
+            records = read_csv(span, station=args.station)
+        elif args.source == "snapshots":
+            records = extract(read_snapshots(span, store), args.station)
+        else:
+            from backfill import HttpFetcher
+            records = extract(fetch(span, store, HttpFetcher if args.http else None, args.url), args.station)
+
+        records = convert(validate(records), np.float32 if args.float32 else None)
+        count = run(records, [SINKS[name]() for name in args.sink])
+        print(f"Wrote {count} months to {', '.join(args.sink)}.")
+
+
+if __name__ == "__main__":
+    main()
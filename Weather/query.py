@@ -0,0 +1,199 @@
+import argparse
+import operator
+import re
+import sys
+
+from typing import NamedTuple
+
+import numpy as np
+
+from aggregates import Aggregates
+from archive import DailyArchive
+from calendar_index import DEFAULT_STATION, SEASONS, date_month, from_month_code, month_code
+from instrument import add_profile_arguments, session
+from month_parser import FIELDS
+
+
+# The name of every FIELDS column in queries and results, as printed by 'archive.py show'.
+COLUMNS = [f'{key}_{stat.lower()}' for key, stat in FIELDS]
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+PREDICATE = re.compile(r'^\s*(?P<column>[a-z_]+)\s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<value>[-+0-9.eE]+)\s*$')
+
+
+class Predicate(NamedTuple):
+    """A comparison of one FIELDS column with a constant, like temperature_max > 35."""
+    column: int
+    op: str
+    value: float
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Returns the rows of a days x FIELDS block that satisfy the predicate, never a missing day."""
+        column = values[:, self.column]
+        with np.errstate(invalid='ignore'):
+            return ~np.isnan(column) & OPERATORS[self.op](column, self.value)
+
+    def may_match(self, high: np.ndarray, low: np.ndarray, count: np.ndarray) -> np.ndarray:
+        """
+        Returns the periods whose column maximum, minimum and observation count leave room for a match.
+
+        A period without statistics should be given an infinite range and a count of one.
+        """
+        with np.errstate(invalid='ignore'):
+            if self.op in ('>', '>='):
+                possible = OPERATORS[self.op](high, self.value)
+            elif self.op in ('<', '<='):
+                possible = OPERATORS[self.op](low, self.value)
+            elif self.op == '==':
+                possible = (low <= self.value) & (self.value <= high)
+            else:
+                possible = ~((low == self.value) & (high == self.value))
+        return possible & (count > 0)
+
+
+def parse_predicate(text: str) -> Predicate:
+    """
+    Parses a predicate like 'temperature_max>35' or 'humidity_avg <= 40'.
+
+    :raises ValueError: If the text is not '{column} {operator} {number}' or the column is unknown.
+    """
+    match = PREDICATE.match(text)
+    if not match:
+        raise ValueError(f"'{text}' is not a '{{column}} {{operator}} {{number}}' predicate.")
+    if match.group('column') not in COLUMNS:
+        raise ValueError(f"Unknown column '{match.group('column')}', choose one of {', '.join(COLUMNS)}.")
+    return Predicate(COLUMNS.index(match.group('column')), match.group('op'), float(match.group('value')))
+
+
+class QueryResult:
+    """The matching days of a query, and how much of the archive it had to read."""
+
+    def __init__(self, dates, values, months, scanned_months, scanned_days):
+        self.dates = dates
+        self.values = values
+        self.months = months
+        self.scanned_months = scanned_months
+        self.scanned_days = scanned_days
+
+    def column(self, key: str, stat: str = 'Avg') -> np.ndarray:
+        """Returns one (variable, stat) of every matching day."""
+        return self.values[:, FIELDS.index((key, stat))]
+
+    def to_frame(self):
+        """Returns the matching days as a DataFrame with a date column and one column per FIELDS entry."""
+        import pandas as pd
+
+        frame = pd.DataFrame(self.values, columns=COLUMNS)
+        frame.insert(0, 'date', self.dates)
+        return frame
+
+
+def query(start=None, end=None, predicates: list = (), seasons: list = None,
+          aggregates: Aggregates = None) -> QueryResult:
+    """
+    Returns the archived days of an inclusive date range that satisfy every predicate.
+
+    The monthly max, min and counts kept by Aggregates at ingest are the zone map of the
+    archive: a month whose range cannot satisfy a predicate, or that lies outside the seasons,
+    is never read, and neither is a year none of whose months qualify. Only the days of the
+    remaining months are gathered from the memory map and filtered with vectorized masks.
+
+    :arg start: The first date, as a date, datetime64 or 'YYYY-MM-DD', the archive start by default.
+    :arg end: The last date, the last archived day by default.
+    :arg predicates: Predicate objects or texts like 'temperature_max>35', all of which must hold.
+    :arg seasons: Only days of these SEASONS.
+    :arg aggregates: The aggregates of the archive to query, Aggregates() of the default station by default.
+
+    :raises ValueError: If a predicate or season is not valid.
+    """
+
+    aggregates = aggregates or Aggregates()
+    archive = aggregates.archive
+    predicates = [parse_predicate(p) if isinstance(p, str) else p for p in predicates]
+    seasons = [SEASONS.index(season) for season in seasons] if seasons else None
+    empty = QueryResult(np.array([], 'datetime64[D]'), np.empty((0, len(FIELDS))), 0, 0, 0)
+    if not archive.rows:
+        return empty
+
+    last_day = archive.start + archive.rows - 1
+    start = archive.start if start is None else max(np.datetime64(start, 'D'), archive.start)
+    end = last_day if end is None else min(np.datetime64(end, 'D'), last_day)
+    if end < start:
+        return empty
+
+    origin = month_code(*date_month(archive.start))
+    codes = np.arange(month_code(*date_month(start)), month_code(*date_month(end)) + 1)
+    keep = np.ones(len(codes), dtype=bool)
+    if seasons is not None:
+        keep &= np.isin(from_month_code(codes)[1] % 12 // 3, seasons)
+
+    monthly = aggregates.monthly()
+    index = codes - origin
+    known = index < len(monthly.keys)
+    for predicate in predicates:
+        high, low, count = np.full(len(codes), np.inf), np.full(len(codes), -np.inf), np.ones(len(codes))
+        high[known] = monthly.max[index[known], predicate.column]
+        low[known] = monthly.min[index[known], predicate.column]
+        count[known] = monthly.count[index[known], predicate.column]
+        keep &= predicate.may_match(high, low, count)
+
+    # The first and one past the last archive row of every remaining month, clipped to the range.
+    first_days = (codes[keep] - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+    last_days = (codes[keep] - 1970 * 12 + 1).astype('datetime64[M]').astype('datetime64[D]')
+    lows = (np.maximum(first_days, start) - archive.start).astype(np.int64)
+    highs = (np.minimum(last_days, end + 1) - archive.start).astype(np.int64)
+    lengths = highs - lows
+    rows = np.arange(lengths.sum()) + np.repeat(lows - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+
+    values = archive.values[rows]
+    mask = np.ones(len(rows), dtype=bool)
+    for predicate in predicates:
+        mask &= predicate.mask(values)
+    return QueryResult(archive.start + rows[mask], values[mask], len(codes), int(keep.sum()), len(rows))
+
+
+def print_result(result: QueryResult, columns: list = None, count: bool = False):
+    """Prints the matching days as csv, or only their number, and how much was read to stderr."""
+    if count:
+        print(len(result.dates))
+    else:
+        columns = [COLUMNS.index(name) for name in columns or COLUMNS]
+        print('date,' + ','.join(COLUMNS[i] for i in columns))
+        for date, row in zip(result.dates, result.values):
+            print(f'{date},' + ','.join(f'{row[i]:g}' for i in columns))
+    print(f"{len(result.dates)} days, read {result.scanned_days} days of {result.scanned_months} "
+          f"of {result.months} months.", file=sys.stderr)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Print the archived days matching a date range and predicates.")
+    parser.add_argument("start", nargs="?", help="First day, YYYY-MM-DD (default: the archive start)")
+    parser.add_argument("end", nargs="?", help="Last day, YYYY-MM-DD (default: the last archived day)")
+    parser.add_argument("-w", "--where", nargs="+", default=[], metavar="PREDICATE",
+                        help="Conditions like 'temperature_max>35', all of which must hold")
+    parser.add_argument("--season", choices=SEASONS, nargs="+", help="Only days of these seasons")
+    parser.add_argument("-c", "--columns", choices=COLUMNS, nargs="+", metavar="COLUMN",
+                        help="The columns to print, like temperature_max (default: all)")
+    parser.add_argument("--count", action="store_true", help="Print only the number of matching days")
+    parser.add_argument("-t", "--station", default=DEFAULT_STATION, help="The station of the archive")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    with session('query', args.profile, args.metrics):
+        try:
+            result = query(args.start, args.end, args.where, args.season,
+                           Aggregates(DailyArchive(station=args.station)))
+        except ValueError as e:
+            parser.error(str(e))
+        print_result(result, args.columns, args.count)
+
+
+if __name__ == "__main__":
+    main()
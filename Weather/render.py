@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import logging
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use('Agg')  # headless, before pyplot is imported by figures
+
+from conversion import load_si
+from date import parse_year_month
+from distributions import DISTRIBUTION_VERSION, DistributionStore
+from figures import HistogramFigure, TemperatureFigure
+from instrument import add_profile_arguments, session, span
+from month_parser import MonthData, find_sources
+from stations import station_name
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Bump when a figure changes, so every cached chart is drawn again.
+RENDER_VERSION = 1
+
+OUTPUT_DIR = 'Charts'
+
+KINDS = ('histogram', 'temperature')
+
+# The figures of the current process, built on their first month and reused for the next ones.
+_figures = {}
+
+
+def figure(kind: str):
+    """Returns the reusable figure of a kind for this process."""
+    if kind not in _figures:
+        _figures[kind] = HistogramFigure() if kind == 'histogram' else TemperatureFigure()
+    return _figures[kind]
+
+
+def data_hash(data: MonthData, kind: str) -> str:
+    """Returns the hash of everything a chart is drawn from."""
+    version = f'{RENDER_VERSION}.{DISTRIBUTION_VERSION}' if kind == 'histogram' else RENDER_VERSION
+    digest = hashlib.sha1(f'{kind}:{version}:{data.station}:{data.year}-{data.month}:'.encode())
+    digest.update(data.days.tobytes())
+    digest.update(data.block.tobytes())
+    return digest.hexdigest()
+
+
+def is_cached(path: str, digest: str) -> bool:
+    """Returns True if the chart exists and was drawn from data with the given hash."""
+    try:
+        with open(f'{path}.sha1', encoding='utf-8') as f:
+            return f.read().strip() == digest and os.path.exists(path)
+    except FileNotFoundError:
+        return False
+
+
+def render_month(source: str, kinds: tuple = KINDS, formats: tuple = ('png',), output_dir: str = OUTPUT_DIR,
+                 force: bool = False) -> tuple[int, int]:
+    """
+    Renders the charts of a month that are missing or out of date.
+
+    :arg source: The Month_Data csv path.
+    :arg kinds: The charts to render, from KINDS.
+    :arg formats: The image formats, like 'png' or 'svg'.
+    :arg output_dir: Where the charts are written, in '{station}/{year}' partitions.
+    :arg force: Render even when the cached chart matches the data.
+
+    :returns tuple: The number of rendered and skipped images.
+    """
+
+    data = load_si(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    directory = os.path.join(output_dir, data.station, str(data.year))
+    rendered, skipped = 0, 0
+
+    for kind in kinds:
+        digest = data_hash(data, kind)
+        paths = [os.path.join(directory, f'{name}_{kind}.{fmt}') for fmt in formats]
+        stale = [path for path in paths if force or not is_cached(path, digest)]
+        skipped += len(paths) - len(stale)
+        if not stale:
+            continue
+
+        fig = figure(kind)
+        fig.update(DistributionStore().month(source) if kind == 'histogram' else data, station_name(data.station))
+        os.makedirs(directory, exist_ok=True)
+
+        for path in stale:
+            with span('savefig', kind=kind, path=path) as record:
+                fig.figure.savefig(f'{path}.tmp', format=os.path.splitext(path)[1][1:])
+                os.replace(f'{path}.tmp', path)
+                record['bytes'] = os.path.getsize(path)
+            with open(f'{path}.sha1', 'w', encoding='utf-8') as f:
+                f.write(digest)
+            rendered += 1
+
+    return rendered, skipped
+
+
+def render_batch(sources: list, kinds: tuple = KINDS, formats: tuple = ('png',), output_dir: str = OUTPUT_DIR,
+                 force: bool = False, jobs: int = None) -> dict:
+    """
+    Renders the charts of many months on a process pool. Every worker builds its
+    figures once and reuses them for all the months it is given.
+
+    :returns dict: The rendered and skipped image counts, the failed sources and the run time.
+    """
+
+    start = time.perf_counter()
+    summary = {'rendered': 0, 'skipped': 0, 'failed': []}
+    os.makedirs(output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(render_month, source, kinds, formats, output_dir, force): source
+                   for source in sources}
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                rendered, skipped = future.result()
+                summary['rendered'] += rendered
+                summary['skipped'] += skipped
+            except (OSError, ValueError) as e:
+                logger.error(f"Error rendering '{source}': {e}")
+                summary['failed'].append(source)
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Render the charts of many months to image files, headless.")
+    parser.add_argument("sources", nargs="*", default=[], help="Month_Data csv paths, directories or glob patterns")
+    parser.add_argument("-r", "--range", nargs=2, type=parse_year_month, metavar=("START", "END"),
+                        help="Render the Month_Data files of a YYYY-MM to YYYY-MM range")
+    parser.add_argument("-s", "--station", nargs="+", help="Only these stations")
+    parser.add_argument("-k", "--kind", choices=KINDS, nargs="+", default=list(KINDS), help="The charts to render")
+    parser.add_argument("-f", "--format", choices=["png", "svg"], nargs="+", default=["png"],
+                        help="The image formats")
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR, help="The output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    parser.add_argument("--force", action="store_true", help="Render even when the charts are up to date")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.sources and not args.range:
+        parser.error("render needs sources or --range")
+
+    with session('render', args.profile, args.metrics):
+        sources = find_sources(args.sources, args.range, args.station)
+        summary = render_batch(sources, tuple(args.kind), tuple(args.format), args.output, args.force, args.jobs)
+        print(f"Rendered {summary['rendered']} images, skipped {summary['skipped']} up to date, "
+              f"{len(summary['failed'])} months failed in {summary['seconds']:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
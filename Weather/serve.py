@@ -0,0 +1,402 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from calendar_index import MonthKey, months, parse_key
+from conversion import CONVERTER_VERSION
+from instrument import add_profile_arguments, session, span
+from stations import load_stations, month_files, month_path
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# The content type of every data format.
+DATA_FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'npy': 'application/octet-stream',
+}
+CHART_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+STATION_ID = re.compile(r'^\w+$')
+DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+CHART = re.compile(r'^/charts/(?P<station>\w+)/(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<kind>[a-z]+)\.(?P<fmt>[a-z]+)$')
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class Response(NamedTuple):
+    status: int
+    content_type: str
+    body: bytes
+    etag: str = None
+
+
+class HttpError(Exception):
+    """Ends a request with an error status and message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def error(status: int, message: str) -> Response:
+    return Response(status, 'application/json', json.dumps({'error': message}).encode())
+
+
+def file_state(paths: list) -> tuple:
+    """Returns the (path, mtime, size) of every file, which changes whenever one of them is written."""
+    state = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            state.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            state.append((path, None, None))
+    return tuple(state)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Returns True if an If-None-Match header lists the ETag, compared weakly as that header requires."""
+    if header.strip() == '*':
+        return True
+    strong = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith('W/') else candidate) == strong:
+            return True
+    return False
+
+
+def parse_date(name: str, value: str) -> str:
+    """
+    Returns a YYYY-MM-DD query value once it is checked to be a real date.
+
+    :raises HttpError: If it is not.
+    """
+    try:
+        if DATE.match(value):
+            date.fromisoformat(value)
+            return value
+    except ValueError:
+        pass
+    raise HttpError(400, f"'{name}' must be a YYYY-MM-DD date.")
+
+
+def data_body(sources: list, start: str, end: str, fmt: str) -> bytes:
+    """
+    Returns the SI days of the month files inside an inclusive date range in a DATA_FORMATS format.
+
+    Runs in a worker process, so conversion never blocks the event loop.
+    """
+
+    from conversion import load_si
+    from si_table import SI_FIELDS, month_records
+
+    with span('serve_data', months=len(sources), format=fmt) as record:
+        parts = [month_records(load_si(source)) for source in sources]
+        if parts:
+            records = np.concatenate(parts)
+        else:
+            records = np.empty(0, dtype=[('date', 'datetime64[D]')] + [(name, np.float64) for name in SI_FIELDS])
+        records = records[(records['date'] >= np.datetime64(start)) & (records['date'] <= np.datetime64(end))]
+        record['rows'] = len(records)
+
+        if fmt == 'npy':
+            buffer = io.BytesIO()
+            np.save(buffer, records)
+            return buffer.getvalue()
+        columns = [records[name] for name in SI_FIELDS]
+        if fmt == 'csv':
+            lines = ['date,' + ','.join(SI_FIELDS)]
+            for i, date in enumerate(records['date']):
+                lines.append(f'{date},' + ','.join('' if np.isnan(c[i]) else f'{c[i]:g}' for c in columns))
+            return ('\n'.join(lines) + '\n').encode()
+        rows = [[str(date)] + [None if np.isnan(c[i]) else float(c[i]) for c in columns]
+                for i, date in enumerate(records['date'])]
+        return json.dumps({'columns': ['date'] + SI_FIELDS, 'rows': rows}).encode()
+
+
+def chart_body(source: str, kind: str, fmt: str, output_dir: str) -> tuple:
+    """
+    Renders the chart of a month file when it is missing or stale, in a worker process.
+
+    :returns tuple: The image bytes and the hash of the data it shows.
+    """
+
+    from render import render_month
+
+    render_month(source, (kind,), (fmt,), output_dir)
+    key = parse_key(source)
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(output_dir, key.station, str(key.year), f'{name}_{kind}.{fmt}')
+    with open(path, 'rb') as f:
+        image = f.read()
+    with open(f'{path}.sha1', encoding='utf-8') as f:
+        return image, f.read().strip()
+
+
+class ResponseCache:
+    """
+    The most recently used responses by request, each kept with the state of the month files it
+    was built from and only served while that state is unchanged.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, key, state) -> Response or None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != state:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, state, response: Response):
+        self._entries[key] = state, response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+class WeatherService:
+    """
+    Serves SI data and charts over HTTP from the local Month_Data, with asyncio.
+
+        GET /stations                                       the registered stations and their months
+        GET /data/{station}?start=YYYY-MM-DD&end=...&format=json|csv|npy
+        GET /charts/{station}/{year}/{month}/{kind}.png|svg  kind is histogram or temperature
+
+    Conversion and rendering run on a process pool, and file system reads like listing and
+    stating month files on a thread, so the event loop only parses and writes. Responses are
+    cached and carry an ETag derived from the month files they were built from, so an unchanged
+    month is never converted or rendered twice and If-None-Match requests are answered with 304.
+    Concurrent requests for the same response wait for a single computation.
+    """
+
+    def __init__(self, root: str = 'Month_Data', charts: str = 'Charts', jobs: int = None, cache_size: int = 256):
+        """
+        :arg root: The Month_Data directory.
+        :arg charts: Where rendered charts are kept, as by render.py.
+        :arg jobs: Worker processes.
+        :arg cache_size: The number of responses kept in memory.
+        """
+        self.root = root
+        self.charts = charts
+        self.cache = ResponseCache(cache_size)
+        # Forked workers would inherit the open client sockets and keep closed connections open.
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context(method))
+        self._pending = {}
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    async def respond(self, method: str, target: str, headers: dict) -> Response:
+        """Answers one request."""
+        if method not in ('GET', 'HEAD'):
+            return error(405, f"{method} is not supported.")
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if url.path in ('/', '/stations'):
+                return await asyncio.to_thread(self._stations)
+            if url.path.startswith('/data/'):
+                response = await self._data(url.path[len('/data/'):], query)
+            else:
+                match = CHART.match(url.path)
+                if not match:
+                    raise HttpError(404, f"No such resource '{url.path}'.")
+                response = await self._chart(**match.groupdict())
+        except HttpError as e:
+            return error(e.status, str(e))
+        if response.etag and etag_matches(headers.get('if-none-match', ''), response.etag):
+            return Response(304, response.content_type, b'', response.etag)
+        return response
+
+    def _stations(self) -> Response:
+        registered = load_stations()
+        partitions = month_files(self.root)
+        body = []
+        for station in sorted(set(registered) | {station for station, _ in partitions}):
+            paths = [path for (s, _), group in sorted(partitions.items()) if s == station for path in group]
+            entry = registered[station]._asdict() if station in registered else {'id': station}
+            entry['months'] = len(paths)
+            body.append(entry)
+        return Response(200, DATA_FORMATS['json'], json.dumps(body).encode())
+
+    async def _data(self, station: str, query: dict) -> Response:
+        fmt = query.get('format', 'json')
+        if not STATION_ID.match(station):
+            raise HttpError(404, f"No station '{station}'.")
+        if fmt not in DATA_FORMATS:
+            raise HttpError(400, f"Unknown format '{fmt}', choose one of {', '.join(DATA_FORMATS)}.")
+        for name in ('start', 'end'):
+            if name in query:
+                parse_date(name, query[name])
+
+        first, last, sources, state = await asyncio.to_thread(self._data_sources, station, query)
+        key = ('data', station, first, last, fmt)
+
+        async def build():
+            body = await self._run(data_body, sources, first, last, fmt)
+            etag = '"' + hashlib.sha1(repr((key, state)).encode()).hexdigest() + '"'
+            return Response(200, DATA_FORMATS[fmt], body, etag)
+
+        return await self._cached(key, state, build)
+
+    def _data_sources(self, station: str, query: dict) -> tuple:
+        """Returns the date range, the month files and their state of a data request, on a thread."""
+        if 'start' in query and 'end' in query:
+            first, last = query['start'], query['end']
+        else:
+            partitions = sorted(year for (s, year) in month_files(self.root, [station]))
+            if not partitions:
+                raise HttpError(404, f"No months of station '{station}'.")
+            first, last = query.get('start', f'{partitions[0]}-01-01'), query.get('end', f'{partitions[-1]}-12-31')
+        if last < first:
+            raise HttpError(400, "'end' is before 'start'.")
+        span_months = months((int(first[:4]), int(first[5:7])), (int(last[:4]), int(last[5:7])))
+        sources = [path for path in (month_path(MonthKey(station, year, month), self.root)
+                                     for year, month in span_months) if os.path.exists(path)]
+        if not sources:
+            raise HttpError(404, f"No months of station '{station}' between {first} and {last}.")
+        return first, last, sources, (CONVERTER_VERSION, file_state(sources))
+
+    async def _chart(self, station: str, year: str, month: str, kind: str, fmt: str) -> Response:
+        from render import KINDS
+
+        if kind not in KINDS or fmt not in CHART_FORMATS:
+            raise HttpError(404, f"No {kind} chart as {fmt}, choose one of {', '.join(KINDS)} "
+                                 f"as {', '.join(CHART_FORMATS)}.")
+
+        def locate():
+            path = month_path(MonthKey(station, int(year), int(month)), self.root)
+            return path, file_state([path])
+
+        source, state = await asyncio.to_thread(locate)
+        if state[0][1] is None:
+            raise HttpError(404, f"No month {year}-{month} of station '{station}'.")
+
+        key = ('chart', source, kind, fmt)
+
+        async def build():
+            image, digest = await self._run(chart_body, source, kind, fmt, self.charts)
+            return Response(200, CHART_FORMATS[fmt], image, f'"{digest}"')
+
+        return await self._cached(key, state, build)
+
+    async def _cached(self, key, state, build) -> Response:
+        """Returns the cached response of a request, or builds it once however many requests wait for it."""
+        response = self.cache.get(key, state)
+        if response is not None:
+            return response
+        pending = self._pending.get((key, state))
+        if pending is None:
+            pending = self._pending[(key, state)] = asyncio.ensure_future(build())
+            pending.add_done_callback(lambda _: self._pending.pop((key, state), None))
+        response = await asyncio.shield(pending)
+        self.cache.put(key, state, response)
+        return response
+
+    async def _run(self, function, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+        except (OSError, ValueError) as e:
+            raise HttpError(404 if isinstance(e, FileNotFoundError) else 400, str(e)) from e
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves the requests of one connection, keeping it open between HTTP/1.1 requests."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    response, method, version = error(400, "Malformed request line."), 'GET', 'HTTP/1.0'
+                else:
+                    try:
+                        response = await self.respond(method, target, headers)
+                    except Exception as e:
+                        logger.exception(f"Error answering {target}: {e}")
+                        response = error(500, "Internal error.")
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                head = [f'HTTP/1.1 {response.status} {REASONS[response.status]}',
+                        f'Content-Type: {response.content_type}',
+                        f'Content-Length: {len(response.body)}',
+                        'Cache-Control: no-cache',
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if response.etag:
+                    head.append(f'ETag: {response.etag}')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(response.body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000):
+        """Serves until cancelled."""
+        # A deep accept queue, so a burst of dashboard connections is not refused or retried.
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"Serving {self.root} on http://{host}:{port}/", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve SI data and charts over HTTP on this machine.")
+    parser.add_argument("-H", "--host", default='127.0.0.1', help="The address to listen on")
+    parser.add_argument("-p", "--port", type=int, default=8000, help="The port to listen on")
+    parser.add_argument("--root", default='Month_Data', help="The Month_Data directory")
+    parser.add_argument("-o", "--charts", default='Charts', help="Where rendered charts are kept")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    parser.add_argument("-c", "--cache", type=int, default=256, help="Responses kept in memory")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('serve', args.profile, args.metrics):
+        service = WeatherService(args.root, args.charts, args.jobs, args.cache)
+        try:
+            asyncio.run(service.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from instrument import add_profile_arguments, session
+from month_parser import MonthData
+from calendar_index import parse_key
+
+
+def file_digest(path: str) -> str:
+    """Returns the sha1 hex digest of the file content."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class SICache:
+    """
+    A content addressed on-disk cache of converted months.
+
+    Every entry is a '{digest}_v{version}.npy' file holding the day numbers followed by the
+    converted block, so a warm load is a memory map with no text parsing and no copy of the
+    numeric payload. A record per source file in index/ remembers its mtime, size and digest,
+    so unchanged sources are not even hashed again. Every record is its own small file, replaced
+    atomically, so worker processes converting different sources never overwrite each other's.
+    """
+
+    def __init__(self, directory: str, version: int):
+        """
+        :arg directory: The directory holding the cache entries.
+        :arg version: The converter version, entries of other versions are never used.
+        """
+        self.directory = directory
+        self.version = version
+        self._records_directory = os.path.join(directory, 'index')
+        self._records = {}
+
+    def load(self, path: str, build) -> MonthData:
+        """
+        Returns the converted month of a source file, building and storing it on a miss.
+
+        :arg path: The path to the source csv file.
+        :arg build: A callable returning the converted MonthData, called on a cache miss.
+
+        :returns MonthData: The converted month, memory mapped read-only on a hit.
+        """
+
+        key = parse_key(path)
+        digest = self._digest(path)
+        entry = self._entry_path(digest)
+
+        if os.path.exists(entry):
+            values = np.load(entry, mmap_mode='r')
+            return MonthData(key.year, key.month, values[:, 0].astype(np.int16), values[:, 1:], key.station)
+
+        data = build()
+        values = np.column_stack([data.days, data.block])
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp, entry)
+        return data
+
+    def prune(self) -> int:
+        """
+        Removes entries of other converter versions and entries no source file points at.
+
+        :returns int: The number of removed entry files.
+        """
+
+        live = set()
+        for record_path, record in self._read_records():
+            try:
+                stat = os.stat(record['path'])
+            except FileNotFoundError:
+                stat = None
+            if stat is None or (stat.st_mtime_ns, stat.st_size) != (record['mtime_ns'], record['size']):
+                os.remove(record_path)
+                self._records.pop(record['path'], None)
+                continue
+            live.add(os.path.basename(self._entry_path(record['digest'])))
+
+        # The single index file of earlier versions.
+        try:
+            os.remove(os.path.join(self.directory, 'index.json'))
+        except FileNotFoundError:
+            pass
+
+        # A record is written before its entry, so an entry being built by another process is live.
+        removed = 0
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if name.endswith('.npy') and name not in live:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def clear(self):
+        """Removes every entry and the index."""
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        self._records = {}
+
+    def _entry_path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}_v{self.version}.npy")
+
+    def _digest(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        record = self._read_record(path)
+        if record and (record['mtime_ns'], record['size']) == (stat.st_mtime_ns, stat.st_size):
+            return record['digest']
+
+        digest = file_digest(path)
+        if record and record['digest'] != digest:
+            shared = any(r['digest'] == record['digest'] for _, r in self._read_records() if r['path'] != path)
+            if not shared:
+                try:
+                    os.remove(self._entry_path(record['digest']))
+                except FileNotFoundError:
+                    pass
+        self._write_record({'path': path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest})
+        return digest
+
+    def _record_path(self, path: str) -> str:
+        return os.path.join(self._records_directory, f"{hashlib.sha1(path.encode('utf-8')).hexdigest()}.json")
+
+    def _read_record(self, path: str) -> dict or None:
+        """Returns the record of an absolute source path, None if it has none."""
+        if path not in self._records:
+            try:
+                with open(self._record_path(path), encoding='utf-8') as f:
+                    self._records[path] = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+        return self._records[path]
+
+    def _read_records(self):
+        """Yields the (record file, record) of every source, as written by any process."""
+        if not os.path.isdir(self._records_directory):
+            return
+        for name in os.listdir(self._records_directory):
+            if not name.endswith('.json'):
+                continue
+            record_path = os.path.join(self._records_directory, name)
+            try:
+                with open(record_path, encoding='utf-8') as f:
+                    yield record_path, json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+
+    def _write_record(self, record: dict):
+        os.makedirs(self._records_directory, exist_ok=True)
+        record_path = self._record_path(record['path'])
+        tmp = f"{record_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp, record_path)
+        self._records[record['path']] = record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the cache of SI converted months.")
+    parser.add_argument("command", choices=["prune", "clear"],
+                        help="prune: drop stale entries, clear: drop everything")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('si_cache', args.profile, args.metrics):
+        from conversion import month_cache
+
+        if args.command == "prune":
+            removed = month_cache.prune()
+            print(f"Removed {removed} stale entries from {month_cache.directory}.")
+        else:
+            month_cache.clear()
+            print(f"Cleared {month_cache.directory}.")
+
+
+if __name__ == "__main__":
+    main()
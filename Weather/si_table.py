@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+
+from calendar_index import month_dates
+from conversion import CONVERTER_VERSION, UNITS
+from month_parser import FIELDS, MonthData
+
+
+# Bump when the columns or the files change, so outputs of older layouts are written again.
+SCHEMA_VERSION = 1
+
+# The name suffix of every SI unit.
+UNIT_SUFFIXES = {'degC': 'c', '%': 'pct', 'm/s': 'mps', 'hPa': 'hpa', 'mm': 'mm'}
+
+# The flat column of every FIELDS entry, like temperature_max_c, following the date column.
+SI_FIELDS = [f'{key}_{stat.lower()}_{UNIT_SUFFIXES[UNITS[key][1]]}' for key, stat in FIELDS]
+
+# The file formats of SI months: csv text, or an .npy structured array readable without parsing.
+FORMATS = ('csv', 'npy')
+
+SCHEMA_FILE = 'schema.json'
+
+
+def schema(dtype=np.float64) -> dict:
+    """Returns the schema of the SI months, the sidecar written next to them."""
+    return {
+        'version': SCHEMA_VERSION,
+        'converter_version': CONVERTER_VERSION,
+        'columns': [{'name': 'date', 'type': 'date'}] +
+                   [{'name': name, 'type': np.dtype(dtype).name, 'unit': UNITS[key][1], 'variable': key, 'stat': stat}
+                    for name, (key, stat) in zip(SI_FIELDS, FIELDS)],
+    }
+
+
+def write_schema(directory: str, dtype=np.float64):
+    """Writes the schema sidecar of an SI output directory."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SCHEMA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(schema(dtype), f, indent=1)
+
+
+def schema_matches(directory: str, dtype=np.float64) -> bool:
+    """Returns True if the months of an SI output directory were written with the current schema."""
+    try:
+        with open(os.path.join(directory, SCHEMA_FILE), encoding='utf-8') as f:
+            return json.load(f) == schema(dtype)
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def month_records(data: MonthData) -> np.ndarray:
+    """Returns an SI month as a structured array of a date field followed by the SI_FIELDS."""
+    records = np.empty(len(data.days), dtype=[('date', 'datetime64[D]')] + [(name, data.block.dtype)
+                                                                          for name in SI_FIELDS])
+    records['date'] = month_dates(data.year, data.month)[data.days.astype(np.int64) - 1]
+    for i, name in enumerate(SI_FIELDS):
+        records[name] = data.block[:, i]
+    return records
+
+
+def month_frame(data: MonthData):
+    """Returns an SI month as a DataFrame of a date column followed by the SI_FIELDS."""
+    import pandas as pd
+
+    frame = pd.DataFrame(data.block, columns=SI_FIELDS)
+    frame.insert(0, 'date', month_dates(data.year, data.month)[data.days.astype(np.int64) - 1])
+    return frame
+
+
+def write_month(data: MonthData, path: str):
+    """
+    Writes an SI month to a .csv or .npy path, through a temporary file so readers never see half a month.
+
+    :raises ValueError: If the extension is not one of FORMATS.
+    """
+
+    extension = os.path.splitext(path)[1][1:]
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown SI format '{extension}', choose one of {', '.join(FORMATS)}.")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if extension == 'csv':
+        month_frame(data).to_csv(tmp, index=False)
+    else:
+        with open(tmp, 'wb') as f:
+            np.save(f, month_records(data))
+    os.replace(tmp, path)
+
+
+def read_month(path: str):
+    """
+    Reads an SI month written by write_month into a DataFrame, with one bulk read and typed columns.
+
+    :raises ValueError: If the extension is not one of FORMATS.
+    """
+
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1][1:]
+    if extension == 'csv':
+        return pd.read_csv(path, parse_dates=['date'], dtype={name: np.float64 for name in SI_FIELDS})
+    if extension == 'npy':
+        return pd.DataFrame(np.load(path))
+    raise ValueError(f"Unknown SI format '{extension}', choose one of {', '.join(FORMATS)}.")
@@ -0,0 +1,119 @@
+import argparse
+import gzip
+import json
+import os
+
+from datetime import datetime, timedelta, timezone
+
+from calendar_index import DEFAULT_STATION, MonthKey, month_end
+from instrument import add_profile_arguments, session
+
+
+class SnapshotStore:
+    """
+    Keeps the raw html of every fetched month, gzip compressed, so pages can be parsed
+    again without fetching them.
+
+    A page is stored as '{directory}/{station}/{year}_{month}.html.gz' next to a json file
+    with its station, month and fetch time. A snapshot is complete when it was fetched after
+    the month (and a day of margin for late observations) was over; incomplete months such as
+    the current one should be fetched again.
+    """
+
+    def __init__(self, directory: str = 'Snapshots', station: str = DEFAULT_STATION):
+        self.root = directory
+        self.directory = os.path.join(directory, station)
+        self.station = station
+
+    def _path(self, year: int, month: int, suffix: str = '.html.gz') -> str:
+        return os.path.join(self.directory, f'{year}_{month}{suffix}')
+
+    def save(self, year: int, month: int, page_source: str, fetched_at: datetime = None):
+        """
+        Stores a fetched page.
+
+        :arg year: The year of the page.
+        :arg month: The month of the page.
+        :arg page_source: The page html.
+        :arg fetched_at: When the page was fetched, now by default.
+        """
+
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(year, month)
+        with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8') as f:
+            f.write(page_source)
+        os.replace(f"{path}.tmp", path)
+
+        meta = {'station': self.station, 'year': year, 'month': month, 'fetched_at': fetched_at.isoformat()}
+        meta_path = self._path(year, month, '.json')
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def load(self, year: int, month: int) -> str or None:
+        """Returns the stored html of a month, or None if there is no snapshot."""
+        try:
+            with gzip.open(self._path(year, month), 'rt', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def info(self, year: int, month: int) -> dict or None:
+        """Returns the metadata of a month's snapshot, or None if there is none."""
+        try:
+            with open(self._path(year, month, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def is_complete(self, year: int, month: int) -> bool:
+        """Returns True if the month has a snapshot fetched after the month was over."""
+        meta = self.info(year, month)
+        if meta is None:
+            return False
+        last_day = month_end(year, month).astype(object)
+        return datetime.fromisoformat(meta['fetched_at']).date() > last_day + timedelta(days=1)
+
+    def months(self) -> list:
+        """Returns every stored (year, month), in order."""
+        if not os.path.isdir(self.directory):
+            return []
+        keys = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.html.gz'):
+                year, month = name[:-len('.html.gz')].split('_')
+                keys.append((int(year), int(month)))
+        return sorted(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild Month_Data from stored page snapshots.")
+    parser.add_argument("-s", "--station", default=DEFAULT_STATION, help="The station of the snapshots")
+    parser.add_argument("-o", "--output", default='Month_Data', help="The output directory")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('snapshots', args.profile, args.metrics):
+        from html_extract import extract_month
+        from month_parser import write_month
+        from stations import month_path
+
+        store = SnapshotStore(station=args.station)
+        os.makedirs(args.output, exist_ok=True)
+        rebuilt, failed = 0, 0
+        for year, month in store.months():
+            try:
+                data = extract_month(store.load(year, month), year, month, args.station)
+            except ValueError as e:
+                print(f"  {year}-{month}: {e}")
+                failed += 1
+                continue
+            path = month_path(MonthKey(args.station, year, month), args.output)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_month(data, path)
+            rebuilt += 1
+        print(f"Rebuilt {rebuilt} months from snapshots, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,11 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 
-from bs4 import BeautifulSoup
+from calendar_index import parse_key
+from html_extract import extract_rows
+from instrument import session, span
+from snapshots import SnapshotStore
+from stations import BUILTIN_STATIONS, month_path
 
 import calendar
 
@@ -58,10 +62,97 @@ def get_path() -> str or None:
     return executable_path
 
 
+MONTH_URL = BUILTIN_STATIONS[0].url()
+
+TABLE_SELECTOR = ('#inner-content > div.region-content-main > div.row > div:nth-child(5) > div:nth-child(1) > div > '
+                  'lib-city-history-observation > div > div.observation-table.ng-star-inserted')
+
+
+class ChromeFetcher:
+    """
+    A long-lived Chrome session that loads history pages and returns their source.
+    """
+
+    def __init__(self, executable_path: str, delay: int = 10):
+        """
+        :param executable_path: The path to the ChromeDriver executable.
+        :param delay: Seconds to wait for the observation table to appear.
+        """
+
+        service = Service(executable_path=executable_path)
+
+        options = Options()
+        options.add_argument('start-maximized')
+        options.add_argument('disable-infobars')
+        options.add_argument('disable-search-engine-choice-screen')
+
+        with span('driver_start'):
+            self.driver = webdriver.Chrome(service=service, options=options)
+        self.delay = delay
+
+    def fetch(self, url: str) -> str:
+        """
+        Loads the url and waits for the observation table.
+
+        :param url: The history page url.
+        :return: The page source.
+        :raise TimeoutException: If the table does not appear within the delay.
+        """
+
+        with span('page_wait', url=url) as record:
+            self.driver.get(url)
+            WebDriverWait(self.driver, self.delay).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, TABLE_SELECTOR)))
+            page_source = self.driver.page_source
+            record['bytes'] = len(page_source)
+        return page_source
+
+    def close(self):
+        self.driver.quit()
+
+
+def extract_table(page_source: str) -> list:
+    """
+    Extracts the rows of the observation table from a page source.
+
+    Parameters
+    ----------
+    :param page_source: The html of a monthly history page.
+
+    Returns
+    -------
+    data: The rows of the inner tables, one list of cell texts per row.
+    """
+
+    return extract_rows(page_source)
+
+
+def fetch_page(fetcher, year: int, month: int, store: SnapshotStore, url: str = MONTH_URL) -> str:
+    """
+    Returns the page of a month, from its snapshot if that is complete, otherwise fetched
+    and stored as a new snapshot.
+
+    Parameters
+    ----------
+    :param fetcher: A callable returning the fetcher to use, only called when a fetch is needed.
+    :param year: The year of the page.
+    :param month: The month of the page.
+    :param store: The snapshot store.
+    :param url: The url template, formatted with year and month.
+    """
+
+    if store.is_complete(year, month):
+        return store.load(year, month)
+
+    page_source = fetcher().fetch(url.format(year=year, month=month))
+    store.save(year, month, page_source)
+    return page_source
+
+
 def get_weather_data(year: int, month: int) -> tuple[int, list]:
     """
         Fetches weather data and the number of days for a given month and year from
-        the provided URL using Selenium.
+        the provided URL using Selenium, or from a complete snapshot of the page.
 
         Parameters
         ----------
@@ -79,71 +170,31 @@ def get_weather_data(year: int, month: int) -> tuple[int, list]:
         """
 
     days_in_month = calendar.monthrange(year=year, month=month)
+    store = SnapshotStore()
+    fetchers = []
 
-    executable_path = get_path()
-
-    if not executable_path:
-        raise ValueError('Error: Executable path is missing.')
+    def chrome():
+        executable_path = get_path()
 
-    service = Service(executable_path=executable_path)
+        if not executable_path:
+            raise ValueError('Error: Executable path is missing.')
 
-    options = Options()
-    options.add_argument('start-maximized')
-    options.add_argument('disable-infobars')
-    options.add_argument('disable-search-engine-choice-screen')
+        fetchers.append(ChromeFetcher(executable_path))
+        return fetchers[0]
 
-    driver = webdriver.Chrome(service=service, options=options)
-
-    url = f'https://www.wunderground.com/history/monthly/gr/spata/LGAV/date/{year}-{month}'
-
-    driver.get(url)
-    delay = 10
     data = []
 
     try:
-        selector = ('#inner-content > div.region-content-main > div.row > div:nth-child(5) > div:nth-child(1) > div > '
-                    'lib-city-history-observation > div > div.observation-table.ng-star-inserted')
-        WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+        page_source = fetch_page(chrome, year, month, store)
         print("Page is ready!")
-
-        # Get the page source
-        page_source = driver.page_source
-
-        # Create a BeautifulSoup object
-        soup = BeautifulSoup(page_source, 'html.parser')
-
-        # Try different selectors if necessary
-        outer_table = soup.find('div', class_='observation-table ng-star-inserted').find('table')
-        if not outer_table:
-            outer_table = soup.find('table', class_='days ng-star-inserted')  # Try a different selector
-            if not outer_table:
-                outer_table = soup.find('table', class_='ng-star-inserted')  # Try a more general selector
-
-        if outer_table:
-            # Extract data from the inner tables
-            data = []
-            for row in outer_table.find_all('tr'):
-                cells = row.find_all('td')
-                if cells:
-                    row_data = []
-                    for cell in cells:
-                        inner_table = cell.find('table')
-                        if inner_table:
-                            inner_data = []
-                            for inner_row in inner_table.find_all('tr'):
-                                inner_cells = inner_row.find_all('td')
-                                if inner_cells:
-                                    inner_data.append([cell.text.strip() for cell in inner_cells])
-                            row_data.append(inner_data)
-                        else:
-                            row_data.append(cell.text.strip())
-                    data.append(row_data)
+        data = extract_table(page_source)
 
     except TimeoutException:
         logger.warning(f"Warning: 'Loading took too much")
 
-    driver.quit()
-    return int(days_in_month[1]), data[2:]
+    for fetcher in fetchers:
+        fetcher.close()
+    return int(days_in_month[1]), data
 
 
 def create_dataframe(days_in_month: int, data: list):
@@ -165,14 +216,15 @@ def create_dataframe(days_in_month: int, data: list):
 
     days = days_in_month + 1
 
-    df = pd.DataFrame({'Time': data[:days],
-                       'Temperature (°F)': data[days:2*days],
-                       'Dew Point (°F)': data[2*days:3*days],
-                       'Humidity (%)': data[3*days:4*days],
-                       'Wind Speed (mph)': data[4*days:5*days],
-                       'Pressure (in)': data[5*days:6*days],
-                       'Precipitation (in)': data[6*days:7*days]
-                       })
+    with span('create_dataframe', rows=days):
+        df = pd.DataFrame({'Time': data[:days],
+                           'Temperature (°F)': data[days:2*days],
+                           'Dew Point (°F)': data[2*days:3*days],
+                           'Humidity (%)': data[3*days:4*days],
+                           'Wind Speed (mph)': data[4*days:5*days],
+                           'Pressure (in)': data[5*days:6*days],
+                           'Precipitation (in)': data[6*days:7*days]
+                           })
 
     return df
 
@@ -184,28 +236,32 @@ def save_to_csv(df: pd.DataFrame, filename: str):
     Parameter
     ---------
     :param df: The DataFrame to save.
-    :param filename: The name of the CSV file.
+    :param filename: The name of the CSV file, '{station}_{year}_{month}'.
     """
 
-    path = fr"C:\Users\SpaceYellow\Desktop\Python\Projects\Weather\Month_Data\{filename}.csv"
+    path = month_path(parse_key(f'{filename}.csv'))
 
     if df is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         df.to_csv(path, index=False)
 
 
 def main():
     """
         Main function to get user input, build URL, and call helper functions.
+
+        Set WEATHER_METRICS and WEATHER_PROFILE to record timing spans and a cProfile dump.
         """
 
     year, month = int(input("Year: ")), int(input("Month: "))
 
-    try:
-        days, data = get_weather_data(year=year, month=month)
-        df = create_dataframe(days_in_month=days, data=data)
-        save_to_csv(df, f'spata_venizelos_{year}_{month}')
-    except ValueError as e:
-        print(f"Error: {e}"," \nPlease ensure the ChromeDriver executable path is set correctly.")
+    with session('scrape'):
+        try:
+            days, data = get_weather_data(year=year, month=month)
+            df = create_dataframe(days_in_month=days, data=data)
+            save_to_csv(df, f'spata_venizelos_{year}_{month}')
+        except ValueError as e:
+            print(f"Error: {e}"," \nPlease ensure the ChromeDriver executable path is set correctly.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+import argparse
+import glob
+import json
+import os
+
+from typing import NamedTuple
+
+from calendar_index import DEFAULT_STATION, MonthKey, parse_key
+
+
+STATIONS_FILE = 'stations.json'
+
+HISTORY_URL = 'https://www.wunderground.com/history/monthly/{country}/{city}/{icao}/date/{{year}}-{{month}}'
+
+DAILY_HISTORY_URL = 'https://www.wunderground.com/history/daily/{country}/{city}/{icao}/date/{{year}}-{{month}}-{{day}}'
+
+
+class Station(NamedTuple):
+    """A weather station, identified by the prefix of its file names."""
+    id: str
+    name: str
+    country: str
+    city: str
+    icao: str
+
+    def url(self, template: str = None) -> str:
+        """
+        Returns the url template of the station's monthly history pages, still holding {year} and {month}.
+
+        :arg template: A custom template, which may use {station}, {country}, {city} and {icao}
+                       next to {year} and {month}, the wunderground history page by default.
+        """
+        if template is None:
+            return HISTORY_URL.format(country=self.country, city=self.city, icao=self.icao)
+        return template.format(year='{year}', month='{month}', station=self.id, country=self.country,
+                               city=self.city, icao=self.icao)
+
+    def daily_url(self, template: str = None) -> str:
+        """
+        Returns the url template of the station's daily history pages, still holding {year}, {month} and {day}.
+
+        :arg template: A custom template like the one of url, which may also use {day}.
+        """
+        if template is None:
+            return DAILY_HISTORY_URL.format(country=self.country, city=self.city, icao=self.icao)
+        return template.format(year='{year}', month='{month}', day='{day}', station=self.id,
+                               country=self.country, city=self.city, icao=self.icao)
+
+
+# The stations known without a registry file.
+BUILTIN_STATIONS = [
+    Station(DEFAULT_STATION, 'Spata', 'gr', 'spata', 'LGAV'),
+]
+
+
+def load_stations(path: str = STATIONS_FILE) -> dict:
+    """Returns every registered station by id, the built-in ones and those of the registry file."""
+    stations = {station.id: station for station in BUILTIN_STATIONS}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for entry in json.load(f):
+                stations[entry['id']] = Station(**entry)
+    except FileNotFoundError:
+        pass
+    return stations
+
+
+def get_station(station_id: str, path: str = STATIONS_FILE) -> Station:
+    """
+    Returns a registered station.
+
+    :raises ValueError: If the station is not registered.
+    """
+    stations = load_stations(path)
+    if station_id not in stations:
+        raise ValueError(f"Unknown station '{station_id}', known stations: {', '.join(sorted(stations))}.")
+    return stations[station_id]
+
+
+def station_name(station_id: str) -> str:
+    """Returns the display name of a station, or its id if it is not registered."""
+    try:
+        return get_station(station_id).name
+    except ValueError:
+        return station_id
+
+
+def add_station(station: Station, path: str = STATIONS_FILE):
+    """Adds or replaces a station in the registry file."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = [entry for entry in json.load(f) if entry['id'] != station.id]
+    except FileNotFoundError:
+        entries = []
+    entries.append(station._asdict())
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(sorted(entries, key=lambda entry: entry['id']), f, indent=2)
+    os.replace(tmp, path)
+
+
+def month_path(key: MonthKey, root: str = 'Month_Data', prefix: str = '', extension: str = 'csv') -> str:
+    """
+    Returns the path of a month's file in the station and year partitioned layout,
+    '{root}/{station}/{year}/{prefix}{station}_{year}_{month}.{extension}'.
+
+    A file still in the flat layout of earlier versions, directly inside root, is returned
+    when the partitioned one does not exist, so both layouts can be read.
+    """
+
+    name = key.file_name(extension, prefix)
+    path = os.path.join(root, key.station, str(key.year), name)
+    if not os.path.exists(path) and os.path.exists(os.path.join(root, name)):
+        return os.path.join(root, name)
+    return path
+
+
+def month_root(path: str) -> str:
+    """Returns the root directory of a month file path, in the partitioned or the flat layout."""
+    key = parse_key(path)
+    directory = os.path.dirname(path)
+    if os.path.basename(directory) == str(key.year) and os.path.basename(os.path.dirname(directory)) == key.station:
+        return os.path.dirname(os.path.dirname(directory))
+    return directory
+
+
+def resolve(file: str, root: str = 'Month_Data') -> str:
+    """
+    Returns the path of a month file name like 'spata_venizelos_2024_1.csv' inside root, in either layout.
+
+    :raises ValueError: If the name is not a month file name.
+    """
+    key = parse_key(file)
+    return month_path(key, root, extension=file.rsplit('.', 1)[-1])
+
+
+def month_files(root: str = 'Month_Data', stations: list = None, extension: str = 'csv') -> dict:
+    """
+    Returns the month files under root, partitioned and flat, grouped by (station, year).
+
+    :arg stations: Only the files of these station ids, every station by default.
+
+    :returns dict: The sorted paths of every (station, year) partition.
+    """
+
+    partitions = {}
+    names = glob.glob(os.path.join(root, '**', f'*.{extension}'), recursive=True)
+    for path in names:
+        try:
+            key = parse_key(path)
+        except ValueError:
+            continue
+        if stations is None or key.station in stations:
+            partitions.setdefault((key.station, key.year), []).append(path)
+    return {partition: sorted(paths, key=lambda p: parse_key(p).month) for partition, paths in partitions.items()}
+
+
+def migrate(root: str = 'Month_Data') -> int:
+    """
+    Moves the flat files directly inside root into the partitioned layout.
+
+    :returns int: The number of moved files.
+    """
+
+    moved = 0
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            key = parse_key(name)
+        except ValueError:
+            continue
+        target = os.path.join(root, key.station, str(key.year), name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        moved += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the station registry and the data layout.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Print the registered stations")
+    add = subparsers.add_parser("add", help="Register a station")
+    add.add_argument("id", help="The file name prefix, e.g. thessaloniki_makedonia")
+    add.add_argument("name", help="The name used in titles, e.g. Thessaloniki")
+    add.add_argument("country", help="The country of the history url, e.g. gr")
+    add.add_argument("city", help="The city of the history url, e.g. thessaloniki")
+    add.add_argument("icao", help="The airport code of the history url, e.g. LGTS")
+    migrate_parser = subparsers.add_parser("migrate", help="Move flat month files into station/year partitions")
+    migrate_parser.add_argument("roots", nargs="*", default=['Month_Data', 'SI_Month_Data'],
+                                help="The directories to migrate")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for station in load_stations().values():
+            print(f"{station.id:28} {station.name:16} {station.icao:6} {station.url()}")
+    elif args.command == "add":
+        add_station(Station(args.id, args.name, args.country, args.city, args.icao))
+        print(f"Registered {args.id}.")
+    else:
+        for root in args.roots:
+            if os.path.isdir(root):
+                print(f"Moved {migrate(root)} files into partitions of {root}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import calendar
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from calendar_index import MonthKey, day_range, month_days, months
+from month_parser import FIELDS, VARIABLES, MonthData, format_cell, variable_slice, write_month
+from stations import month_path
+
+
+def month_page(data: MonthData, padding: int = 0) -> str:
+    """
+    Renders a month as a monthly history page with the observation table layout of the site.
+
+    :arg data: The month in source (imperial) units.
+    :arg padding: Bytes of unrelated markup placed around the table, like the rest of a real page.
+
+    :returns str: The page html.
+    """
+
+    columns = [[[calendar.month_abbr[data.month]]] + [[str(day)] for day in data.days]]
+    for key, _, stats in VARIABLES:
+        values = data.block[:, variable_slice(key)]
+        columns.append([list(stats)] + [[format_cell(value, key, stat) for value, stat in zip(row, stats)]
+                                        for row in values])
+
+    inner = []
+    for rows in columns:
+        trs = ''.join('<tr>' + ''.join(f'<td class="ng-star-inserted"> {cell} </td>' for cell in row) + '</tr>'
+                      for row in rows)
+        inner.append(f'<td><table class="ng-star-inserted"><tbody>{trs}</tbody></table></td>')
+
+    head = ''.join(f'<td>{name}</td>' for name in ['Time'] + [column for _, column, _ in VARIABLES])
+    filler = '<div class="filler"><span>lorem ipsum</span></div>' * (padding // 96)
+    return (f'<html><body><div id="inner-content">{filler}'
+            f'<div class="observation-table ng-star-inserted"><table class="days ng-star-inserted">'
+            f'<thead><tr>{head}</tr></thead><tbody><tr>{"".join(inner)}</tr></tbody></table></div>'
+            f'{filler}</div></body></html>')
+
+
+def day_page(records: np.ndarray, padding: int = 0) -> str:
+    """
+    Renders observations as a daily history page with the observation table layout of the site.
+
+    :arg records: The observations.OBSERVATION_DTYPE records of one day, in source (imperial) units.
+    :arg padding: Bytes of unrelated markup placed around the table, like the rest of a real page.
+
+    :returns str: The page html.
+    """
+
+    from observations import OBSERVATIONS
+
+    units = {'temperature': '°F', 'dew_point': '°F', 'humidity': '%', 'wind_speed': 'mph', 'wind_gust': 'mph',
+             'pressure': 'in', 'precipitation': 'in'}
+    head = ''.join(f'<th class="mat-header-cell"><button>{name}</button></th>'
+                   for name in ['Time'] + [column for _, column in OBSERVATIONS] + ['Condition'])
+    rows = []
+    for record in records:
+        minutes = int((record['time'] - record['time'].astype('datetime64[D]')).astype(np.int64))
+        cells = [f'{(minutes // 60 - 1) % 12 + 1}:{minutes % 60:02d} {"AM" if minutes < 720 else "PM"}']
+        for key, _ in OBSERVATIONS:
+            value = float(record[key])
+            text = f'{value:.2f}' if key in ('pressure', 'precipitation') else f'{value:.0f}'
+            cells.append(f'<span class="wu-value wu-value-to">{text}</span>&nbsp;<span class="wu-label">{units[key]}'
+                         f'</span>' if not np.isnan(value) else '')
+        cells.append('Fair')
+        rows.append('<tr class="mat-row">' + ''.join(f'<td class="mat-cell">{cell}</td>' for cell in cells) + '</tr>')
+
+    filler = '<div class="filler"><span>lorem ipsum</span></div>' * (padding // 96)
+    return (f'<html><body><div id="inner-content">{filler}'
+            f'<div class="observation-table ng-star-inserted"><table class="mat-table cdk-table">'
+            f'<thead><tr class="mat-header-row">{head}</tr></thead><tbody>{"".join(rows)}</tbody></table></div>'
+            f'{filler}</div></body></html>')
+
+
+def synthetic_observations(station: str, day, interval: int = 30, seed: int = 0) -> np.ndarray:
+    """
+    Generates plausible observations of a day in source (imperial) units, at a fixed interval
+    like half-hourly METAR reports, with a daily temperature cycle and the odd missing value.
+
+    :returns np.ndarray: The observations.OBSERVATION_DTYPE records of the day.
+    """
+
+    from observations import OBSERVATION_DTYPE
+
+    day = np.datetime64(day, 'D')
+    rng = np.random.default_rng([seed, sum(map(ord, station)), int(day.astype(np.int64))])
+    minutes = np.arange(20, 24 * 60, interval)
+    phase = 2 * np.pi * ((day - day.astype('datetime64[Y]')).astype(np.int64) - 200) / 365.25
+    hours = minutes / 60
+    temperature = 62 + 16 * np.cos(phase) + 8 * np.sin(2 * np.pi * (hours - 9) / 24) + rng.normal(0, 1, len(minutes))
+    dew_point = temperature - rng.uniform(8, 20) - rng.normal(0, 1, len(minutes))
+    wind = np.abs(rng.normal(rng.uniform(5, 12), 3, len(minutes)))
+
+    records = np.zeros(len(minutes), dtype=OBSERVATION_DTYPE)
+    records['time'] = day + minutes.astype('timedelta64[m]')
+    records['temperature'] = np.round(temperature)
+    records['dew_point'] = np.round(dew_point)
+    records['humidity'] = np.clip(np.round(100 - 2.5 * (temperature - dew_point)), 10, 100)
+    records['wind_speed'] = np.round(wind)
+    records['wind_gust'] = np.where(rng.random(len(minutes)) < 0.1, np.round(wind * 1.5), 0)
+    records['pressure'] = np.round(29.92 + np.cumsum(rng.normal(0, 0.005, len(minutes))), 2)
+    rain = np.round(rng.exponential(0.02, len(minutes)), 2)
+    records['precipitation'] = np.where(rng.random(len(minutes)) < 0.05, rain, 0)
+    records['temperature'][rng.random(len(minutes)) < 0.02] = np.nan
+    return records
+
+
+def write_pages(months: list, directory: str, padding: int = 0) -> list:
+    """
+    Writes months as '{station}_{year}_{month}.html' pages.
+
+    :returns list: The written paths.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for data in months:
+        path = os.path.join(directory, f'{data.station}_{data.year}_{data.month}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(month_page(data, padding))
+        paths.append(path)
+    return paths
+
+
+def station_ids(count: int) -> list:
+    """Returns the ids of count synthetic stations, valid '{station}_{year}_{month}' prefixes."""
+    return [f'synthetic_s{i:03d}' for i in range(count)]
+
+
+def synthetic_months(station: str, start: tuple, end: tuple, seed: int = 0) -> list:
+    """
+    Generates plausible months of a station in source (imperial) units, rounded like the site prints them.
+
+    Temperatures follow a yearly cycle with slowly wandering anomalies, dew point and humidity
+    follow the temperature, and rain falls on a random fraction of the days. Every Max >= Avg >= Min.
+
+    :arg station: The station id, which also seeds its climate.
+    :arg start: The first (year, month).
+    :arg end: The last (year, month), inclusive.
+    :arg seed: The seed of the whole data set.
+
+    :returns list: The MonthData of every month from start to end.
+    """
+
+    rng = np.random.default_rng([seed, sum(map(ord, station))])
+    span = months(start, end)
+    dates = day_range(f'{start[0]:04d}-{start[1]:02d}-01', f'{end[0]:04d}-{end[1]:02d}-{month_days(*end):02d}')
+    days = len(dates)
+    phase = 2 * np.pi * ((dates - dates.astype('datetime64[Y]')).astype(np.int64) - 200) / 365.25
+
+    # Anomalies smoothed over about a week, so consecutive days look alike.
+    kernel = np.ones(7) / 7
+    anomaly = np.convolve(rng.normal(0, 6, days + 6), kernel, mode='valid')
+    temperature = rng.uniform(55, 70) + rng.uniform(12, 20) * np.cos(phase) + anomaly
+    spread = rng.uniform(4, 10, (2, days))
+    dew_point = temperature - rng.uniform(8, 25, days)
+    humidity = np.clip(100 - 2.5 * (temperature - dew_point) + rng.normal(0, 5, days), 10, 98)
+    wind = np.abs(rng.normal(rng.uniform(5, 12), 3, days))
+    pressure = 29.92 + np.convolve(rng.normal(0, 0.1, days + 6), kernel, mode='valid')
+    rain = np.where(rng.random(days) < 0.25 - 0.15 * np.cos(phase), rng.exponential(0.2, days), 0.0)
+
+    def stats(avg, low_spread, high_spread, decimals=0, floor=None):
+        high = np.ceil((avg + high_spread) * 10 ** decimals) / 10 ** decimals
+        low = np.floor((avg - low_spread) * 10 ** decimals) / 10 ** decimals
+        if floor is not None:
+            low = np.maximum(low, floor)
+        return [high, np.round(avg, 1), low]
+
+    columns = (stats(temperature, *spread) + stats(dew_point, spread[0] / 2, spread[1] / 2)
+               + stats(humidity, 12, np.minimum(12, 100 - humidity), floor=0)
+               + stats(wind, wind * rng.uniform(0.3, 1, days), 2 * spread[1], floor=0)
+               + stats(pressure, 0.05, 0.05, decimals=2) + [np.round(rain, 2)])
+    block = np.column_stack(columns)
+    assert block.shape[1] == len(FIELDS)
+
+    result, offset = [], 0
+    for year, month in span:
+        count = month_days(year, month)
+        result.append(MonthData(year, month, np.arange(1, count + 1, dtype=np.int16),
+                                block[offset:offset + count], station))
+        offset += count
+    return result
+
+
+def write_station(root: str, station: str, start: tuple, end: tuple, seed: int = 0) -> int:
+    """Writes the synthetic months of one station as Month_Data csv files under root, returning the count."""
+    written = 0
+    for data in synthetic_months(station, start, end, seed):
+        path = month_path(MonthKey(station, data.year, data.month), root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_month(data, path)
+        written += 1
+    return written
+
+
+def write_dataset(root: str, stations: list, start: tuple, end: tuple, seed: int = 0, jobs: int = None) -> int:
+    """
+    Writes a synthetic Month_Data tree in the exact csv format of fetched months, one worker process per station.
+
+    :arg root: The Month_Data directory to write, in station and year partitions.
+    :arg stations: The station ids, see station_ids.
+    :arg start: The first (year, month).
+    :arg end: The last (year, month), inclusive.
+    :arg seed: The data set seed, the same seed writes the same files.
+    :arg jobs: Worker processes.
+
+    :returns int: The number of written files.
+    """
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return sum(pool.map(write_station, [root] * len(stations), stations, [start] * len(stations),
+                            [end] * len(stations), [seed] * len(stations)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Month_Data tree for benchmarks.")
+    parser.add_argument("output", help="The Month_Data directory to write")
+    parser.add_argument("-s", "--stations", type=int, default=1, help="Number of stations")
+    parser.add_argument("-y", "--years", type=int, default=10, help="Number of years per station")
+    parser.add_argument("--first-year", type=int, default=2000, help="The first year")
+    parser.add_argument("--seed", type=int, default=0, help="The data set seed")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    args = parser.parse_args()
+
+    written = write_dataset(args.output, station_ids(args.stations), (args.first_year, 1),
+                            (args.first_year + args.years - 1, 12), args.seed, args.jobs)
+    print(f"Wrote {written} months of {args.stations} stations to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
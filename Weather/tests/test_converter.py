@@ -0,0 +1,161 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+import numpy as np
+import pytest
+
+from conversion import COLUMN_UNITS, convert_month
+from converter import CONVERSIONS, DECIMALS, ConverterToSIWeather, convert, convert_block
+from month_parser import FIELDS, MonthData, format_cell, parse_month, write_month
+
+
+# The textbook formula of every conversion, in exact decimal arithmetic.
+REFERENCES = {
+    ('degF', 'degC'): lambda x: (x - 32) * 5 / Decimal(9),
+    ('mph', 'm/s'): lambda x: x * Decimal('0.44704'),
+    ('inHg', 'hPa'): lambda x: x * Decimal('33.8639'),
+    ('in', 'mm'): lambda x: x * Decimal('25.4'),
+    ('%', '%'): lambda x: x,
+}
+
+# Values every conversion must handle, next to random ones.
+BOUNDARIES = [0.0, -0.0, 0.01, -0.01, 0.005, 0.995, 1.0, -1.0, 32.0, -40.0, 212.0, 100.0, 29.92, 1e6, -1e6]
+
+QUANTUM = Decimal(1).scaleb(-DECIMALS)
+QUANTUM_FLOAT = float(QUANTUM)
+
+
+def reference(value: float, units: tuple) -> Decimal:
+    """Returns the exact conversion of a float value."""
+    return REFERENCES[units](Decimal(value))
+
+
+def check_exact(converted: np.ndarray, values: np.ndarray, units: tuple):
+    """
+    Asserts that every converted value is the exact conversion rounded to DECIMALS, except for
+    exact values within floating point error of a rounding tie, which may round either way.
+    """
+    for result, value in zip(converted.ravel(), values.ravel()):
+        exact = reference(float(value), units)
+        expected = exact.quantize(QUANTUM, rounding=ROUND_HALF_EVEN)
+        if Decimal(float(result)) == Decimal(float(expected)):
+            continue
+        distance_to_tie = abs(abs(exact - expected) - QUANTUM / 2)
+        assert distance_to_tie < Decimal('1e-9') * max(1, abs(exact)), (units, value, result, expected)
+
+
+def test_every_conversion_has_a_reference():
+    assert set(CONVERSIONS) == set(REFERENCES)
+
+
+@pytest.mark.parametrize('units', list(CONVERSIONS))
+def test_random_values_match_the_reference(units):
+    rng = np.random.default_rng(sum(map(ord, ''.join(units))))
+    values = np.concatenate([rng.uniform(-200, 200, 2000), rng.normal(0, 1e4, 500)])
+    check_exact(convert_block(values[:, None].copy(), [units]), values, units)
+
+
+@pytest.mark.parametrize('units', list(CONVERSIONS))
+def test_printed_values_match_the_reference(units):
+    # Values like the history pages print them, with at most two decimals.
+    rng = np.random.default_rng(len(units[0]))
+    values = np.round(rng.uniform(-150, 150, 3000), 2)
+    check_exact(convert_block(values[:, None].copy(), [units]), values, units)
+
+
+@pytest.mark.parametrize('units', list(CONVERSIONS))
+def test_boundary_values_match_the_reference(units):
+    values = np.array(BOUNDARIES)
+    check_exact(convert_block(values[:, None].copy(), [units]), values, units)
+
+
+@pytest.mark.parametrize('units', list(CONVERSIONS))
+def test_unrounded_values_match_the_reference(units):
+    values = np.random.default_rng(1).uniform(-500, 500, 1000)
+    converted = convert_block(values[:, None].copy(), [units], decimals=None)[:, 0]
+    expected = np.array([float(reference(value, units)) for value in values])
+    np.testing.assert_allclose(converted, expected, rtol=1e-13, atol=1e-12)
+
+
+@pytest.mark.parametrize('decimals', [0, 1, DECIMALS, 3])
+def test_rounding_keeps_decimals(decimals):
+    values = np.random.default_rng(decimals).uniform(-100, 100, (500, 1))
+    converted = convert_block(values, [('mph', 'm/s')], decimals=decimals)
+    np.testing.assert_array_equal(converted, np.round(converted, decimals))
+
+
+def test_missing_and_infinite_values_pass_through():
+    values = np.array([[np.nan, np.inf, -np.inf]]).T
+    converted = convert_block(values.copy(), [('degF', 'degC')])[:, 0]
+    assert np.isnan(converted[0])
+    assert converted[1] == np.inf and converted[2] == -np.inf
+
+
+def test_block_columns_use_their_own_units():
+    rng = np.random.default_rng(2)
+    units = list(CONVERSIONS)
+    block = np.round(rng.uniform(-50, 120, (31, len(units))), 2)
+    converted = convert_block(block.copy(), units)
+    for i, pair in enumerate(units):
+        np.testing.assert_array_equal(converted[:, i], convert_block(block[:, i:i + 1].copy(), [pair])[:, 0])
+
+
+def test_converts_in_place_without_a_dtype():
+    block = np.array([[32.0, 10.0], [212.0, 0.0]])
+    assert convert_block(block, [('degF', 'degC'), ('mph', 'm/s')]) is block
+    np.testing.assert_array_equal(block, [[0.0, 4.47], [100.0, 0.0]])
+
+
+def test_float32_output_is_the_float64_result_to_float32_precision():
+    values = np.round(np.random.default_rng(3).uniform(-100, 100, (2000, 1)), 2)
+    single = convert_block(values, [('inHg', 'hPa')], dtype=np.float32)
+    double = convert_block(values.copy(), [('inHg', 'hPa')])
+    assert single.dtype == np.float32
+    # float32 may put a value on the other side of a rounding step, never further.
+    assert np.all(np.abs(single - double) <= QUANTUM_FLOAT + np.abs(double) * np.finfo(np.float32).eps)
+
+
+def test_unknown_units_raise():
+    with pytest.raises(ValueError):
+        convert_block(np.zeros((1, 1)), [('K', 'degC')])
+
+
+def test_scalar_converters_use_the_table():
+    converter = ConverterToSIWeather()
+    np.testing.assert_array_equal(converter.to_celsius([32, 212, -40]), [0.0, 100.0, -40.0])
+    np.testing.assert_array_equal(converter.to_mps([10]), convert([10], 'mph', 'm/s'))
+    np.testing.assert_array_equal(converter.to_hPc([29.92]), [1013.21])
+    np.testing.assert_array_equal(converter.to_mm([1, 0.01]), [25.4, 0.25])
+
+
+def month(days: int = 30, seed: int = 0) -> MonthData:
+    """Returns a month of printed-looking values in source units."""
+    rng = np.random.default_rng(seed)
+    block = np.empty((days, len(FIELDS)))
+    for i, (key, stat) in enumerate(FIELDS):
+        low, high = {'temperature': (10, 110), 'dew_point': (-10, 80), 'humidity': (5, 100),
+                     'wind_speed': (0, 40), 'pressure': (29, 31), 'precipitation': (0, 3)}[key]
+        block[:, i] = [float(format_cell(value, key, stat)) for value in rng.uniform(low, high, days)]
+    return MonthData(2024, 4, np.arange(1, days + 1, dtype=np.int16), block, 'athens_test')
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_parsed_and_converted_month_matches_the_reference(tmp_path, seed):
+    source = month(seed=seed)
+    path = tmp_path / 'athens_test_2024_4.csv'
+    write_month(source, str(path))
+
+    parsed = parse_month(str(path))
+    np.testing.assert_array_equal(parsed.block, source.block)
+    converted = convert_month(parsed)
+    for i, units in enumerate(COLUMN_UNITS):
+        check_exact(converted.block[:, i], source.block[:, i], units)
+
+
+def test_converted_month_as_float32(tmp_path):
+    path = tmp_path / 'athens_test_2024_4.csv'
+    write_month(month(), str(path))
+    single = convert_month(parse_month(str(path)), np.float32)
+    double = convert_month(parse_month(str(path)))
+    assert single.block.dtype == np.float32
+    assert np.all(np.abs(single.block - double.block)
+                  <= QUANTUM_FLOAT + np.abs(double.block) * np.finfo(np.float32).eps)
@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+import pytest
+
+from month_parser import FIELDS
+from observations import (OBSERVATION_DTYPE, OBSERVATION_KEYS, RESAMPLED_FIELDS, ObservationStore, daily_month,
+                          extract_day, ingest, parse_time, resample, saved_pages)
+from synthetic import synthetic_observations
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'daily')
+
+NAN = np.nan
+
+# The observations of the fixture pages: time, then the OBSERVATION_KEYS columns.
+MAY_1 = [
+    ('2024-05-01T00:20', 55, 52, 90, 7, 0, 29.92, 0.0),
+    ('2024-05-01T00:50', 54, 52, 94, 6, 0, 29.92, 0.0),
+    ('2024-05-01T06:50', 52, NAN, 93, 0, 0, 29.94, 0.0),
+    ('2024-05-01T12:20', 71, 48, 44, 14, 25, 29.89, 0.01),
+    ('2024-05-01T12:50', 75, 47, 37, 15, 0, 29.88, 0.12),
+    ('2024-05-01T23:50', 58, 46, 64, 8, 0, 29.91, 0.0),
+]
+MAY_2 = [
+    ('2024-05-02T00:00', 41, NAN, 70, 3, NAN, 30.02, 0.0),
+    ('2024-05-02T01:30', -2, NAN, 71, 0, NAN, 30.03, 0.0),
+    ('2024-05-02T13:00', 35, NAN, NAN, 12, NAN, 29.97, 0.05),
+    ('2024-05-02T23:30', 33, NAN, 93, 9, NAN, 29.95, 0.03),
+]
+
+
+def records(rows: list) -> np.ndarray:
+    return np.array(rows, dtype=OBSERVATION_DTYPE)
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def assert_records_equal(actual: np.ndarray, expected: np.ndarray):
+    assert actual.dtype == OBSERVATION_DTYPE
+    np.testing.assert_array_equal(actual['time'], expected['time'])
+    for key in OBSERVATION_KEYS:
+        np.testing.assert_array_equal(actual[key], expected[key], err_msg=key)
+
+
+@pytest.mark.parametrize('text, minutes', [('12:20 AM', 20), ('12:50 PM', 770), ('1:00 PM', 780),
+                                           ('11:50 PM', 1430), ('00:00', 0), ('23:30', 1410), (' 6:50 am ', 410)])
+def test_parse_time(text, minutes):
+    assert parse_time(text) == minutes
+
+
+@pytest.mark.parametrize('text', ['', 'Fair', '24:00', '9:99'])
+def test_parse_time_rejects_non_times(text):
+    with pytest.raises(ValueError):
+        parse_time(text)
+
+
+def test_extracts_a_saved_page():
+    # The summary table before the observation table and the table after it are skipped.
+    assert_records_equal(extract_day(read_fixture('2024_5_1.html'), '2024-05-01'), records(MAY_1))
+
+
+def test_extracts_columns_by_header_from_a_compressed_page():
+    # Reordered columns, a header row without thead, 24 hour times and missing columns.
+    pages = dict(saved_pages(FIXTURES))
+    day = next(day for day in pages if day.day == 2)
+    assert_records_equal(extract_day(pages[day], day), records(MAY_2))
+
+
+def test_page_without_a_table_raises():
+    with pytest.raises(ValueError, match="No observation table"):
+        extract_day(read_fixture('2024_5_3.html'), '2024-05-03')
+
+
+def test_saved_pages_are_read_in_date_order_within_the_range():
+    assert [str(day) for day, _ in saved_pages(FIXTURES)] == ['2024-05-01', '2024-05-02', '2024-05-03']
+    assert list(saved_pages(FIXTURES, (2024, 6), (2024, 12))) == []
+
+
+def test_ingest_stores_month_chunks_and_reports_failed_pages(tmp_path):
+    store = ObservationStore(str(tmp_path), 'spata_venizelos')
+    summary = ingest(saved_pages(FIXTURES), store)
+    assert summary['days'] == 2
+    assert summary['months'] == [(2024, 5)]
+    assert [day for day, _ in summary['failed']] == ['2024-05-03']
+    assert_records_equal(store.read(2024, 5), records(MAY_1 + MAY_2))
+    assert store.months() == [(2024, 5)]
+
+    # Ingesting the same days again replaces them.
+    ingest(saved_pages(FIXTURES), store)
+    assert_records_equal(store.read(2024, 5), records(MAY_1 + MAY_2))
+
+
+def test_daily_month_derives_the_monthly_page_stats(tmp_path):
+    store = ObservationStore(str(tmp_path), 'spata_venizelos')
+    ingest(saved_pages(FIXTURES), store)
+    data = daily_month(store, 2024, 5)
+    np.testing.assert_array_equal(data.days, [1, 2])
+    expected = {
+        ('temperature', 'Max'): [75, 41], ('temperature', 'Avg'): [60.8, 26.8], ('temperature', 'Min'): [52, -2],
+        ('dew_point', 'Max'): [52, NAN], ('dew_point', 'Avg'): [49, NAN], ('dew_point', 'Min'): [46, NAN],
+        ('humidity', 'Max'): [94, 93], ('humidity', 'Avg'): [70.3, 78], ('humidity', 'Min'): [37, 70],
+        ('wind_speed', 'Max'): [15, 12], ('wind_speed', 'Avg'): [8.3, 6], ('wind_speed', 'Min'): [0, 0],
+        ('pressure', 'Max'): [29.94, 30.03], ('pressure', 'Avg'): [29.91, 29.99], ('pressure', 'Min'): [29.88, 29.95],
+        ('precipitation', 'Total'): [0.13, 0.08],
+    }
+    for i, field in enumerate(FIELDS):
+        np.testing.assert_array_equal(data.block[:, i], expected[field], err_msg=str(field))
+
+
+def test_hourly_resampling_of_a_saved_page():
+    periods, block = resample(extract_day(read_fixture('2024_5_1.html'), '2024-05-01'), 'hour')
+    np.testing.assert_array_equal(periods, np.array(['2024-05-01T00', '2024-05-01T06', '2024-05-01T12',
+                                                     '2024-05-01T23'], dtype='datetime64[h]'))
+    temperature = [RESAMPLED_FIELDS.index(('temperature', stat)) for stat in ('Max', 'Avg', 'Min')]
+    np.testing.assert_array_equal(block[:, temperature], [[55, 54.5, 54], [52, 52, 52], [75, 73, 71], [58, 58, 58]])
+    np.testing.assert_allclose(block[:, RESAMPLED_FIELDS.index(('precipitation', 'Total'))], [0, 0, 0.13, 0],
+                               atol=1e-6)
+
+
+@pytest.mark.parametrize('resolution, unit', [('hour', 'h'), ('day', 'D')])
+def test_resampling_matches_a_loop_over_periods(resolution, unit):
+    observations = np.concatenate([synthetic_observations('athens_test', day)
+                                   for day in np.arange(np.datetime64('2024-02-27'), np.datetime64('2024-03-03'))])
+    periods, block = resample(observations, resolution)
+    buckets = observations['time'].astype(f'datetime64[{unit}]')
+    np.testing.assert_array_equal(periods, np.unique(buckets))
+    for period, row in zip(periods, block):
+        rows = observations[buckets == period]
+        for value, (key, stat) in zip(row, RESAMPLED_FIELDS):
+            column = rows[key].astype(np.float64)
+            if np.isnan(column).all():
+                assert np.isnan(value)
+                continue
+            expected = {'Max': np.nanmax, 'Avg': np.nanmean, 'Min': np.nanmin, 'Total': np.nansum}[stat](column)
+            assert value == pytest.approx(expected, rel=1e-12), (period, key, stat)
+
+
+def test_resampling_nothing():
+    periods, block = resample(np.empty(0, dtype=OBSERVATION_DTYPE), 'day')
+    assert len(periods) == 0 and block.shape == (0, len(RESAMPLED_FIELDS))
+    with pytest.raises(ValueError):
+        resample(np.empty(0, dtype=OBSERVATION_DTYPE), 'week')
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pytest
+
+import render
+from month_parser import FIELDS, MonthData, write_month
+from render import data_hash, render_month
+
+
+def month(missing: slice) -> MonthData:
+    """Returns a mild April in source units, without the temperatures of the missing days."""
+    block = np.tile(np.arange(len(FIELDS), dtype=np.float64) + 50, (30, 1))
+    for i, (key, _) in enumerate(FIELDS):
+        if key == 'temperature':
+            block[missing, i] = np.nan
+    return MonthData(2024, 4, np.arange(1, 31, dtype=np.int16), block, 'athens_test')
+
+
+@pytest.mark.parametrize('missing', [slice(0, 1), slice(10, 15), slice(0, 30)], ids=['first', 'some', 'all'])
+def test_renders_a_month_with_missing_temperatures(tmp_path, monkeypatch, missing):
+    monkeypatch.chdir(tmp_path)
+    source = str(tmp_path / 'athens_test_2024_4.csv')
+    write_month(month(missing), source)
+
+    assert render_month(source, ('temperature',), output_dir='Charts') == (1, 0)
+    assert os.path.getsize(tmp_path / 'Charts' / 'athens_test' / '2024' / 'athens_test_2024_4_temperature.png') > 0
+
+
+def test_distribution_version_invalidates_histograms_only(monkeypatch):
+    data = month(slice(0, 0))
+    histogram, temperature = data_hash(data, 'histogram'), data_hash(data, 'temperature')
+    monkeypatch.setattr(render, 'DISTRIBUTION_VERSION', render.DISTRIBUTION_VERSION + 1)
+    assert data_hash(data, 'histogram') != histogram
+    assert data_hash(data, 'temperature') == temperature
@@ -1,9 +1,19 @@
 from converter import ConverterToSIWeather
+from conversion import cached_si_month, load_si
+from calendar_index import parse_key
+from date import parse_year_month
+from instrument import add_profile_arguments, session, span
+from month_parser import MonthData, find_sources
+from si_table import FORMATS, month_frame, schema_matches, write_month, write_schema
+from stations import month_path, resolve
 
 import argparse
 import pandas as pd
 import logging
 import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 logger = logging.getLogger(__name__)
@@ -14,15 +24,17 @@ def read_weather_data(file: str) -> pd.DataFrame or None:
     """
         Reads weather data from a CSV file into a pandas DataFrame.
 
-        :arg file: The path to the CSV file.
+        :arg file: The csv file name inside Month_Data, in either layout.
 
         :returns pd.DataFrame: The weather data DataFrame, or None if an error occurs.
         """
 
     try:
-        df = pd.read_csv(filepath_or_buffer=f'Month_Data/{file}')
+        with span('csv_read', file=file) as record:
+            df = pd.read_csv(filepath_or_buffer=resolve(file))
+            record['rows'] = len(df)
         return df
-    except (FileNotFoundError, pd.errors.ParserError) as e:
+    except (FileNotFoundError, ValueError, pd.errors.ParserError) as e:
         logger.error(f"Error reading file '{file}': {e}")
         return None
 
@@ -52,6 +64,11 @@ def convert_unit(df: pd.DataFrame, column_name: str, new_unit: str):
         pd.DataFrame: The DataFrame with the converted column.
     """
 
+    with span('convert_unit', column=column_name, rows=len(df)):
+        return _convert_unit(df, column_name, new_unit)
+
+
+def _convert_unit(df: pd.DataFrame, column_name: str, new_unit: str):
     converter = ConverterToSIWeather()
     if column_name == 'Humidity (%)':
         new_column_name = column_name
@@ -69,8 +86,11 @@ def convert_unit(df: pd.DataFrame, column_name: str, new_unit: str):
     elif column_name == 'Wind Speed (mph)':
         df[new_column_name] = df[new_column_name][1:].apply(converter.to_mps)
         df.loc[0, new_column_name] = df[column_name][0]
-    elif column_name in ['Precipitation (in)', 'Pressure (in)']:
-        df[new_column_name] = df[new_column_name][1:].apply(converter.to_mps)
+    elif column_name == 'Pressure (in)':
+        df[new_column_name] = df[new_column_name][1:].apply(converter.to_hPc)
+        df.loc[0, new_column_name] = df[column_name][0]
+    elif column_name == 'Precipitation (in)':
+        df[new_column_name] = df[new_column_name][1:].apply(converter.to_mm)
         df.loc[0, new_column_name] = df[column_name][0]
     elif column_name == 'Humidity (%)':
         df.loc[0, new_column_name] = df[column_name][0]
@@ -90,58 +110,173 @@ def create_output_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """
 
     return df[['Time', 'Temperature (°C)', 'Dew Point (°C)', 'Humidity (%)',
-               'Wind Speed (mps)', 'Pressure (hPc)', 'Precipitation (hPc)']]
+               'Wind Speed (mps)', 'Pressure (hPa)', 'Precipitation (mm)']]
+
+
+OUTPUT_DIR = 'SI_Month_Data'
+
+
+def create_si_dataframe(data: MonthData) -> pd.DataFrame:
+    """
+    Creates the SI output DataFrame of a converted month.
+
+    :arg data: The month in SI units.
+
+    :returns pd.DataFrame: A date column followed by one float column per si_table.SI_FIELDS entry.
+    """
+    return month_frame(data)
 
 
-def si_dataframe(file: str, overwrite: bool = False) -> pd.DataFrame or None:
+def si_dataframe(file: str, overwrite: bool = False, fmt: str = 'csv') -> pd.DataFrame or None:
     """
-        Reads weather data, converts units to SI, and creates an output DataFrame.
+        Loads weather data in SI units, from month_cache when possible, and creates an output DataFrame.
+
+        The output is written like convert_batch writes it. An existing output is written again when
+        OUTPUT_DIR holds the schema sidecar of another layout. The sidecar itself is only written
+        when this is the only output, as the other months may still be in the older layout.
 
         :arg file: The path to the CSV file.
         :arg overwrite: Whether to overwrite the output file if it exists.
+        :arg fmt: The output format, one of si_table.FORMATS.
 
         :returns pd.DataFrame: The output DataFrame with weather data in SI units,
                                or None if an error occurs.
         """
 
-    df = read_weather_data(file)
-    if df is None:
+    data = cached_si_month(file)
+    if data is None:
         return None
 
-    column_conversions = [
-        ('Temperature (°F)', '°C'),
-        ('Dew Point (°F)', '°C'),
-        ('Humidity (%)', '%'),
-        ('Wind Speed (mph)', 'mps'),
-        ('Pressure (in)', 'hPc'),
-        ('Precipitation (in)', 'hPc'),
-    ]
+    converted_df = create_si_dataframe(data)
 
-    for col_name, new_unit in column_conversions:
-        convert_unit(df, col_name, new_unit)
+    path = output_path(file, fmt)
+    current = schema_matches(OUTPUT_DIR)
+    if os.path.exists(path) and not overwrite and current:
+        return converted_df
 
-    converted_df = create_output_dataframe(df)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_month(data, path)
+    print(f"Saved converted data to {path}.")
+    if not current and not any(name.startswith('SI_') and os.path.join(directory, name) != path
+                               for directory, _, names in os.walk(OUTPUT_DIR) for name in names):
+        write_schema(OUTPUT_DIR)
+    return converted_df
 
-    # Check if the output file exists
-    output_file = "SI_" + file
-    path = fr'C:\Users\SpaceYellow\Desktop\Python\Projects\Weather\SI_Month_Data\{output_file}'
 
-    if os.path.exists(path):
-        if overwrite:
-            converted_df.to_csv(path, index=False)
-            print(f"Saved converted data to {path}.")
-    else:
-        converted_df.to_csv(path, index=False)
-        print(f"Saved converted data to {path}.")
+def output_path(source: str, fmt: str = 'csv') -> str:
+    """Returns the SI output path of a Month_Data source path, in the station and year partitions of OUTPUT_DIR."""
+    return month_path(parse_key(source), OUTPUT_DIR, prefix='SI_', extension=fmt)
 
-    return converted_df
 
+def is_up_to_date(source: str, fmt: str = 'csv') -> bool:
+    """Returns True if the SI output of source exists and is newer than source, like make."""
+    try:
+        return os.path.getmtime(output_path(source, fmt)) >= os.path.getmtime(source)
+    except FileNotFoundError:
+        return False
 
-if __name__ == "__main__":
+
+def convert_file(source: str, fmt: str = 'csv') -> int:
+    """
+    Converts one Month_Data csv to its SI output file, going through month_cache.
+
+    :arg source: The path to the Month_Data csv file.
+    :arg fmt: The output format, one of si_table.FORMATS.
+
+    :returns int: The size of the source file in bytes.
+    """
+
+    with span('convert_file', source=source) as record:
+        data = load_si(source)
+        path = output_path(source, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_month(data, path)
+        record['rows'], record['bytes'] = len(data.days), os.path.getsize(source)
+        return record['bytes']
+
+
+def convert_batch(sources: list, overwrite: bool = False, jobs: int = None, fmt: str = 'csv') -> dict:
+    """
+    Converts many months on a process pool, skipping outputs newer than their source.
+
+    Outputs are never up to date while OUTPUT_DIR holds the schema sidecar of another
+    layout or converter version, and the sidecar is written once the batch is done.
+
+    :arg sources: The Month_Data csv paths to convert.
+    :arg overwrite: Convert every source, even when its output is up to date.
+    :arg jobs: The number of worker processes, all cores by default.
+    :arg fmt: The output format, one of si_table.FORMATS.
+
+    :returns dict: The converted, skipped and failed source paths and the run statistics.
+    """
+
+    start = time.perf_counter()
+    summary = {'converted': [], 'skipped': [], 'failed': [], 'bytes': 0}
+    pending = []
+    overwrite = overwrite or not schema_matches(OUTPUT_DIR)
+    for source in sources:
+        if not overwrite and is_up_to_date(source, fmt):
+            summary['skipped'].append(source)
+        else:
+            pending.append(source)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(convert_file, source, fmt): source for source in pending}
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    summary['bytes'] += future.result()
+                    summary['converted'].append(source)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error converting '{source}': {e}")
+                    summary['failed'].append(source)
+
+    if not summary['failed']:
+        write_schema(OUTPUT_DIR)
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def print_summary(summary: dict):
+    """Prints the outcome and the throughput of a convert_batch run."""
+    seconds = summary['seconds']
+    converted = len(summary['converted'])
+    print(f"Converted: {converted}, skipped: {len(summary['skipped'])}, failed: {len(summary['failed'])}"
+          f" in {seconds:.2f} s")
+    if converted and seconds:
+        print(f"Throughput: {converted / seconds:.1f} months/s, {summary['bytes'] / seconds / 1024:.1f} KiB/s")
+    for source in summary['failed']:
+        print(f"  failed: {source}")
+
+
+def main():
     parser = argparse.ArgumentParser(description="Convert weather data to SI units.")
-    parser.add_argument("file", help="The input CSV file")
+    parser.add_argument("file", nargs="?", help="The input CSV file inside Month_Data")
     parser.add_argument("-o", "--overwrite", action="store_true",
                         help="Overwrite the output file if it exists")
+    parser.add_argument("-b", "--batch", nargs="+", metavar="SOURCE", default=[],
+                        help="Convert every csv of these directories, glob patterns or files")
+    parser.add_argument("-r", "--range", nargs=2, type=parse_year_month, metavar=("START", "END"),
+                        help="Convert the Month_Data files of a YYYY-MM to YYYY-MM range")
+    parser.add_argument("-s", "--station", nargs="+", default=None,
+                        help="Only these stations, and the stations of the --range (default: spata_venizelos)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Worker processes for batch mode (default: all cores)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default='csv',
+                        help="The output format, csv text or npy arrays with a schema.json sidecar")
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    with session('to_SI', args.profile, args.metrics):
+        if args.batch or args.range:
+            sources = find_sources(args.batch, args.range, args.station)
+            print_summary(convert_batch(sources, args.overwrite, args.jobs, args.format))
+        elif args.file:
+            si_dataframe(args.file, args.overwrite, args.format)
+        else:
+            parser.error("Give a file, --batch or --range.")
 
-    si_dataframe(args.file, args.overwrite)
+
+if __name__ == "__main__":
+    main()
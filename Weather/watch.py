@@ -0,0 +1,354 @@
+import argparse
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import signal
+import struct
+import sys
+import time
+
+from instrument import add_profile_arguments, session, span
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# inotify constants of <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT = struct.Struct('iIII')
+
+
+def _is_month_file(path: str) -> bool:
+    return path.endswith('.csv')
+
+
+def scan(root: str) -> dict:
+    """Returns the (mtime, size) of every csv file under root, in any station and year partition."""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if _is_month_file(name):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = stat.st_mtime_ns, stat.st_size
+    return files
+
+
+class PollingWatcher:
+    """Finds changed month files by comparing the mtime and size of every file under a root at an interval."""
+
+    def __init__(self, root: str, interval: float = 2.0):
+        self.root = root
+        self.interval = interval
+        self._files = scan(root)
+
+    def poll(self, timeout: float) -> set:
+        """Returns the month files created or changed since the last call, waiting up to timeout for one."""
+        deadline = time.monotonic() + timeout
+        while True:
+            files = scan(self.root)
+            changed = {path for path, stat in files.items() if self._files.get(path) != stat}
+            self._files = files
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Finds changed month files with Linux inotify, through libc so nothing needs to be installed.
+
+    A file is reported once it is closed after writing or moved into place, and new station
+    and year directories are watched as soon as they appear.
+
+    :raises OSError: If inotify is not available.
+    """
+
+    def __init__(self, root: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available.")
+        self.root = root
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}
+        self._pending = set()
+        self._watch_tree(root, False)
+
+    def _watch_tree(self, top: str, report: bool = True):
+        """Watches a directory and every directory below it, reporting the month files already inside."""
+        for directory, _, names in os.walk(top):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Cannot watch '{directory}'")
+            self._directories[wd] = directory
+            if report:
+                # Files may have been written before the watch was added.
+                self._pending.update(os.path.join(directory, name) for name in names if _is_month_file(name))
+
+    def poll(self, timeout: float) -> set:
+        """Returns the month files created or changed since the last call, waiting up to timeout for one."""
+        changed, self._pending = self._pending, set()
+        if not changed and not select.select([self._fd], [], [], max(timeout, 0))[0]:
+            return changed
+        while select.select([self._fd], [], [], 0)[0]:
+            buffer = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+                name = buffer[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("Missed file events, rescanning.")
+                    changed.update(scan(self.root))
+                    continue
+                if wd not in self._directories:
+                    continue
+                path = os.path.join(self._directories[wd], os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._watch_tree(path)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and _is_month_file(path):
+                    changed.add(path)
+        changed |= self._pending
+        self._pending = set()
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(root: str, interval: float = 2.0, polling: bool = False):
+    """Returns an InotifyWatcher of root, or a PollingWatcher when polling is asked for or inotify is missing."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            logger.warning(f"Falling back to polling: {e}")
+    return PollingWatcher(root, interval)
+
+
+def debounce(watcher, quiet: float = 1.0, limit: float = 30.0, timeout: float = None) -> set:
+    """
+    Waits for changes and gathers every change of a burst of writes.
+
+    :arg watcher: An InotifyWatcher or PollingWatcher.
+    :arg quiet: The burst ends after this many seconds without a change.
+    :arg limit: The burst ends after this many seconds, even if changes keep coming.
+    :arg timeout: How long to wait for the first change, forever by default.
+
+    :returns set: The changed month files, empty on timeout.
+    """
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    changed = set()
+    while not changed:
+        wait = 60.0 if deadline is None else deadline - time.monotonic()
+        if wait <= 0:
+            return changed
+        changed = watcher.poll(wait)
+    end = time.monotonic() + limit
+    while time.monotonic() < end:
+        more = watcher.poll(min(quiet, end - time.monotonic()))
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+class Updater:
+    """
+    Brings every output derived from changed month files up to date: the SI file and cache,
+    the archive with its aggregates and correlations, the month and season distributions and
+    the rendered charts. Only the months given, and the seasons they fall in, are touched.
+    """
+
+    def __init__(self, root: str = 'Month_Data', archive: bool = True, kinds: tuple = None):
+        """
+        :arg root: The Month_Data directory.
+        :arg archive: Update the archives, aggregates and correlations.
+        :arg kinds: The charts to render, render.KINDS by default, () for none.
+        """
+        from render import KINDS
+
+        self.root = root
+        self.archive = archive
+        self.kinds = KINDS if kinds is None else kinds
+        self._stations = {}
+        self._digests = {}
+
+    def _changed(self, source: str) -> bool:
+        """Returns True if a month file is new or its content differs from when it was last processed."""
+        from si_cache import file_digest
+
+        try:
+            digest = file_digest(source)
+        except FileNotFoundError:
+            return False
+        if self._digests.get(source) == digest:
+            return False
+        self._digests[source] = digest
+        return True
+
+    def update(self, sources) -> dict:
+        """
+        Processes month files, skipping unchanged ones.
+
+        :returns dict: The updated, unchanged and failed sources.
+        """
+
+        from archive import month_order
+        from calendar_index import MonthKey, parse_key, season_months, season_of
+        from distributions import DistributionStore
+        from render import render_month
+        from stations import month_path
+        from to_SI import convert_file
+
+        summary = {'updated': [], 'unchanged': [], 'failed': []}
+        months = []
+        for source in sources:
+            try:
+                months.append((parse_key(source).station, month_order(source), source))
+            except ValueError as e:
+                logger.warning(f"Ignoring '{source}': {e}")
+        seasons = set()
+        for _, _, source in sorted(months):
+            if not self._changed(source):
+                summary['unchanged'].append(source)
+                continue
+            try:
+                with span('watch_update', source=source):
+                    convert_file(source)
+                    if self.archive:
+                        self._archive(source)
+                    DistributionStore().month(source)
+                    if self.kinds:
+                        render_month(source, self.kinds)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error updating '{source}': {e}")
+                self._digests.pop(source, None)  # retried on its next change
+                summary['failed'].append(source)
+                continue
+            key = parse_key(source)
+            seasons.add((key.station,) + season_of(key.year, key.month))
+            summary['updated'].append(source)
+
+        for station, year, season in sorted(seasons):
+            paths = [month_path(MonthKey(station, y, m), self.root) for y, m in season_months(year, season)]
+            try:
+                DistributionStore().seasons([path for path in paths if os.path.exists(path)])
+            except (OSError, ValueError) as e:
+                logger.error(f"Error updating the {season} {year} distribution of {station}: {e}")
+        return summary
+
+    def _archive(self, source: str):
+        from aggregates import Aggregates
+        from archive import DailyArchive
+        from conversion import load_si
+        from correlation import CorrelationIndex
+
+        data = load_si(source)
+        if data.station not in self._stations:
+            archive = DailyArchive(station=data.station)
+            self._stations[data.station] = archive, Aggregates(archive), CorrelationIndex(archive)
+        archive, aggregates, correlations = self._stations[data.station]
+        archive.append_month(data)
+        aggregates.update(data)
+        correlations.update(data)
+
+
+def print_update(summary: dict):
+    """Prints what an update did."""
+    print(f"{time.strftime('%H:%M:%S')} updated {len(summary['updated'])}, unchanged {len(summary['unchanged'])}, "
+          f"failed {len(summary['failed'])}", flush=True)
+    for source in summary['updated']:
+        print(f"  {source}", flush=True)
+
+
+def watch(root: str = 'Month_Data', interval: float = 2.0, quiet: float = 1.0, polling: bool = False,
+          updater: Updater = None, once: bool = False):
+    """
+    Updates the outputs of stale month files, then those of every new or changed one as they are written.
+
+    :arg root: The Month_Data directory.
+    :arg interval: Seconds between scans when polling.
+    :arg quiet: Seconds without a write that end a burst of writes.
+    :arg polling: Poll even when inotify is available.
+    :arg updater: The Updater, one updating every output by default.
+    :arg once: Only catch up with the stale files and return.
+    """
+
+    from month_parser import find_sources
+    from to_SI import is_up_to_date
+
+    updater = updater or Updater(root)
+    watcher = None if once else open_watcher(root, interval, polling)
+    # Stop through the finally blocks on SIGTERM, so the watcher is closed and the profile and
+    # the metrics of the session are written.
+    previous = signal.signal(signal.SIGTERM, _terminate)
+    try:
+        stale = [source for source in find_sources([root]) if not is_up_to_date(source)]
+        if stale:
+            print_update(updater.update(stale))
+        if once:
+            return
+        print(f"Watching {root} with {type(watcher).__name__}.", flush=True)
+        while True:
+            changed = debounce(watcher, quiet)
+            summary = updater.update(changed)
+            if summary['updated'] or summary['failed']:
+                print_update(summary)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        if watcher:
+            watcher.close()
+
+
+def _terminate(*_):
+    sys.exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep SI files, archives, distributions and charts up to date "
+                                                 "while Month_Data files are written.")
+    parser.add_argument("root", nargs="?", default='Month_Data', help="The Month_Data directory")
+    parser.add_argument("-i", "--interval", type=float, default=2.0, help="Seconds between scans when polling")
+    parser.add_argument("-q", "--quiet", type=float, default=1.0,
+                        help="Seconds without a write that end a burst of writes")
+    parser.add_argument("--poll", action="store_true", help="Poll even when inotify is available")
+    parser.add_argument("-k", "--kind", choices=["histogram", "temperature"], nargs="*", default=None,
+                        help="The charts to render, none when given without a kind (default: all)")
+    parser.add_argument("--no-archive", action="store_true", help="Do not update the archives")
+    parser.add_argument("--once", action="store_true", help="Update the stale files and exit")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with session('watch', args.profile, args.metrics):
+        updater = Updater(args.root, not args.no_archive, None if args.kind is None else tuple(args.kind))
+        try:
+            watch(args.root, args.interval, args.quiet, args.poll, updater, args.once)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import importlib
+import os
+import sys
+
+from date import DateGenerator, parse_year_month
+from instrument import add_profile_arguments, session
+
+
+# The module behind every subcommand. They pull in numpy, pandas, selenium or matplotlib,
+# so they are imported by load() only once the subcommand is known.
+SUBCOMMAND_MODULES = {
+    'fetch': 'backfill',
+    'convert': 'to_SI',
+    'plot': 'venizelos_spata',
+    'stats': 'archive',
+    'render': 'render',
+    'network': 'network',
+    'query': 'query',
+    'watch': 'watch',
+    'serve': 'serve',
+    'ingest': 'observations',
+}
+
+
+def load(command: str):
+    """Imports and returns the module behind a subcommand."""
+    return importlib.import_module(SUBCOMMAND_MODULES[command])
+
+
+def fetch(args):
+    backfill = load('fetch')
+    summary = backfill.backfill(args.start, args.end, backfill.HttpFetcher if args.http else backfill.chrome_factory,
+                                args.workers, args.interval, args.url, args.retries, stations=args.station)
+    print(f"Saved: {len(summary['saved'])}, skipped: {len(summary['skipped'])}, failed: {len(summary['failed'])}")
+
+
+def convert(args):
+    to_SI = load('convert')
+    if len(args.files) == 1 and not args.range and not os.path.exists(args.files[0]):
+        # A bare file name inside Month_Data, like 'python to_SI.py FILE'.
+        to_SI.si_dataframe(args.files[0], args.overwrite, args.format)
+        return
+    sources = to_SI.find_sources(args.files, args.range, args.station)
+    to_SI.print_summary(to_SI.convert_batch(sources, args.overwrite, args.jobs, args.format))
+
+
+def plot(args):
+    venizelos_spata = load('plot')
+
+    dg = DateGenerator(args.file)
+    if args.kind == 'histogram':
+        venizelos_spata.multi_histogram(args.file, dg)
+    elif args.kind == 'temperature':
+        venizelos_spata.month_temp_l_plot(args.file, dg)
+    else:
+        venizelos_spata.temp_humidity_corr(args.file)
+
+
+def render(args):
+    render = load('render')
+    sources = render.find_sources(args.sources, args.range, args.station)
+    summary = render.render_batch(sources, tuple(args.kind), tuple(args.format), args.output, args.force, args.jobs)
+    print(f"Rendered {summary['rendered']} images, skipped {summary['skipped']} up to date, "
+          f"{len(summary['failed'])} months failed.")
+
+
+def stats(args):
+    archive = load('stats')
+    import numpy as np
+
+    dates, values = archive.DailyArchive(station=args.station).range(args.start, args.end)
+    print(f"{len(dates)} days from {dates[0] if len(dates) else '-'} to {dates[-1] if len(dates) else '-'}")
+    print(f"{'field':28} {'mean':>9} {'min':>9} {'max':>9}")
+    with np.errstate(invalid='ignore'):
+        for (key, stat), column in zip(archive.FIELDS, values.T):
+            print(f"{key + ' ' + stat:28} {np.nanmean(column):9.2f} {np.nanmin(column):9.2f} {np.nanmax(column):9.2f}")
+
+
+def query(args):
+    query = load('query')
+    unknown = set(args.columns or []) - set(query.COLUMNS)
+    if unknown:
+        sys.exit(f"Error: unknown columns {', '.join(sorted(unknown))}.")
+    try:
+        result = query.query(args.start, args.end, args.where, args.season,
+                             query.Aggregates(query.DailyArchive(station=args.station)))
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    query.print_result(result, args.columns, args.count)
+
+
+def network(args):
+    network = load('network')
+    network.print_scan(network.scan(args.station, args.start, args.end, args.jobs))
+
+
+def watch(args):
+    watcher = load('watch')
+    updater = watcher.Updater(args.root, not args.no_archive, None if args.kind is None else tuple(args.kind))
+    try:
+        watcher.watch(args.root, args.interval, args.quiet, args.poll, updater, args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(args):
+    import asyncio
+
+    serve = load('serve')
+    service = serve.WeatherService(args.root, args.charts, args.jobs)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+def ingest(args):
+    observations = load('ingest')
+    for station in args.station:
+        observations.print_ingest(station, observations.ingest_station(station, args.start, args.end, args.directory,
+                                                                       args.pages, args.url, args.http, args.interval))
+        if args.derive:
+            store = observations.ObservationStore(args.directory, station)
+            written = observations.derive_months(store, args.start, args.end, args.derive)
+            print(f"{station}: wrote {written} daily summaries to {args.derive}.")
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='weather', description="Fetch, convert, plot and summarise weather data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = subparsers.add_parser("fetch", help="Fetch a range of months into Month_Data")
+    fetch_parser.add_argument("start", type=parse_year_month, help="First month, YYYY-MM")
+    fetch_parser.add_argument("end", type=parse_year_month, help="Last month, YYYY-MM")
+    fetch_parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent browser sessions")
+    fetch_parser.add_argument("-i", "--interval", type=float, default=2.0,
+                              help="Minimum seconds between requests to the same host")
+    fetch_parser.add_argument("--retries", type=int, default=3, help="Retries per month")
+    fetch_parser.add_argument("-s", "--station", nargs="+", default=None, help="The registered stations to fetch")
+    fetch_parser.add_argument("--url", help="Url template with {year} and {month}")
+    fetch_parser.add_argument("--http", action="store_true", help="Fetch with plain HTTP instead of Chrome")
+    fetch_parser.set_defaults(handler=fetch)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert Month_Data files to SI units")
+    convert_parser.add_argument("files", nargs="*", default=[],
+                                help="A Month_Data file name, or csv paths, directories and glob patterns")
+    convert_parser.add_argument("-r", "--range", nargs=2, type=parse_year_month, metavar=("START", "END"),
+                                help="Convert the Month_Data files of a YYYY-MM to YYYY-MM range")
+    convert_parser.add_argument("-s", "--station", nargs="+", help="Only these stations")
+    convert_parser.add_argument("-o", "--overwrite", action="store_true", help="Overwrite existing outputs")
+    convert_parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    convert_parser.add_argument("-f", "--format", choices=["csv", "npy"], default="csv", help="The output format")
+    convert_parser.set_defaults(handler=convert)
+
+    plot_parser = subparsers.add_parser("plot", help="Plot one month")
+    plot_parser.add_argument("file", help="The csv file name inside Month_Data")
+    plot_parser.add_argument("-k", "--kind", choices=["histogram", "temperature", "correlation"],
+                             default="histogram", help="The plot to draw")
+    plot_parser.set_defaults(handler=plot)
+
+    render_parser = subparsers.add_parser("render", help="Render the charts of many months to image files")
+    render_parser.add_argument("sources", nargs="*", default=[],
+                               help="Month_Data csv paths, directories or glob patterns")
+    render_parser.add_argument("-r", "--range", nargs=2, type=parse_year_month, metavar=("START", "END"),
+                               help="Render the Month_Data files of a YYYY-MM to YYYY-MM range")
+    render_parser.add_argument("-s", "--station", nargs="+", help="Only these stations")
+    render_parser.add_argument("-k", "--kind", choices=["histogram", "temperature"], nargs="+",
+                               default=["histogram", "temperature"], help="The charts to render")
+    render_parser.add_argument("-f", "--format", choices=["png", "svg"], nargs="+", default=["png"],
+                               help="The image formats")
+    render_parser.add_argument("-o", "--output", default="Charts", help="The output directory")
+    render_parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    render_parser.add_argument("--force", action="store_true", help="Render even when the charts are up to date")
+    render_parser.set_defaults(handler=render)
+
+    stats_parser = subparsers.add_parser("stats", help="Summarise the archived days of a date range")
+    stats_parser.add_argument("start", help="First day, YYYY-MM-DD")
+    stats_parser.add_argument("end", help="Last day, YYYY-MM-DD")
+    stats_parser.add_argument("-s", "--station", default='spata_venizelos', help="The station of the archive")
+    stats_parser.set_defaults(handler=stats)
+
+    query_parser = subparsers.add_parser("query", help="Print the archived days matching a date range and conditions")
+    query_parser.add_argument("start", nargs="?", help="First day, YYYY-MM-DD (default: the archive start)")
+    query_parser.add_argument("end", nargs="?", help="Last day, YYYY-MM-DD (default: the last archived day)")
+    query_parser.add_argument("-w", "--where", nargs="+", default=[], metavar="PREDICATE",
+                              help="Conditions like 'temperature_max>35', all of which must hold")
+    query_parser.add_argument("--season", choices=["winter", "spring", "summer", "autumn"], nargs="+",
+                              help="Only days of these seasons")
+    query_parser.add_argument("-c", "--columns", nargs="+", metavar="COLUMN",
+                              help="The columns to print, like temperature_max (default: all)")
+    query_parser.add_argument("--count", action="store_true", help="Print only the number of matching days")
+    query_parser.add_argument("-t", "--station", default='spata_venizelos', help="The station of the archive")
+    query_parser.set_defaults(handler=query)
+
+    network_parser = subparsers.add_parser("network", help="Summarise a date range across stations")
+    network_parser.add_argument("start", help="First day, YYYY-MM-DD")
+    network_parser.add_argument("end", help="Last day, YYYY-MM-DD")
+    network_parser.add_argument("-s", "--station", nargs="+", help="Only these stations, every one by default")
+    network_parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    network_parser.set_defaults(handler=network)
+
+    watch_parser = subparsers.add_parser("watch", help="Keep every derived output up to date as month files change")
+    watch_parser.add_argument("root", nargs="?", default="Month_Data", help="The Month_Data directory")
+    watch_parser.add_argument("-i", "--interval", type=float, default=2.0, help="Seconds between scans when polling")
+    watch_parser.add_argument("-q", "--quiet", type=float, default=1.0,
+                              help="Seconds without a write that end a burst of writes")
+    watch_parser.add_argument("--poll", action="store_true", help="Poll even when inotify is available")
+    watch_parser.add_argument("-k", "--kind", choices=["histogram", "temperature"], nargs="*", default=None,
+                              help="The charts to render, none when given without a kind (default: all)")
+    watch_parser.add_argument("--no-archive", action="store_true", help="Do not update the archives")
+    watch_parser.add_argument("--once", action="store_true", help="Update the stale files and exit")
+    watch_parser.set_defaults(handler=watch)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve SI data and charts over HTTP on this machine")
+    serve_parser.add_argument("-H", "--host", default="127.0.0.1", help="The address to listen on")
+    serve_parser.add_argument("-p", "--port", type=int, default=8000, help="The port to listen on")
+    serve_parser.add_argument("--root", default="Month_Data", help="The Month_Data directory")
+    serve_parser.add_argument("-o", "--charts", default="Charts", help="Where rendered charts are kept")
+    serve_parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    serve_parser.set_defaults(handler=serve)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest the observations of daily history pages")
+    ingest_parser.add_argument("start", type=parse_year_month, help="First month, YYYY-MM")
+    ingest_parser.add_argument("end", type=parse_year_month, help="Last month, YYYY-MM")
+    ingest_parser.add_argument("-s", "--station", nargs="+", default=["spata_venizelos"],
+                               help="The registered stations")
+    ingest_parser.add_argument("-d", "--directory", default="Observations", help="The observation store")
+    ingest_parser.add_argument("--pages", help="Ingest the saved pages of this directory instead of fetching")
+    ingest_parser.add_argument("--url", help="Url template with {year}, {month} and {day}")
+    ingest_parser.add_argument("--http", action="store_true", help="Fetch with plain HTTP instead of Chrome")
+    ingest_parser.add_argument("-i", "--interval", type=float, default=2.0,
+                               help="Minimum seconds between requests")
+    ingest_parser.add_argument("--derive", metavar="OUTPUT",
+                               help="Write the daily summaries as Month_Data csv files here")
+    ingest_parser.set_defaults(handler=ingest)
+
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.command == "convert" and not args.files and not args.range:
+        parser.error("convert needs files or --range")
+    if args.command == "render" and not args.sources and not args.range:
+        parser.error("render needs sources or --range")
+    with session(f'weather {args.command}', args.profile, args.metrics):
+        args.handler(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])